@@ -0,0 +1,96 @@
+# End-to-end submission throughput against the mock E-Link 2 server:
+# transform -> metadata POST -> PDF download -> media upload, with CDL DB writes
+# counted rather than sent to MySQL.
+#   python3 benchmarks/bench_submission.py -n 200 -w 8 --latency lognormal:0.2,0.5 --errors 429=0.02
+#   python3 benchmarks/bench_submission.py -n 200 --async
+import argparse
+import io
+from contextlib import nullcontext, redirect_stdout
+from time import perf_counter
+
+import synthetic
+synthetic.install_release_info()
+
+import mock_elink_server
+import rate_limiter
+
+
+def lift_rate_limits():
+    for settings in rate_limiter.BUCKET_SETTINGS.values():
+        settings.update(rate=1000.0, max_rate=1000.0, burst=100)
+
+
+def make_pubs(count, base_url, pdf_size):
+    import transform_pubs
+
+    pubs = synthetic.make_elements_pubs(count)
+    for pub in pubs:
+        pub['File Size'] = pdf_size
+        pub['File URL'] = f"{base_url}/content/{pub['eSchol ID']}/{pub['eSchol ID']}.pdf?size={pdf_size}"
+    return list(transform_pubs.add_osti_data(pubs, False))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--pubs", type=int, default=100)
+    parser.add_argument("-w", "--workers", type=int, default=1)
+    parser.add_argument("--async", dest="async_mode", action="store_true", default=False,
+                        help="Use elink_2_async instead of elink_2_functions.")
+    parser.add_argument("--pdf-kb", type=int, default=256)
+    parser.add_argument("--latency", default="lognormal:0.2,0.5")
+    parser.add_argument("--media-latency", default=None)
+    parser.add_argument("--errors", default=None)
+    parser.add_argument("--max-rps", type=float, default=None)
+    parser.add_argument("--max-concurrent", type=int, default=None)
+    parser.add_argument("--keep-rate-limits", action="store_true", default=False,
+                        help="Use the real rate_limiter bucket settings, rather than lifting them "
+                             "so only the mock server's caps apply.")
+    parser.add_argument("-v", "--verbose", action="store_true", default=False,
+                        help="Show the submission output.")
+    args = parser.parse_args()
+
+    if not args.keep_rate_limits:
+        lift_rate_limits()
+
+    import cdl_osti_db_functions as cdl
+    import elink_2_functions as elink_2
+
+    # CDL DB writes are counted, not sent.
+    cdl_writes = []
+    cdl.execute_write = lambda mysql_creds, query, values: cdl_writes.append(query)
+
+    config = mock_elink_server.MockConfig(
+        args.latency, args.media_latency, args.errors, args.max_rps, args.max_concurrent)
+    server = mock_elink_server.start_server(config)
+
+    osti_creds = {'base_url': server.base_url, 'token': 'benchmark',
+                  'pdf_user_agent': 'osti-reporter-benchmark'}
+    mysql_creds = {'table': 'osti_benchmark'}
+    pubs = make_pubs(args.pubs, server.base_url, args.pdf_kb * 1024)
+
+    mode = "async" if args.async_mode else f"{args.workers} worker(s)"
+    print(f"Submitting {args.pubs} pubs ({args.pdf_kb} KB PDFs) with {mode} to {server.base_url}")
+
+    start = perf_counter()
+    with nullcontext() if args.verbose else redirect_stdout(io.StringIO()):
+        if args.async_mode:
+            import elink_2_async
+            elink_2_async.submit_new_pubs(pubs, osti_creds, mysql_creds)
+        else:
+            elink_2.submit_new_pubs(pubs, osti_creds, mysql_creds, args.workers)
+    elapsed = perf_counter() - start
+
+    elink_2.close_clients()
+    server.shutdown()
+
+    meta_ok = sum(1 for pub in pubs if pub.get('response_success'))
+    media_ok = sum(1 for pub in pubs if pub.get('media_response_success'))
+
+    print(f"\n{elapsed:.2f}s, {args.pubs / elapsed:.1f} pubs/sec")
+    print(f"{meta_ok}/{args.pubs} metadata OK, {media_ok}/{meta_ok} media OK, "
+          f"{len(cdl_writes)} CDL DB writes")
+    mock_elink_server.print_stats(server.state.stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# Micro-benchmark for transform_pubs: pubs/sec building submission JSONs.
+#   legacy:   the original build_submission_json (deepcopy template, stdlib json,
+#             lower() on every author name), kept below for comparison
+#   per pub:  transform_pubs.build_submission_json
+#   batched:  transform_pubs.get_batches + transform_batch, as add_osti_data runs (orjson if installed)
+#   python3 benchmarks/bench_transform.py [-n PUBS] [-a AUTHORS]
+import argparse
+import gc
+import hashlib
+import json
+from copy import deepcopy
+from time import perf_counter
+
+import synthetic
+release_info = synthetic.install_release_info()
+
+import transform_pubs
+
+
+def legacy_new_submission():
+    return deepcopy(release_info.v2)
+
+
+def legacy_is_organization_author(author):
+    return ('collaboration' in author['last_name'].lower()
+            or ('first_name' in author.keys() and 'collaboration' in author['first_name'].lower()))
+
+
+def legacy_build_submission_json(pub):
+    osti_pub = deepcopy(release_info.v2)
+    osti_pub.update(transform_pubs.get_product_type_and_subfields(pub))
+
+    osti_pub['title'] = pub['title']
+    osti_pub['site_unique_id'] = pub['id']
+    osti_pub['publication_date'] = pub['Reporting Date 1']
+    osti_pub['product_size'] = pub['File Size']
+    if pub['doi'] is not None:
+        osti_pub['doi'] = pub['doi']
+    if pub['abstract'] is not None:
+        osti_pub['description'] = pub['abstract']
+
+    osti_pub['identifiers'].append(dict(type='OTHER_ID', value=pub['ark']))
+    osti_pub['identifiers'].append(dict(type='OTHER_ID', value=pub['eSchol URL']))
+    if transform_pubs.get_lbl_report_number(pub) is not None:
+        osti_pub['identifiers'].append(
+            dict(type='RN', value=transform_pubs.get_lbl_report_number(pub)))
+
+    authors_json = json.loads(pub['authors'])
+    if authors_json is not None:
+        for author in authors_json:
+            if legacy_is_organization_author(author):
+                author['org'] = True
+                osti_pub['organizations'].append(transform_pubs.format_organization_author(author))
+            if 'email' in author.keys():
+                author['email'] = [author['email']]
+        authors_json = [author for author in authors_json if 'org' not in author.keys()]
+        osti_pub['persons'] += authors_json
+
+    grants_json = json.loads(pub['grants'])
+    if grants_json is not None:
+        osti_pub['organizations'] += grants_json
+
+    return osti_pub
+
+
+def run_legacy(pubs):
+    return [legacy_build_submission_json(pub) for pub in pubs]
+
+
+def run_per_pub(pubs):
+    return [transform_pubs.build_submission_json(pub) for pub in pubs]
+
+
+def run_batched(pubs):
+    for batch in transform_pubs.get_batches(pubs):
+        transform_pubs.transform_batch(batch)
+    return [pub['submission_json'] for pub in pubs]
+
+
+# A digest of the output, so it can be compared without keeping it in memory.
+def get_output_digest(func, pubs):
+    return hashlib.md5(json.dumps(func(pubs)).encode()).hexdigest()
+
+
+def best_rate(func, pubs, repeat):
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = perf_counter()
+        func(pubs)
+        elapsed = perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(pubs) / best
+
+
+def time_constructor(new_submission, count):
+    start = perf_counter()
+    for _ in range(count):
+        new_submission()
+    return count / (perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--pubs", type=int, default=5000)
+    parser.add_argument("-a", "--authors", type=int, default=None,
+                        help="Fixed author count per pub. Default is a realistic mix.")
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pubs = synthetic.make_elements_pubs(args.pubs, n_authors=args.authors)
+    print(f"{args.pubs} pubs, best of {args.repeat}, "
+          f"decoder: {transform_pubs.json_loads.__module__}\n")
+
+    before = time_constructor(legacy_new_submission, args.pubs)
+    after = time_constructor(transform_pubs.new_submission, args.pubs)
+    print(f"{'template only':<14}deepcopy {before:>12,.0f}   "
+          f"compiled {after:>12,.0f}   {after / before:.1f}x\n")
+
+    legacy = best_rate(run_legacy, pubs, args.repeat)
+    per_pub = best_rate(run_per_pub, pubs, args.repeat)
+    batched = best_rate(run_batched, pubs, args.repeat)
+
+    legacy_digest = get_output_digest(run_legacy, pubs[:200])
+    if legacy_digest != get_output_digest(run_per_pub, pubs[:200]) \
+            or legacy_digest != get_output_digest(run_batched, pubs[:200]):
+        raise RuntimeError("Transform output differs from the legacy output.")
+
+    for name, rate in (('legacy', legacy), ('per pub', per_pub), ('batched', batched)):
+        print(f"{name:<14}{rate:>12,.0f} pubs/sec   {rate / legacy:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
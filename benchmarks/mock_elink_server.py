@@ -0,0 +1,488 @@
+# Local stand-in for the OSTI E-Link 2 API and eScholarship PDF downloads,
+# for load, latency and retry testing without touching OSTI's QA servers.
+#
+# E-Link 2 endpoints (same paths elink_2_functions uses):
+#   POST /records/submit               GET /records      (paged: page, rows; Link rel="next")
+#   PUT  /records/{id}/submit          GET /records/{id}
+#   POST /media/{id}                   GET /comments/{id}
+#   PUT  /media/{id}/{media_id}
+# eScholarship:
+#   GET  /content/{eschol_id}/{filename}.pdf[?size=BYTES]
+# Mock only:
+#   GET  /_stats                       request counts by endpoint and status
+#
+#   python3 benchmarks/mock_elink_server.py --port 8800 --latency lognormal:0.3,0.5 \
+#       --errors 429=0.02,500=0.01,409=0.02,nonjson=0.01 --max-rps 20
+# Then point OSTI_API_BASE_URL (and the File URLs) at http://127.0.0.1:8800
+import argparse
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+from collections import Counter
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import monotonic, sleep
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+
+DEFAULT_PAGE_ROWS = 20
+MAX_PAGE_ROWS = 100
+DEFAULT_PDF_SIZE = 256 * 1024
+PDF_CHUNK_SIZE = 64 * 1024
+
+# Which endpoints each injected error can hit.
+ERROR_ENDPOINTS = {
+    '409': {'post_media', 'put_media'},
+    '404': {'put_media', 'get_record'},
+    'nonjson': {'post_media', 'put_media'},
+}
+
+WORKFLOW_STATUSES = ['R', 'R', 'R', 'R', 'SO', 'SA', 'SV', 'SF']
+
+
+# --------------------------
+# Latency specs: "fixed:S", "uniform:MIN,MAX", "exponential:MEAN", "lognormal:MEDIAN,SIGMA"
+def parse_latency(spec):
+    if not spec:
+        return lambda rng: 0
+
+    kind, _, params = spec.partition(':')
+    values = [float(v) for v in params.split(',')] if params else []
+
+    if kind == 'fixed':
+        return lambda rng: values[0]
+    if kind == 'uniform':
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == 'exponential':
+        return lambda rng: rng.expovariate(1 / values[0])
+    if kind == 'lognormal':
+        median, sigma = values
+        return lambda rng: median * rng.lognormvariate(0, sigma)
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+# Error specs: "429=0.02,500=0.01,nonjson=0.01" -> {'429': 0.02, ...}
+def parse_error_rates(spec):
+    if not spec:
+        return {}
+    rates = {}
+    for item in spec.split(','):
+        code, _, rate = item.partition('=')
+        rates[code.strip()] = float(rate)
+    return rates
+
+
+class MockConfig:
+    def __init__(self, latency=None, media_latency=None, errors=None, max_rps=None,
+                 max_concurrent=None, retry_after=1, pdf_bandwidth_mbps=None,
+                 seed_records=0, seed=0):
+        self.latency = parse_latency(latency)
+        self.media_latency = parse_latency(media_latency) if media_latency else self.latency
+        self.error_rates = parse_error_rates(errors)
+        self.max_rps = max_rps
+        self.max_concurrent = max_concurrent
+        self.retry_after = retry_after
+        self.pdf_bandwidth_mbps = pdf_bandwidth_mbps
+        self.seed_records = seed_records
+        self.seed = seed
+
+
+# --------------------------
+# Shared server state: records, media, counters and the throughput cap.
+class MockState:
+    def __init__(self, config):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.lock = threading.Lock()
+
+        self.records = {}
+        self.comments = {}
+        self.next_osti_id = 2_000_000
+        self.next_media_id = 900_000
+        self.stats = Counter()
+
+        self.in_flight = threading.BoundedSemaphore(config.max_concurrent) \
+            if config.max_concurrent else None
+        self._tokens = config.max_rps or 0
+        self._last_refill = monotonic()
+
+        for _ in range(config.seed_records):
+            self.add_record({'title': 'Seeded record', 'site_ownership_code': 'LBNLSCH'},
+                            seeded=True)
+
+    def random(self):
+        with self.lock:
+            return self.rng.random()
+
+    def sample_latency(self, endpoint):
+        latency = self.config.media_latency if 'media' in endpoint else self.config.latency
+        with self.lock:
+            return max(0, latency(self.rng))
+
+    # Token bucket for --max-rps. Returns 0 if the request may go ahead,
+    # otherwise the seconds until a token frees up.
+    def take_token(self):
+        if not self.config.max_rps:
+            return 0
+        with self.lock:
+            now = monotonic()
+            self._tokens = min(self.config.max_rps,
+                               self._tokens + (now - self._last_refill) * self.config.max_rps)
+            self._last_refill = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.config.max_rps
+
+    def pick_error(self, endpoint):
+        for code, rate in self.config.error_rates.items():
+            if endpoint not in ERROR_ENDPOINTS.get(code, {endpoint}):
+                continue
+            if self.random() < rate:
+                return code
+        return None
+
+    def add_record(self, submission, seeded=False):
+        with self.lock:
+            self.next_osti_id += 1
+            osti_id = self.next_osti_id
+            status = self.rng.choice(WORKFLOW_STATUSES) if seeded else 'SO'
+            hidden = seeded and self.rng.random() < 0.02
+
+        record = dict(submission)
+        record.update({
+            'osti_id': osti_id,
+            'workflow_status': status,
+            'hidden_flag': hidden,
+            'doi': submission.get('doi') or (f"10.2172/{osti_id}" if status == 'R' else None),
+            'site_ownership_code': submission.get('site_ownership_code', 'LBNLSCH'),
+            'date_metadata_updated': formatdate(usegmt=True),
+            'identifiers': submission.get('identifiers', []),
+            'audit_logs': [{'type': 'RELEASER', 'status': 'SUCCESS',
+                            'messages': ['Record submitted.'],
+                            'audit_date': '2024-10-01T12:00:00.000+00:00'}],
+            'media': []})
+
+        with self.lock:
+            self.records[osti_id] = record
+            if status == 'SV' or hidden:
+                self.comments[osti_id] = [{
+                    'state': 'O', 'date_added': '2024-10-02T09:30:00.000+00:00',
+                    'comments': [{'text': 'Please check the attached PDF.'}]}]
+        return record
+
+    def add_media(self, osti_id, media_id=None):
+        with self.lock:
+            record = self.records.get(osti_id)
+            if record is None:
+                return None
+            if media_id is None:
+                self.next_media_id += 1
+                media_id = self.next_media_id
+            media = {'media_id': media_id, 'media_file_id': media_id + 1_000_000,
+                     'status': 'OK', 'url': f"https://www.osti.gov/servlets/purl/{osti_id}"}
+            record['media'] = [{'osti_id': osti_id, 'files': [media]}]
+            return {'osti_id': osti_id, 'files': [media]}
+
+
+# --------------------------
+ROUTES = [
+    ('POST', re.compile(r'^/records/submit$'), 'post_record'),
+    ('PUT', re.compile(r'^/records/(\d+)/submit$'), 'put_record'),
+    ('GET', re.compile(r'^/records$'), 'get_records'),
+    ('GET', re.compile(r'^/records/(\d+)$'), 'get_record'),
+    ('POST', re.compile(r'^/media/(\d+)$'), 'post_media'),
+    ('PUT', re.compile(r'^/media/(\d+)/(\d+)$'), 'put_media'),
+    ('GET', re.compile(r'^/comments/(\d+)$'), 'get_comments'),
+    ('GET', re.compile(r'^/content/([^/]+)/(.+\.pdf)$'), 'get_pdf'),
+    ('GET', re.compile(r'^/_stats$'), 'get_stats'),
+]
+
+# Endpoints which skip auth, latency and error injection
+UNMETERED_ENDPOINTS = {'get_stats'}
+
+
+class MockElinkHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'MockElink/2'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_PUT(self):
+        self.dispatch('PUT')
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def dispatch(self, method):
+        url = urlsplit(self.path)
+        self.query = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+        for route_method, pattern, endpoint in ROUTES:
+            match = pattern.match(url.path)
+            if match and route_method == method:
+                break
+        else:
+            self.read_body()
+            return self.send_json(404, {'errors': [f"No route: {method} {url.path}"]}, 'unknown')
+
+        body = self.read_body()
+        if endpoint in UNMETERED_ENDPOINTS:
+            return getattr(self, endpoint)(body, *match.groups())
+
+        if endpoint != 'get_pdf' and not self.headers.get('Authorization', '').startswith('Bearer '):
+            return self.send_json(401, {'errors': ['Missing bearer token']}, endpoint)
+
+        if self.state.in_flight and not self.state.in_flight.acquire(blocking=False):
+            return self.send_json(503, {'errors': ['Too many concurrent requests']}, endpoint)
+
+        try:
+            wait = self.state.take_token()
+            if wait:
+                return self.send_json(429, {'errors': ['Rate limit exceeded']}, endpoint,
+                                      {'Retry-After': str(max(1, round(wait)))})
+
+            sleep(self.state.sample_latency(endpoint))
+
+            error = self.state.pick_error(endpoint)
+            if error:
+                return self.send_error_response(error, endpoint)
+
+            getattr(self, endpoint)(body, *match.groups())
+        finally:
+            if self.state.in_flight:
+                self.state.in_flight.release()
+
+    # Reads the whole request body, plain or chunked.
+    def read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            body = bytearray()
+            while True:
+                size = int(self.rfile.readline().split(b';')[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return bytes(body)
+                body += self.rfile.read(size)
+                self.rfile.readline()
+
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def send_json(self, status, data, endpoint, headers=None):
+        self.send_body(status, json.dumps(data).encode(), 'application/json', endpoint, headers)
+
+    def send_body(self, status, body, content_type, endpoint, headers=None):
+        self.state.stats[f"{endpoint} {status}"] += 1
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_response(self, error, endpoint):
+        if error == 'nonjson':
+            return self.send_body(200, b"<html><body>Upload received</body></html>",
+                                  'text/html', endpoint)
+        if error == '429':
+            return self.send_json(429, {'errors': ['Rate limit exceeded']}, endpoint,
+                                  {'Retry-After': str(self.state.config.retry_after)})
+        if error == '409':
+            return self.send_json(409, {'errors': ['Media file already exists for this record']},
+                                  endpoint)
+        if error == '502':
+            return self.send_body(502, b"<html><body>Bad Gateway</body></html>",
+                                  'text/html', endpoint)
+        return self.send_json(int(error), {'errors': [f"Injected {error}"]}, endpoint)
+
+    # --------------------------
+    # E-Link 2 endpoints
+    def post_record(self, body):
+        submission = json.loads(body or b'{}')
+        if not submission.get('title'):
+            return self.send_json(400, {'errors': ['title is required']}, 'post_record')
+        self.send_json(200, self.state.add_record(submission), 'post_record')
+
+    def put_record(self, body, osti_id):
+        record = self.state.records.get(int(osti_id))
+        if record is None:
+            return self.send_json(404, {'errors': ['Record not found']}, 'put_record')
+        record.update(json.loads(body or b'{}'))
+        record['date_metadata_updated'] = formatdate(usegmt=True)
+        self.send_json(200, record, 'put_record')
+
+    def get_records(self, body):
+        records = list(self.state.records.values())
+        for field in ('workflow_status', 'site_ownership_code'):
+            if field in self.query:
+                records = [r for r in records if r.get(field) == self.query[field]]
+        if 'hidden_flag' in self.query:
+            hidden = self.query['hidden_flag'].lower() == 'true'
+            records = [r for r in records if r['hidden_flag'] == hidden]
+
+        page = int(self.query.get('page', 1))
+        rows = min(int(self.query.get('rows', DEFAULT_PAGE_ROWS)), MAX_PAGE_ROWS)
+        page_records = records[(page - 1) * rows:page * rows]
+
+        headers = {'X-Total-Count': str(len(records))}
+        if page * rows < len(records):
+            next_query = urlencode(dict(self.query, page=page + 1, rows=rows))
+            host = self.headers.get('Host', 'localhost')
+            headers['Link'] = f'<http://{host}/records?{next_query}>; rel="next"'
+
+        self.send_json(200, page_records, 'get_records', headers)
+
+    def get_record(self, body, osti_id):
+        record = self.state.records.get(int(osti_id))
+        if record is None:
+            return self.send_json(404, {'errors': ['Record not found']}, 'get_record')
+        self.send_json(200, record, 'get_record')
+
+    def post_media(self, body, osti_id):
+        media = self.state.add_media(int(osti_id))
+        if media is None:
+            return self.send_json(404, {'errors': ['Record not found']}, 'post_media')
+        self.send_json(200, media, 'post_media')
+
+    def put_media(self, body, osti_id, media_id):
+        media = self.state.add_media(int(osti_id), int(media_id))
+        if media is None:
+            return self.send_json(404, {'errors': ['Record not found']}, 'put_media')
+        self.send_json(200, media, 'put_media')
+
+    def get_comments(self, body, osti_id):
+        self.send_json(200, self.state.comments.get(int(osti_id), []), 'get_comments')
+
+    # --------------------------
+    # Fake eScholarship PDFs: deterministic bytes of the requested size, with an ETag.
+    def get_pdf(self, body, eschol_id, filename):
+        size = int(self.query.get('size', DEFAULT_PDF_SIZE))
+        etag = '"' + hashlib.md5(f"{self.path}".encode()).hexdigest() + '"'
+
+        if self.headers.get('If-None-Match') == etag:
+            self.state.stats['get_pdf 304'] += 1
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        self.state.stats['get_pdf 200'] += 1
+        self.state.stats['get_pdf bytes'] += size
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/pdf')
+        self.send_header('Content-Length', str(size))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', formatdate(usegmt=True))
+        self.end_headers()
+
+        bandwidth = self.state.config.pdf_bandwidth_mbps
+        for chunk in iter_fake_pdf(size):
+            self.wfile.write(chunk)
+            if bandwidth:
+                sleep(len(chunk) * 8 / (bandwidth * 1_000_000))
+
+    def get_stats(self, body):
+        self.send_json(200, dict(self.state.stats), 'get_stats')
+
+
+def iter_fake_pdf(size):
+    header = b"%PDF-1.4\n% mock eScholarship PDF\n"
+    trailer = b"\n%%EOF\n"
+    filler = b"0" * PDF_CHUNK_SIZE
+
+    if size <= len(header) + len(trailer):
+        yield (header + trailer)[:size]
+        return
+
+    yield header
+    remaining = size - len(header) - len(trailer)
+    while remaining > 0:
+        chunk = filler[:min(remaining, PDF_CHUNK_SIZE)]
+        remaining -= len(chunk)
+        yield chunk
+    yield trailer
+
+
+# --------------------------
+class MockElinkServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config):
+        super().__init__(address, MockElinkHandler)
+        self.state = MockState(config)
+
+    # Clients drop keep-alive connections (and unread PDF bodies) at will.
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+# Starts the server on a background thread. Port 0 picks a free port.
+def start_server(config, host='127.0.0.1', port=0):
+    server = MockElinkServer((host, port), config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def print_stats(stats):
+    print("\nMock E-Link requests:")
+    for key in sorted(stats):
+        print(f"  {key:<28}{stats[key]:>12,}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default='127.0.0.1')
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--latency", default=None,
+                        help="fixed:S, uniform:MIN,MAX, exponential:MEAN or lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--media-latency", default=None,
+                        help="Latency for media uploads, if different. Same format as --latency.")
+    parser.add_argument("--errors", default=None,
+                        help="Error rates, e.g. 429=0.02,500=0.01,502=0.01,409=0.02,404=0.01,nonjson=0.01")
+    parser.add_argument("--max-rps", type=float, default=None,
+                        help="Throughput cap. Requests over it get a 429 with Retry-After.")
+    parser.add_argument("--max-concurrent", type=int, default=None,
+                        help="Concurrent request cap. Requests over it get a 503.")
+    parser.add_argument("--retry-after", type=int, default=1,
+                        help="Retry-After seconds sent with injected 429s.")
+    parser.add_argument("--pdf-bandwidth-mbps", type=float, default=None)
+    parser.add_argument("--seed-records", type=int, default=0,
+                        help="LBNLSCH records to preload, for the /records and /comments reports.")
+    args = parser.parse_args()
+
+    config = MockConfig(args.latency, args.media_latency, args.errors, args.max_rps,
+                        args.max_concurrent, args.retry_after, args.pdf_bandwidth_mbps,
+                        args.seed_records)
+    server = MockElinkServer((args.host, args.port), config)
+    print(f"Mock E-Link 2 server on {server.base_url} (Ctrl-C to stop)")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print_stats(server.state.stats)
+
+
+if __name__ == "__main__":
+    main()
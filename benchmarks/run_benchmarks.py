@@ -0,0 +1,212 @@
+# Benchmark suite: throughput and peak memory for the reporter's heavy paths,
+# on synthetic data. No Elements, CDL DB, OSTI or eScholarship access needed.
+#   python3 benchmarks/run_benchmarks.py
+#   python3 benchmarks/run_benchmarks.py --only temp_table_openjson --cdl-rows 1000,500000
+#   python3 benchmarks/run_benchmarks.py --output baseline.json
+#   python3 benchmarks/run_benchmarks.py --compare baseline.json   (exits 1 on a regression)
+import argparse
+import gc
+import io
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+from contextlib import redirect_stdout
+from time import perf_counter
+
+import synthetic
+synthetic.install_release_info()
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+DEFAULT_PUB_COUNTS = [1000, 5000]
+DEFAULT_CDL_ROW_COUNTS = [1000, 10000, 100000, 500000]
+
+# --compare flags a benchmark this much slower, or using this much more memory.
+REGRESSION_TOLERANCE = 0.20
+
+
+# --------------------------
+# Each benchmark: (dataset, make_data(size), run(data) -> items processed).
+# Program modules are imported inside, so a benchmark only needs its own dependencies.
+def make_pubs(size):
+    return synthetic.make_elements_pubs(size)
+
+
+def make_submitted_pubs(size):
+    return [synthetic.make_submitted_pub(i) for i in range(1, size + 1)]
+
+
+def run_transform(pubs):
+    import transform_pubs
+    return sum(1 for _ in transform_pubs.add_osti_data(pubs, False))
+
+
+def run_temp_table(rows, supports_openjson):
+    import elements_db_functions as elements
+    from stand_in_db import StandInConnection
+    elements.create_temp_table_in_elements(StandInConnection(supports_openjson), rows)
+    return len(rows)
+
+
+def run_write_logs(pubs):
+    import write_logs
+    with tempfile.TemporaryDirectory() as log_folder:
+        write_logs.output_submissions(log_folder, pubs)
+        write_logs.output_responses(log_folder, pubs)
+        write_logs.output_json_generic(log_folder, pubs, "submissions-and-responses")
+    return len(pubs)
+
+
+def run_run_log(pubs, compress):
+    import run_log
+    with tempfile.TemporaryDirectory() as log_folder:
+        pub_log = run_log.RunLog(log_folder, "submissions-and-responses", compress)
+        for pub in pubs:
+            pub_log.write(pub)
+        pub_log.close()
+    return len(pubs)
+
+
+def run_convert_nulls(pubs):
+    import cdl_osti_db_functions as cdl
+    for pub in pubs:
+        cdl.convert_nulls_for_sql(pub)
+    return len(pubs)
+
+
+BENCHMARKS = {
+    'transform': ('pubs', make_pubs, run_transform),
+    'temp_table_openjson': ('cdl_rows', synthetic.make_cdl_osti_db_rows,
+                            lambda rows: run_temp_table(rows, True)),
+    'temp_table_executemany': ('cdl_rows', synthetic.make_cdl_osti_db_rows,
+                               lambda rows: run_temp_table(rows, False)),
+    'write_logs': ('pubs', make_submitted_pubs, run_write_logs),
+    'run_log': ('pubs', make_submitted_pubs, lambda pubs: run_run_log(pubs, False)),
+    'run_log_gzip': ('pubs', make_submitted_pubs, lambda pubs: run_run_log(pubs, True)),
+    'convert_nulls_for_sql': ('pubs', make_submitted_pubs, run_convert_nulls),
+}
+
+
+# --------------------------
+# Takes the best of several timed runs, then one more under tracemalloc for the
+# peak allocation, since tracing slows the code down. Program output is discarded.
+def measure(run, data, repeat=3, track_memory=True):
+    with redirect_stdout(io.StringIO()):
+        elapsed = None
+        for _ in range(repeat):
+            gc.collect()
+            start = perf_counter()
+            items = run(data)
+            run_time = perf_counter() - start
+            elapsed = run_time if elapsed is None else min(elapsed, run_time)
+
+        peak_bytes = None
+        if track_memory:
+            gc.collect()
+            tracemalloc.start()
+            run(data)
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    return {'items': items,
+            'seconds': round(elapsed, 4),
+            'items_per_sec': round(items / elapsed, 1) if elapsed else None,
+            'peak_mb': round(peak_bytes / 1024 / 1024, 2) if peak_bytes is not None else None}
+
+
+def run_suite(names, sizes, repeat, track_memory):
+    results = []
+    print(f"{'benchmark':<26}{'size':>9}{'items/sec':>14}{'seconds':>10}{'peak MB':>10}")
+
+    for name in names:
+        dataset, make_data, run = BENCHMARKS[name]
+
+        # Warm-up, so imports and caches aren't counted in the first size.
+        with redirect_stdout(io.StringIO()):
+            run(make_data(10))
+
+        for size in sizes[dataset]:
+            data = make_data(size)
+            result = dict(name=name, size=size, **measure(run, data, repeat, track_memory))
+            del data
+            results.append(result)
+
+            peak = f"{result['peak_mb']:,.1f}" if result['peak_mb'] is not None else "-"
+            print(f"{name:<26}{size:>9,}{result['items_per_sec']:>14,.0f}"
+                  f"{result['seconds']:>10.2f}{peak:>10}")
+
+    return results
+
+
+# Returns a line for each benchmark that got slower or bigger than the baseline allows.
+def find_regressions(results, baseline):
+    baseline = {(r['name'], r['size']): r for r in baseline}
+    regressions = []
+
+    for result in results:
+        before = baseline.get((result['name'], result['size']))
+        if not before:
+            continue
+
+        label = f"{result['name']} @ {result['size']:,}"
+        if before['items_per_sec'] and result['items_per_sec'] \
+                < before['items_per_sec'] * (1 - REGRESSION_TOLERANCE):
+            regressions.append(f"{label}: {result['items_per_sec']:,.0f} items/sec, "
+                               f"was {before['items_per_sec']:,.0f}")
+        if before['peak_mb'] and result['peak_mb'] \
+                and result['peak_mb'] > before['peak_mb'] * (1 + REGRESSION_TOLERANCE):
+            regressions.append(f"{label}: peak {result['peak_mb']:,.1f} MB, "
+                               f"was {before['peak_mb']:,.1f} MB")
+
+    return regressions
+
+
+def parse_sizes(value):
+    return [int(size) for size in value.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--only", default=",".join(BENCHMARKS),
+                        help="Comma-separated benchmarks to run. Default is all of them.")
+    parser.add_argument("--pubs", type=parse_sizes, default=DEFAULT_PUB_COUNTS,
+                        help="Comma-separated Elements pub counts.")
+    parser.add_argument("--cdl-rows", type=parse_sizes, default=DEFAULT_CDL_ROW_COUNTS,
+                        help="Comma-separated CDL OSTI DB table sizes.")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Timed runs per benchmark; the best is reported.")
+    parser.add_argument("--no-memory", action="store_true", default=False,
+                        help="Skip the tracemalloc peak memory runs.")
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument("--compare", help="Baseline JSON from --output. Exits 1 on a regression.")
+    args = parser.parse_args()
+
+    names = args.only.split(',')
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"Unknown benchmark(s): {', '.join(unknown)}")
+
+    # The program modules read sql_files/ relative to the repo root.
+    output_path = os.path.abspath(args.output) if args.output else None
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+    os.chdir(REPO_ROOT)
+    results = run_suite(names, {'pubs': args.pubs, 'cdl_rows': args.cdl_rows},
+                        args.repeat, not args.no_memory)
+
+    if output_path:
+        with open(output_path, 'w') as f:
+            json.dump(results, f, indent=4)
+
+    if compare_path:
+        with open(compare_path) as f:
+            regressions = find_regressions(results, json.load(f))
+        if regressions:
+            print("\nRegressions:\n" + "\n".join(regressions))
+            sys.exit(1)
+        print("\nNo regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+# Stand-in for a pyodbc connection to the Elements reporting DB.
+# Accepts the same calls create_temp_table_in_elements makes, and keeps counts
+# of what would have gone over the wire, without a server on the other end.
+import pyodbc
+
+
+class StandInCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.fast_executemany = False
+
+    def execute(self, sql, *params):
+        if 'OPENJSON' in sql and not self.connection.supports_openjson:
+            raise pyodbc.Error('42000', "Invalid object name 'OPENJSON'. (stand-in)")
+
+        self.connection.statements += 1
+        self.connection.bytes_sent += len(sql) + sum(len(str(p)) for p in params)
+        return self
+
+    def executemany(self, sql, rows):
+        for row in rows:
+            self.connection.rows_inserted += 1
+            self.connection.bytes_sent += sum(len(str(v)) for v in row)
+        self.connection.statements += 1
+        return self
+
+    def close(self):
+        pass
+
+
+class StandInConnection:
+    def __init__(self, supports_openjson=True):
+        self.supports_openjson = supports_openjson
+        self.statements = 0
+        self.rows_inserted = 0
+        self.bytes_sent = 0
+        self.autocommit = True
+
+    def cursor(self):
+        return StandInCursor(self)
+
+    def close(self):
+        pass
@@ -0,0 +1,182 @@
+# Synthetic data for the benchmarks. Nothing here touches a real database or OSTI.
+import json
+import os
+import random
+import sys
+import types
+from datetime import datetime, timedelta
+
+# Allows importing the shared program modules from the repo root.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+# Stand-in for the private release_info module, with the same shape as release_info.v2.
+SYNTHETIC_RELEASE_V2 = {
+    'site_ownership_code': 'LBNL',
+    'access_limitations': ['UNL'],
+    'country_publication_code': 'US',
+    'language': 'English',
+    'contract_nos': ['AC02-05CH11231'],
+    'subject_category_code': ['99'],
+    'identifiers': [{'type': 'CN_DOE', 'value': 'AC02-05CH11231'}],
+    'organizations': [
+        {'type': 'RESEARCHING',
+         'name': 'Lawrence Berkeley National Laboratory (LBNL), Berkeley, CA (United States)'},
+        {'type': 'SPONSOR', 'name': 'USDOE'}],
+    'persons': [
+        {'type': 'RELEASE', 'first_name': 'Release', 'last_name': 'Official',
+         'email': ['release@example.org'], 'phone': '555-0100'}],
+}
+
+
+# Uses the real release_info if it's on the path, otherwise the synthetic one.
+def install_release_info():
+    try:
+        import release_info
+    except ImportError:
+        release_info = types.ModuleType('release_info')
+        release_info.v2 = SYNTHETIC_RELEASE_V2
+        sys.modules['release_info'] = release_info
+    return release_info
+
+
+# --------------------------
+# Elements rows, with the columns of get_new_osti_pubs_from_elements.sql
+PUB_TYPES = ['Journal article', 'Journal article', 'Journal article',
+             'Conference papers', 'Poster', 'Book', 'Chapter', 'Report', 'Internet publication']
+
+FIRST_NAMES = ['Ana', 'Wei', 'Priya', 'James', 'Fatima', 'Kenji', 'Olga', 'Luis', 'Amara', 'Sam']
+LAST_NAMES = ['Nguyen', 'Garcia', 'Smith', 'Kim', 'Okafor', 'Rossi', 'Ivanova', 'Chen', 'Patel', 'Cohen']
+COLLABORATIONS = ['ATLAS Collaboration', 'CMS Collaboration', 'DESI Collaboration',
+                  'IceCube Collaboration', 'LZ Collaboration']
+
+
+def make_author(rng, index, collaboration_rate=0.01):
+    # FOR JSON AUTO leaves out NULL columns, so optional keys are sometimes missing.
+    if rng.random() < collaboration_rate:
+        return {'last_name': rng.choice(COLLABORATIONS), 'type': 'AUTHOR'}
+
+    author = {'last_name': rng.choice(LAST_NAMES), 'type': 'AUTHOR'}
+    if rng.random() < 0.95:
+        author['first_name'] = rng.choice(FIRST_NAMES)
+    if rng.random() < 0.3:
+        author['middle_name'] = rng.choice('ABCDEFGHJKLMNPRSTW')
+    if rng.random() < 0.4:
+        author['email'] = f"author{index}@example.org"
+    if rng.random() < 0.05:
+        author['type'] = 'CONTRIBUTING'
+        author['contributor_type'] = 'Editor'
+    return author
+
+
+# Mostly small author lists, with a long tail up to the query's 500-author cap.
+def get_author_count(rng, max_authors=500):
+    if rng.random() < 0.02:
+        return max_authors
+    return min(max_authors, int(rng.paretovariate(1.2) * 3))
+
+
+def make_elements_pub(pub_id, rng=None, n_authors=None):
+    rng = rng or random.Random(pub_id)
+    eschol_id = f"qt{pub_id:08x}"
+    pub_type = rng.choice(PUB_TYPES)
+
+    if n_authors is None:
+        n_authors = get_author_count(rng)
+    authors = [make_author(rng, i) for i in range(n_authors)]
+    grants = [{'type': 'SPONSOR', 'name': 'USDOE Office of Science (SC)'}
+              for _ in range(rng.randint(1, 3))]
+    supp_files = [{'url': f"https://escholarship.org/content/{eschol_id}/supp/data{i}.csv",
+                   'file_extension': 'csv'} for i in range(rng.choice([0, 0, 0, 1, 3]))]
+
+    return {
+        'OSTI doi': None,
+        'OSTI eschol_id': None,
+        'id': pub_id,
+        'Elements URL': f"https://oapolicy.universityofcalifornia.edu/viewobject.html?cid=1&id={pub_id}",
+        'title': f"Synthetic publication {pub_id} on " + " ".join(rng.choices(LAST_NAMES, k=6)),
+        'Type': pub_type,
+        'publication-status': 'Published',
+        'doi': f"10.0000/synthetic.{pub_id}" if rng.random() < 0.8 else None,
+        'parent-title': None,
+        'Reporting Date 1': '03/15/2024',
+        'eschol Pub Date': '03/01/2024',
+        'eschol Online Pub Date': '03/01/2024',
+        'Pub Record ID': pub_id * 10,
+        'abstract': "Lorem ipsum dolor sit amet. " * rng.randint(5, 60) if rng.random() < 0.9 else None,
+        'eSchol ID': eschol_id,
+        'eschol_pr_modified_when': datetime(2024, 3, 1) + timedelta(minutes=pub_id),
+        'eSchol URL': f"https://escholarship.org/uc/item/{eschol_id[2:]}",
+        'ark': f"ark:/13030/{eschol_id}",
+        'Filename': f"{eschol_id}.pdf",
+        'File Extension': 'pdf',
+        'File Size': rng.randint(100_000, 20_000_000),
+        'File URL': f"https://escholarship.org/content/{eschol_id}/{eschol_id}.pdf",
+        'Journal Name': 'Journal of Synthetic Results',
+        'volume': str(rng.randint(1, 120)),
+        'issue': str(rng.randint(1, 12)),
+        'LBL Report Number': f"LBNL-{pub_id}" if rng.random() < 0.3 else None,
+        'name-of-conference': 'Synthetic Conference 2024' if pub_type == 'Conference papers' else None,
+        'authors': json.dumps(authors),
+        'grants': json.dumps(grants),
+        'Supplemental Files': json.dumps(supp_files) if supp_files else None,
+    }
+
+
+def make_elements_pubs(count, seed=0, n_authors=None):
+    rng = random.Random(seed)
+    return [make_elements_pub(i, rng, n_authors) for i in range(1, count + 1)]
+
+
+# Elements rows after submission, with the fields elink_2_functions adds.
+def make_submitted_pub(pub_id, rng=None):
+    rng = rng or random.Random(pub_id)
+    pub = make_elements_pub(pub_id, rng)
+    pub['submission_json'] = {'title': pub['title'], 'site_unique_id': pub_id,
+                              'identifiers': [{'type': 'OTHER_ID', 'value': pub['ark']}],
+                              'persons': json.loads(pub['authors'])}
+    pub['osti_id'] = 2_000_000 + pub_id
+    pub['response_status_code'] = 200
+    pub['response_json'] = {'osti_id': pub['osti_id'], 'workflow_status': 'SO'}
+    pub['response_success'] = True
+    pub['media_id'] = 900_000 + pub_id
+    pub['media_file_id'] = 1_900_000 + pub_id
+    pub['media_response_code'] = 200
+    pub['media_response_json'] = {'files': [{'media_id': pub['media_id'],
+                                             'media_file_id': pub['media_file_id']}]}
+    pub['media_response_success'] = True
+    return pub
+
+
+# --------------------------
+# CDL OSTI DB rows, with the columns of get_osti_db_from_eschol.sql
+def make_cdl_osti_db_row(row_id, rng):
+    eschol_id = f"qt{row_id:08x}"
+    media_ok = rng.random() < 0.9
+    return {
+        'id': row_id,
+        'osti_id': 2_000_000 + row_id,
+        'doi': f"10.0000/synthetic.{row_id}" if rng.random() < 0.8 else None,
+        'elements_id': row_id,
+        'eschol_ark': f"ark:/13030/{eschol_id}",
+        'eschol_id': eschol_id,
+        'md5': None,
+        'eschol_pr_modified_when': datetime(2020, 1, 1) + timedelta(minutes=row_id, microseconds=row_id),
+        'prf_filename': f"{eschol_id}.pdf",
+        'prf_size': rng.randint(100_000, 20_000_000),
+        'media_response_code': 200 if media_ok else rng.choice([400, 404, 500]),
+        'media_id': 900_000 + row_id if media_ok else None,
+        'media_file_id': 1_900_000 + row_id if media_ok else None,
+        'media_id_deleted': b'\x01' if rng.random() < 0.01 else b'\x00',  # BIT columns come back as bytes
+    }
+
+
+# Table sizes from 1k to 500k rows. A generator, so big tables aren't held twice.
+def iter_cdl_osti_db_rows(count, seed=0):
+    rng = random.Random(seed)
+    for row_id in range(1, count + 1):
+        yield make_cdl_osti_db_row(row_id, rng)
+
+
+def make_cdl_osti_db_rows(count, seed=0):
+    return list(iter_cdl_osti_db_rows(count, seed))
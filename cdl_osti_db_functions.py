@@ -1,10 +1,27 @@
 # pyMySQL - https://pymysql.readthedocs.io/en/latest/
+import hashlib
+import json
+import os
+import queue
+import re
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+from time import time
 import pymysql
-from time import sleep
+import metrics
+import rate_limiter
 
 
-# Note: mysql_creds are set individually for read and write, So this
-#       connection should be called before each individual mysql_operation.
+# Max open connections per pool. There's one pool per set of mysql_creds,
+# so the read and write creds each get their own.
+POOL_SIZE = 5
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+# Opens a new connection. Use cdl_connection() to borrow a pooled one instead.
 def get_cdl_connection(mysql_creds):
     # connect to the mySql db
     try:
@@ -21,122 +38,480 @@ def get_cdl_connection(mysql_creds):
         raise e
 
 
-# Retrieves the entire eSchol OSTI db
-def get_cdl_osti_db(mysql_creds):
-    mysql_conn = get_cdl_connection(mysql_creds)
-
-    # Load .sql file
+class ConnectionPool:
+    def __init__(self, mysql_creds, size=POOL_SIZE):
+        self.mysql_creds = mysql_creds
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    # Borrows an idle connection (pinging it back to life if the server dropped it),
+    # or opens a new one if none are idle. Connections which raise are discarded.
+    @contextmanager
+    def connection(self):
+        self._slots.acquire()
+        try:
+            try:
+                mysql_conn = self._idle.get_nowait()
+                mysql_conn.ping(reconnect=True)
+            except queue.Empty:
+                mysql_conn = get_cdl_connection(self.mysql_creds)
+
+            try:
+                yield mysql_conn
+            except Exception:
+                mysql_conn.close()
+                raise
+
+            self._idle.put(mysql_conn)
+
+        finally:
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def get_creds_key(mysql_creds):
+    return mysql_creds['host'], mysql_creds['user'], mysql_creds['database']
+
+
+def get_pool(mysql_creds):
+    pool_key = get_creds_key(mysql_creds)
+    with _pools_lock:
+        if pool_key not in _pools:
+            _pools[pool_key] = ConnectionPool(mysql_creds)
+        return _pools[pool_key]
+
+
+def cdl_connection(mysql_creds):
+    return get_pool(mysql_creds).connection()
+
+
+def close_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+# --------------------------
+# Write-behind for CDL DB writes. When enabled, writes are appended to a local
+# journal (fsync'd, so an OSTI ID is never lost to a crash) and flushed to MySQL
+# in batches by a background thread, every max_rows rows or max_seconds seconds.
+# Without it, each write is executed and committed immediately.
+JOURNAL_ROOT = "logs/cdl_write_journal"
+
+_write_buffers = {}
+
+
+def get_journal_dir(mysql_creds):
+    return os.path.join(JOURNAL_ROOT, f"{mysql_creds['host']}-{mysql_creds['database']}-"
+                                      f"{mysql_creds['table']}")
+
+
+# Datetimes and dates are journaled in the format MySQL expects.
+def journal_value(v):
+    if isinstance(v, datetime):
+        return v.strftime('%Y-%m-%d %H:%M:%S.%f')
+    if isinstance(v, date):
+        return v.isoformat()
+    return v
+
+
+# Runs a batch of (query, values) in a single transaction, grouped by query.
+#   INSERTs: one executemany, which pymysql sends as a multi-row INSERT
+#   (the VALUES list has to be all placeholders for that). Rows whose osti_id
+#   is already in the table are dropped first (see skip_existing_inserts).
+#   UPDATE ... WHERE osti_id=%s: combined into multi-row UPDATE ... CASE statements.
+# INSERTs go first, since later UPDATEs may target the rows they create.
+# The UPDATE statements each set different columns, so their relative order
+# only matters within the same query, which is kept.
+def execute_write_batch(mysql_creds, batch):
+    groups = {}
+    for query, values in sorted(batch, key=lambda w: not w[0].lstrip().startswith("INSERT")):
+        groups.setdefault(query, []).append(values)
+
+    with cdl_connection(mysql_creds) as mysql_conn, mysql_conn.cursor() as cursor:
+        rate_limiter.acquire('cdl_db')
+        with metrics.span('cdl_write', mode='batch'):
+            for query, rows in groups.items():
+                case_updates = get_case_updates(query, rows)
+                if case_updates is None:
+                    rows = skip_existing_inserts(cursor, query, rows)
+                    if rows:
+                        cursor.executemany(query, rows)
+                    continue
+                for update_query, update_values in case_updates:
+                    cursor.execute(update_query, update_values)
+            mysql_conn.commit()
+
+
+INSERT_COLUMNS_PATTERN = re.compile(r"^\s*INSERT\s+INTO\s+(\S+)\s*\(([^)]*)\)", re.IGNORECASE)
+
+
+# Drops the rows of an INSERT whose osti_id is already in the table, or earlier
+# in the batch. Nothing guarantees a unique key on osti_id, so without this, a
+# journal segment replayed after a crash between its commit and its removal
+# (or a flush retried after a lost commit reply) would insert its rows again.
+# Queries without an osti_id column are returned as they are.
+def skip_existing_inserts(cursor, query, rows):
+    match = INSERT_COLUMNS_PATTERN.match(query)
+    columns = [column.strip() for column in match.group(2).split(',')] if match else []
+    if 'osti_id' not in columns:
+        return rows
+
+    table = match.group(1)
+    osti_id_index = columns.index('osti_id')
+    osti_ids = list({row[osti_id_index] for row in rows})
+
+    existing = set()
+    for i in range(0, len(osti_ids), UPDATE_CHUNK_ROWS):
+        chunk = osti_ids[i:i + UPDATE_CHUNK_ROWS]
+        cursor.execute(f"SELECT osti_id FROM {table} "
+                       f"WHERE osti_id IN ({', '.join(['%s'] * len(chunk))});", chunk)
+        existing.update(row['osti_id'] for row in cursor.fetchall())
+
+    new_rows = []
+    for row in rows:
+        if row[osti_id_index] not in existing:
+            new_rows.append(row)
+            existing.add(row[osti_id_index])
+
+    if len(new_rows) < len(rows):
+        print(f"Skipped {len(rows) - len(new_rows)} CDL DB insert(s) already in {table}.")
+    return new_rows
+
+
+UPDATE_BY_OSTI_ID_PATTERN = re.compile(
+    r"^\s*UPDATE\s+(\S+)\s+SET\s+(.+?)\s+WHERE\s+osti_id\s*=\s*%s\s*;?\s*$",
+    re.IGNORECASE | re.DOTALL)
+
+# Rows per multi-row UPDATE statement, or per osti_id lookup
+UPDATE_CHUNK_ROWS = 500
+
+
+# Turns the rows of one "UPDATE table SET col=%s, ... WHERE osti_id=%s" query into
+# "SET col = CASE osti_id WHEN %s THEN %s ... END ... WHERE osti_id IN (...)"
+# statements. Returns None for queries of any other form.
+def get_case_updates(query, rows):
+    match = UPDATE_BY_OSTI_ID_PATTERN.match(query)
+    if not match:
+        return None
+
+    table, set_clause = match.groups()
+    assignments = [[part.strip() for part in a.split('=', 1)] for a in set_clause.split(',')]
+    if any(len(a) != 2 for a in assignments):
+        return None
+
+    # Later writes to the same osti_id win, as they would when run in order.
+    latest = {}
+    for row in rows:
+        latest[row[-1]] = row[:-1]
+
+    statements = []
+    osti_ids = list(latest)
+    for i in range(0, len(osti_ids), UPDATE_CHUNK_ROWS):
+        chunk = osti_ids[i:i + UPDATE_CHUNK_ROWS]
+        set_parts = []
+        values = []
+        param_index = 0
+
+        for column, expression in assignments:
+            # Literal values (e.g. media_id_deleted=true) are the same for every row.
+            if expression != '%s':
+                set_parts.append(f"{column} = {expression}")
+                continue
+
+            cases = ' '.join(['WHEN %s THEN %s'] * len(chunk))
+            set_parts.append(f"{column} = CASE osti_id {cases} END")
+            for osti_id in chunk:
+                values += [osti_id, latest[osti_id][param_index]]
+            param_index += 1
+
+        id_placeholders = ', '.join(['%s'] * len(chunk))
+        statements.append((
+            f"UPDATE {table} SET {', '.join(set_parts)} WHERE osti_id IN ({id_placeholders});",
+            values + chunk))
+    return statements
+
+
+class WriteBehindBuffer:
+    def __init__(self, mysql_creds, max_rows=50, max_seconds=30):
+        self.mysql_creds = mysql_creds
+        self.journal_dir = get_journal_dir(mysql_creds)
+        self.max_rows = max_rows
+        self.max_seconds = max_seconds
+
+        self._pending = []
+        self._pending_segments = []
+        self._segment_counter = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flush_requested = threading.Event()
+        self._stopped = threading.Event()
+
+        os.makedirs(self.journal_dir, exist_ok=True)
+        self._open_segment()
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    # Segment names sort in write order, which is the order they're replayed in.
+    def _open_segment(self):
+        self._segment_counter += 1
+        self._segment_path = os.path.join(
+            self.journal_dir, f"{int(time() * 1000):015d}-{self._segment_counter:06d}.jsonl")
+        self._segment = open(self._segment_path, "a")
+
+    def add(self, query, values):
+        values = [journal_value(v) for v in values]
+        with self._lock:
+            self._segment.write(json.dumps({'query': query, 'values': values}) + "\n")
+            self._segment.flush()
+            os.fsync(self._segment.fileno())
+
+            self._pending.append((query, values))
+            if len(self._pending) >= self.max_rows:
+                self._flush_requested.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._flush_requested.wait(self.max_seconds)
+            self._flush_requested.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"CDL DB write-behind flush failed, will retry: {e}")
+
+    # Sends everything pending. The journal segments covering the batch are only
+    # deleted after the commit; on failure the batch is put back for the next flush.
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return
+                batch, self._pending = self._pending, []
+                self._segment.close()
+                segments = self._pending_segments + [self._segment_path]
+                self._pending_segments = []
+                self._open_segment()
+
+            try:
+                execute_write_batch(self.mysql_creds, batch)
+            except Exception:
+                with self._lock:
+                    self._pending = batch + self._pending
+                    self._pending_segments = segments + self._pending_segments
+                raise
+
+            print(f"Flushed {len(batch)} write(s) to the CDL DB.")
+            for segment_path in segments:
+                os.remove(segment_path)
+
+    # Stops the background thread, and flushes whatever is left.
+    def close(self):
+        self._stopped.set()
+        self._flush_requested.set()
+        self._thread.join()
+        self.flush()
+
+        with self._lock:
+            self._segment.close()
+            if os.path.getsize(self._segment_path) == 0:
+                os.remove(self._segment_path)
+
+
+# Replays journal segments left behind by a run that died before flushing.
+# Should run before the CDL DB is read, so those rows aren't submitted twice.
+def replay_write_journal(mysql_creds):
+    journal_dir = get_journal_dir(mysql_creds)
+    if not os.path.isdir(journal_dir):
+        return
+
+    segment_paths = sorted(os.path.join(journal_dir, f)
+                           for f in os.listdir(journal_dir) if f.endswith(".jsonl"))
+
+    batch = []
+    for segment_path in segment_paths:
+        with open(segment_path) as f:
+            for line in f:
+                # A torn last line means the write never returned, so it was never relied on.
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                batch.append((entry['query'], entry['values']))
+
+    if batch:
+        print(f"Replaying {len(batch)} unflushed CDL DB write(s) from {journal_dir}.")
+        execute_write_batch(mysql_creds, batch)
+
+    for segment_path in segment_paths:
+        os.remove(segment_path)
+
+
+def enable_write_behind(mysql_creds, max_rows=50, max_seconds=30):
+    _write_buffers[get_creds_key(mysql_creds)] = WriteBehindBuffer(
+        mysql_creds, max_rows, max_seconds)
+
+
+def close_write_behind():
+    for buffer in _write_buffers.values():
+        buffer.close()
+    _write_buffers.clear()
+
+
+# All CDL DB writes go through here.
+def execute_write(mysql_creds, query, values):
+    write_buffer = _write_buffers.get(get_creds_key(mysql_creds))
+
+    if write_buffer:
+        with metrics.span('cdl_write', mode='journal'):
+            write_buffer.add(query, values)
+        return
+
+    with cdl_connection(mysql_creds) as mysql_conn, mysql_conn.cursor() as cursor:
+        rate_limiter.acquire('cdl_db')
+        with metrics.span('cdl_write', mode='direct'):
+            cursor.execute(query, values)
+            mysql_conn.commit()
+
+
+# Helper -- loads a .sql file and sets the table name
+def load_sql_file(filename, mysql_creds):
     try:
-        sql_file = open("sql_files/get_osti_db_from_eschol.sql")
-        sql_query = sql_file.read()
-        sql_query = sql_query.replace("table_replace", mysql_creds['table'])
+        with open(f"sql_files/{filename}") as sql_file:
+            sql_query = sql_file.read()
+        return sql_query.replace("table_replace", mysql_creds['table'])
 
     except Exception as e:
         print("ERROR WHILE READING OR OPENING .SQL FILE.")
         raise e
 
+
+# Retrieves the entire eSchol OSTI db
+def get_cdl_osti_db(mysql_creds):
+    sql_query = load_sql_file("get_osti_db_from_eschol.sql", mysql_creds)
+
     # Open cursor and send query
-    with mysql_conn.cursor() as cursor:
+    with cdl_connection(mysql_creds) as mysql_conn, mysql_conn.cursor() as cursor:
         print("Connected to eSchol MySQL DB. Getting osti_eschol db.")
-        cursor.execute(sql_query)
-        eschol_osti_db = cursor.fetchall()
+        with metrics.span('sql', file="get_osti_db_from_eschol.sql"):
+            cursor.execute(sql_query)
+            eschol_osti_db = cursor.fetchall()
 
     return eschol_osti_db
 
 
-# Inserts a single new (successful) metadata submission into the database
-def insert_new_metadata_submission(pub, mysql_creds):
-    mysql_conn = get_cdl_connection(mysql_creds)
+# Hash of the pub's submission JSON in a canonical form (sorted keys, no whitespace),
+# stored in the md5 column. A metadata update whose hash matches the stored one
+# would send OSTI the same record again. Computed once, when it's first needed.
+def get_submission_md5(pub):
+    if 'submission_md5' not in pub:
+        canonical = json.dumps(pub['submission_json'], sort_keys=True, separators=(',', ':'))
+        pub['submission_md5'] = hashlib.md5(canonical.encode()).hexdigest()
+    return pub['submission_md5']
 
-    with mysql_conn.cursor() as cursor:
-        pub = convert_nulls_for_sql(pub)
 
-        # Build the query
-        insert_query = (f"""INSERT INTO {mysql_creds['table']} 
-            (date_stamp, eschol_ark, osti_id,
-            doi, lbnl_report_no, elements_id,
-            eschol_id, eschol_pr_modified_when) VALUES \n""")
+# Inserts a single new (successful) metadata submission into the database
+def insert_new_metadata_submission(pub, mysql_creds):
+    pub = convert_nulls_for_sql(pub)
 
-        # Add the values from the pub
-        insert_query += (f"""(CURDATE(), '{pub['ark']}', {pub['osti_id']},
-            '{pub['doi']}', '{pub['LBL Report Number']}', {pub['id']},
-            '{pub['eSchol ID']}', '{pub['eschol_pr_modified_when'].strftime('%Y-%m-%d %H:%M:%S.%f')}');"""
-            ).replace("'Null'", 'Null')
+    # With a unique key on osti_id, ON DUPLICATE KEY UPDATE turns a second insert
+    # of the same record into an update. Journal replays don't rely on it: the
+    # batch skips rows already in the table (execute_write_batch).
+    insert_query = (f"""INSERT INTO {mysql_creds['table']}
+        (date_stamp, eschol_ark, osti_id,
+        doi, lbnl_report_no, elements_id,
+        eschol_id, eschol_pr_modified_when, md5)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+        eschol_ark=VALUES(eschol_ark), doi=VALUES(doi), lbnl_report_no=VALUES(lbnl_report_no),
+        elements_id=VALUES(elements_id), eschol_id=VALUES(eschol_id),
+        eschol_pr_modified_when=VALUES(eschol_pr_modified_when), md5=VALUES(md5);""")
 
-        # Open cursor and send query
-        cursor.execute(insert_query)
-        mysql_conn.commit()
+    insert_values = (
+        date.today(), pub['ark'], pub['osti_id'],
+        pub['doi'], pub['LBL Report Number'], pub['id'],
+        pub['eSchol ID'], pub['eschol_pr_modified_when'], get_submission_md5(pub))
 
-    mysql_conn.close()
+    execute_write(mysql_creds, insert_query, insert_values)
 
 
 # Updates a single item's metadata in the CDL OSTI DB.
 def update_osti_db_metadata(pub, mysql_creds):
-    mysql_conn = get_cdl_connection(mysql_creds)
+    print(f"Updating Elements ID:{pub['id']}, OSTI ID:{pub['osti_id']} with new metadata.")
+    pub = convert_nulls_for_sql(pub)
 
-    with mysql_conn.cursor() as cursor:
-        print(f"Updating Elements ID:{pub['id']}, OSTI ID:{pub['osti_id']} with new metadata.")
+    update_query = (f"""UPDATE {mysql_creds["table"]} SET
+                    eschol_ark=%s,
+                    doi=%s,
+                    lbnl_report_no=%s,
+                    elements_id=%s,
+                    eschol_id=%s,
+                    eschol_pr_modified_when=%s,
+                    md5=%s
+                    WHERE osti_id=%s;""")
 
-        pub = convert_nulls_for_sql(pub)
-        update_query = (f"""UPDATE {mysql_creds["table"]} SET
-                        eschol_ark='{pub['ark']}',
-                        doi='{pub['doi']}',
-                        lbnl_report_no='{pub['LBL Report Number']}',
-                        elements_id={pub['id']},
-                        eschol_id='{pub['eSchol ID']}',
-                        eschol_pr_modified_when='{pub['eschol_pr_modified_when'].strftime('%Y-%m-%d %H:%M:%S.%f')}'
-                        WHERE osti_id={pub['osti_id']}; """).replace("'Null'", 'Null')
+    update_values = (
+        pub['ark'], pub['doi'], pub['LBL Report Number'], pub['id'],
+        pub['eSchol ID'], pub['eschol_pr_modified_when'], get_submission_md5(pub),
+        pub['osti_id'])
 
-        cursor.execute(update_query)
-        mysql_conn.commit()
-        sleep(3)
+    execute_write(mysql_creds, update_query, update_values)
+
+
+# For metadata updates skipped because their submission JSON is unchanged:
+# advances eschol_pr_modified_when only, so they aren't selected again.
+# Written as one batch, since nothing else in the run touches these rows.
+def update_osti_db_modified_when(pubs, mysql_creds):
+    update_query = (f"""UPDATE {mysql_creds["table"]} SET
+                    eschol_pr_modified_when=%s
+                    WHERE osti_id=%s;""")
+
+    execute_write_batch(mysql_creds, [
+        (update_query, (pub['eschol_pr_modified_when'], pub['osti_id'])) for pub in pubs])
 
 
 # Update the CDL DB with a single media response
 def update_media_submission(pub, mysql_creds):
-    mysql_conn = get_cdl_connection(mysql_creds)
-    with mysql_conn.cursor() as cursor:
-        pub = convert_nulls_for_sql(pub)
+    pub = convert_nulls_for_sql(pub)
 
-        update_query = (f"""UPDATE {mysql_creds["table"]} SET 
-                        media_response_code={pub['media_response_code']},
-                        media_id={pub['media_id']},
-                        media_file_id={pub['media_file_id']},
-                        prf_filename='{pub['Filename']}',
-                        prf_size={pub['File Size']}
-                        WHERE osti_id={pub['osti_id']}; """
-                        ).replace("'Null'", 'Null')
+    update_query = (f"""UPDATE {mysql_creds["table"]} SET
+                    media_response_code=%s,
+                    media_id=%s,
+                    media_file_id=%s,
+                    prf_filename=%s,
+                    prf_size=%s
+                    WHERE osti_id=%s;""")
 
-        cursor.execute(update_query)
-        mysql_conn.commit()
-        sleep(3)
+    update_values = (
+        pub['media_response_code'], pub['media_id'], pub['media_file_id'],
+        pub['Filename'], pub['File Size'], pub['osti_id'])
 
-    mysql_conn.close()
+    execute_write(mysql_creds, update_query, update_values)
 
 
 # Update the CDL DB if a pub receives a 404 while submitting a PDF update to OSTI
 def update_media_deleted_id(pub, mysql_creds):
-    mysql_conn = get_cdl_connection(mysql_creds)
-    with mysql_conn.cursor() as cursor:
-        pub = convert_nulls_for_sql(pub)
-
-        update_query = (f"""UPDATE {mysql_creds["table"]} SET 
-                        media_id_deleted=true
-                        WHERE osti_id={pub['osti_id']};""")
+    update_query = (f"""UPDATE {mysql_creds["table"]} SET
+                    media_id_deleted=true
+                    WHERE osti_id=%s;""")
 
-        cursor.execute(update_query)
-        mysql_conn.commit()
-        sleep(3)
-
-    mysql_conn.close()
+    execute_write(mysql_creds, update_query, (pub['osti_id'],))
 
 
+# Empty strings and "None" strings are sent as NULL.
 def convert_nulls_for_sql(pub):
     converted_pub = {}
 
     for k, v in pub.items():
         if v is None or v == "None" or v == "":
-            converted_pub[k] = "Null"
+            converted_pub[k] = None
         else:
             converted_pub[k] = pub[k]
 
@@ -145,35 +520,31 @@ def convert_nulls_for_sql(pub):
 
 # Retrieves pubs with no DOIs from the past fiscal year
 def get_cdl_pubs_without_dois(mysql_creds):
-    mysql_conn = get_cdl_connection(mysql_creds)
-
-    # Load .sql file
-    try:
-        sql_file = open("sql_files/get_null_dois_from_cdl_db.sql")
-        sql_query = sql_file.read()
-        sql_query = sql_query.replace("table_replace", mysql_creds['table'])
-
-    except Exception as e:
-        print("ERROR WHILE READING OR OPENING .SQL FILE.")
-        raise e
+    sql_query = load_sql_file("get_null_dois_from_cdl_db.sql", mysql_creds)
 
     # Open cursor and send query
-    with mysql_conn.cursor() as cursor:
+    with cdl_connection(mysql_creds) as mysql_conn, mysql_conn.cursor() as cursor:
         print("Connected to eSchol MySQL DB. Getting osti_eschol db.")
-        cursor.execute(sql_query)
-        osti_submissions_without_dois = cursor.fetchall()
+        with metrics.span('sql', file="get_null_dois_from_cdl_db.sql"):
+            cursor.execute(sql_query)
+            osti_submissions_without_dois = cursor.fetchall()
 
     return osti_submissions_without_dois
 
 
 def update_with_osti_doi(creds, osti_id, osti_doi):
-    mysql_conn = get_cdl_connection(creds)
     query = f'UPDATE {creds["table"]} ' \
-            f'SET osti_doi = "{osti_doi}" ' \
-            f'WHERE osti_id = {osti_id};'
+            f'SET osti_doi = %s ' \
+            f'WHERE osti_id = %s;'
 
-    with mysql_conn.cursor() as cursor:
-        cursor.execute(query)
-        mysql_conn.commit()
+    execute_write(creds, query, (osti_doi, osti_id))
+
+
+# Writes many OSTI DOIs ({osti_id: doi}) in one batch, over one connection.
+def update_with_osti_dois(creds, osti_dois):
+    query = f'UPDATE {creds["table"]} ' \
+            f'SET osti_doi = %s ' \
+            f'WHERE osti_id = %s;'
 
-    mysql_conn.close()
+    execute_write_batch(creds, [(query, (osti_doi, osti_id))
+                                for osti_id, osti_doi in osti_dois.items()])
@@ -0,0 +1,120 @@
+# Local SQLite snapshot of the CDL OSTI DB, so each run only pulls changed rows
+# from MySQL instead of the whole table.
+#   New rows: found with a high-water mark on `id`.
+#   Changed rows: found by comparing a per-row CRC32 computed on the MySQL side
+#   (the reporter's UPDATEs don't touch date_stamp, so it can't be used here).
+#   Deleted rows: ids in the snapshot which MySQL no longer returns.
+import os
+import sqlite3
+from datetime import datetime
+import cdl_osti_db_functions as cdl
+import metrics
+
+
+SNAPSHOT_ROOT = "logs/cdl_osti_db_snapshot"
+
+# Columns from get_osti_db_from_eschol.sql
+SNAPSHOT_COLUMNS = [
+    'id', 'osti_id', 'doi', 'elements_id', 'eschol_ark', 'eschol_id', 'md5',
+    'eschol_pr_modified_when', 'prf_filename', 'prf_size', 'media_response_code',
+    'media_id', 'media_file_id', 'media_id_deleted']
+
+DATETIME_COLUMNS = ['eschol_pr_modified_when']
+
+# Max ids per "WHERE id IN (...)" query
+ID_CHUNK_SIZE = 1000
+
+
+def get_snapshot_path(mysql_creds):
+    return os.path.join(SNAPSHOT_ROOT, f"{mysql_creds['host']}-{mysql_creds['database']}-"
+                                       f"{mysql_creds['table']}.sqlite")
+
+
+def open_snapshot(mysql_creds):
+    os.makedirs(SNAPSHOT_ROOT, exist_ok=True)
+    snapshot_conn = sqlite3.connect(get_snapshot_path(mysql_creds))
+
+    column_defs = ", ".join("id INTEGER PRIMARY KEY" if c == 'id' else c
+                            for c in SNAPSHOT_COLUMNS)
+    snapshot_conn.execute(f"CREATE TABLE IF NOT EXISTS osti_db ({column_defs}, row_crc INTEGER)")
+    return snapshot_conn
+
+
+# --------------------------
+# Returns the full CDL OSTI DB (same rows as cdl.get_cdl_osti_db),
+# after pulling only the changes since the last run into the snapshot.
+def get_cdl_osti_db_incremental(mysql_creds):
+    snapshot_conn = open_snapshot(mysql_creds)
+    local_crcs = dict(snapshot_conn.execute("SELECT id, row_crc FROM osti_db"))
+    high_water_mark = max(local_crcs) if local_crcs else 0
+
+    print("Getting row checksums from the eSchol OSTI DB.")
+    remote_crcs = {row['id']: row['row_crc'] for row in get_remote_checksums(mysql_creds)}
+
+    changed_ids = [i for i, crc in remote_crcs.items()
+                   if i <= high_water_mark and local_crcs.get(i) != crc]
+    deleted_ids = [i for i in local_crcs if i not in remote_crcs]
+
+    # New rows above the high-water mark, plus changed rows below it.
+    changed_rows = get_remote_rows(mysql_creds, f"WHERE id > {int(high_water_mark)}")
+    for i in range(0, len(changed_ids), ID_CHUNK_SIZE):
+        id_list = ", ".join(str(int(row_id)) for row_id in changed_ids[i:i + ID_CHUNK_SIZE])
+        changed_rows += get_remote_rows(mysql_creds, f"WHERE id IN ({id_list})")
+
+    print(f"CDL OSTI DB snapshot: {len(changed_rows)} new or changed rows, "
+          f"{len(deleted_ids)} deleted, {len(remote_crcs)} total.")
+
+    # Rows changed between the checksum and row queries get the older checksum,
+    # so they're simply pulled again next run.
+    with snapshot_conn:
+        snapshot_conn.executemany(
+            "DELETE FROM osti_db WHERE id = ?", [(i,) for i in deleted_ids])
+
+        column_list = ", ".join(SNAPSHOT_COLUMNS + ['row_crc'])
+        placeholders = ", ".join("?" * (len(SNAPSHOT_COLUMNS) + 1))
+        snapshot_conn.executemany(
+            f"INSERT OR REPLACE INTO osti_db ({column_list}) VALUES ({placeholders})",
+            [[to_sqlite(row[c]) for c in SNAPSHOT_COLUMNS] + [remote_crcs.get(row['id'])]
+             for row in changed_rows])
+
+    osti_db = read_snapshot(snapshot_conn)
+    snapshot_conn.close()
+    return osti_db
+
+
+def get_remote_checksums(mysql_creds):
+    sql_query = cdl.load_sql_file("get_osti_db_checksums_from_eschol.sql", mysql_creds)
+    with cdl.cdl_connection(mysql_creds) as mysql_conn, mysql_conn.cursor() as cursor:
+        with metrics.span('sql', file="get_osti_db_checksums_from_eschol.sql"):
+            cursor.execute(sql_query)
+            return cursor.fetchall()
+
+
+def get_remote_rows(mysql_creds, where_clause):
+    sql_query = cdl.load_sql_file("get_osti_db_from_eschol.sql", mysql_creds)
+    sql_query = sql_query.replace("-- WHERE CLAUSE REPLACE", where_clause)
+    with cdl.cdl_connection(mysql_creds) as mysql_conn, mysql_conn.cursor() as cursor:
+        with metrics.span('sql', file="get_osti_db_from_eschol.sql"):
+            cursor.execute(sql_query)
+            return list(cursor.fetchall())
+
+
+def read_snapshot(snapshot_conn):
+    cursor = snapshot_conn.execute(
+        f"SELECT {', '.join(SNAPSHOT_COLUMNS)} FROM osti_db ORDER BY id")
+    return [from_sqlite(dict(zip(SNAPSHOT_COLUMNS, row))) for row in cursor]
+
+
+# --------------------------
+# SQLite has no datetime type, so those columns are stored as ISO strings.
+def to_sqlite(v):
+    if isinstance(v, datetime):
+        return v.isoformat()
+    return v
+
+
+def from_sqlite(row):
+    for c in DATETIME_COLUMNS:
+        if row[c] is not None:
+            row[c] = datetime.fromisoformat(row[c])
+    return row
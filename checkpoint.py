@@ -0,0 +1,161 @@
+# Per-run checkpoint journal (checkpoint.jsonl in the log folder).
+# Records each pub's progress through a phase, so a run that died part-way can be
+# picked up with --resume <log_folder>, without re-querying Elements or re-posting
+# pubs which already went through.
+#
+# Pub states, in order:
+#   new pubs:          transformed -> metadata_submitted -> metadata_written -> media_submitted -> done
+#   metadata updates:  transformed -> metadata_submitted -> done
+#   pdf updates:       transformed -> media_submitted -> done
+import json
+import os
+import threading
+from datetime import datetime
+from write_logs import serialize_datetime
+
+
+CHECKPOINT_FILENAME = "checkpoint.jsonl"
+
+# Submission results copied into the journal with each state change.
+RESULT_FIELDS = [
+    'osti_id', 'response_status_code', 'response_json', 'response_success',
+    'media_id', 'media_file_id', 'media_response_code', 'media_response_json',
+    'media_response_success']
+
+DATETIME_FIELDS = ['eschol_pr_modified_when']
+
+
+def restore_datetimes(pub):
+    for field in DATETIME_FIELDS:
+        if isinstance(pub.get(field), str):
+            pub[field] = datetime.fromisoformat(pub[field])
+    return pub
+
+
+class Checkpoint:
+    def __init__(self, log_folder):
+        self.path = os.path.join(log_folder, CHECKPOINT_FILENAME)
+        self._lock = threading.Lock()
+
+        self.run_args = None
+        self.phase_pubs = {}       # phase -> {pub id: pub}
+        self.completed_phases = set()
+        self.pub_logs = {}         # phase -> [run_log.RunLog, ...] for finished pubs
+        self._load()
+
+        self._file = open(self.path, "a")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path) as f:
+            for line in f:
+                # A torn last line is a write which never finished.
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+
+                if entry['event'] == 'run':
+                    self.run_args = entry['args']
+                elif entry['event'] == 'phase_transformed':
+                    self.completed_phases.add(entry['phase'])
+                elif entry['event'] == 'pub':
+                    pubs = self.phase_pubs.setdefault(entry['phase'], {})
+                    if 'pub' in entry:
+                        pubs[entry['id']] = restore_datetimes(entry['pub'])
+                    elif entry['id'] in pubs:
+                        pubs[entry['id']].update(entry['results'])
+                    else:
+                        continue
+                    pubs[entry['id']]['checkpoint_state'] = entry['state']
+
+    def _write(self, entry):
+        with self._lock:
+            self._file.write(json.dumps(entry, default=serialize_datetime) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+        for pub_logs in self.pub_logs.values():
+            for pub_log in pub_logs:
+                pub_log.close()
+
+    # --------------------------
+    def record_run_args(self, args):
+        self._write({'event': 'run', 'args': vars(args)})
+
+    # Records every transformed pub in full, then marks the phase's pub list as
+    # complete. Pubs carried over by restore_states() keep their recorded state.
+    def record_phase_pubs(self, phase, pubs):
+        for pub in pubs:
+            pub.setdefault('checkpoint_state', 'transformed')
+            self._write({'event': 'pub', 'phase': phase, 'id': pub['id'],
+                         'state': pub['checkpoint_state'], 'pub': pub})
+        self.record_phase_transformed(phase)
+
+    # The new pubs pipeline records each pub as it's transformed, and marks the
+    # pub list as complete once the whole query went through.
+    def record_phase_transformed(self, phase):
+        self._write({'event': 'phase_transformed', 'phase': phase})
+
+    # Every submit path records 'done' once a pub is finished (or has failed),
+    # which is when it's written to the phase's pub logs (anything with write(pub)
+    # and close(), e.g. a run_log.RunLog).
+    def attach_pub_log(self, phase, pub_log):
+        self.pub_logs.setdefault(phase, []).append(pub_log)
+
+    def record(self, phase, pub, state):
+        pub['checkpoint_state'] = state
+        entry = {'event': 'pub', 'phase': phase, 'id': pub['id'], 'state': state}
+        if state == 'transformed':
+            entry['pub'] = pub
+        else:
+            entry['results'] = {k: pub[k] for k in RESULT_FIELDS if k in pub}
+        self._write(entry)
+
+        if state == 'done':
+            for pub_log in self.pub_logs.get(phase, []):
+                pub_log.write(pub)
+
+    # --------------------------
+    # Returns the phase's pubs (with their last recorded state and results) if the
+    # phase got as far as a complete, transformed pub list. Otherwise None.
+    def get_phase_pubs(self, phase):
+        if phase not in self.completed_phases:
+            return None
+        return list(self.phase_pubs.get(phase, {}).values())
+
+    # For a phase without a complete pub list: the pubs it recorded which aren't done,
+    # e.g. from a pipeline run which was killed part-way.
+    def get_unfinished_pubs(self, phase):
+        return [pub for pub in self.phase_pubs.get(phase, {}).values()
+                if pub['checkpoint_state'] != 'done']
+
+    # For a re-queried phase: carries recorded states over to matching pubs,
+    # so pubs which already got an OSTI ID aren't posted again.
+    def restore_states(self, phase, pubs):
+        recorded = self.phase_pubs.get(phase, {})
+        for pub in pubs:
+            if pub['id'] in recorded and recorded[pub['id']]['checkpoint_state'] != 'transformed':
+                saved = recorded[pub['id']]
+                pub.update({k: saved[k] for k in RESULT_FIELDS if k in saved})
+                pub['checkpoint_state'] = saved['checkpoint_state']
+        return pubs
+
+
+# Restores the original run's arguments for --resume, so the resumed run uses
+# the same QA / PROD connections and phases.
+def load_resume_args(args):
+    saved = Checkpoint(args.resume)
+    saved.close()
+
+    if saved.run_args is None:
+        raise RuntimeError(f"No checkpoint found to resume in {args.resume}")
+
+    for k, v in saved.run_args.items():
+        if k != 'resume':
+            setattr(args, k, v)
+    return args
@@ -1,4 +1,10 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+from itertools import islice
+from time import perf_counter
 import pyodbc
+import metrics
 
 
 def get_elements_connection(sql_creds):
@@ -23,79 +29,184 @@ def get_elements_connection(sql_creds):
 
 
 # --------------------------
-# Make the temp table in elements
-def create_temp_table_in_elements(conn, osti_submitted_db):
-
-    # Helper -- returns an array of arrays of the specified size
-    def get_osti_eschol_chunks(osdb, chunk_size=500):
-        chunks = []
-        while len(osdb) >= chunk_size:
-            chunk = osdb[:chunk_size]
-            chunks.append(chunk)
-            del osdb[:chunk_size]
-        chunks.append(osdb)
-
-        # Prevents an error when submission table rows are multiples of 500
-        if len(chunks[-1]) == 0:
-            chunks.pop()
-
-        return chunks
-
-    # Helper -- MSSQL only accepts datetime/timestamp with 3 digits of fractional time
-    def format_datetime_for_mssql(dt):
-        if dt is not None:
-            dt = dt.strftime('%Y-%m-%d %H:%M:%S.%f')
-            dt = dt[:-3]
-        return dt
-
-    # Main work starts here
+# Columns loaded into #osti_submitted, with their OPENJSON types.
+OSTI_SUBMITTED_COLUMNS = [
+    ('osti_id', 'INT'),
+    ('elements_id', 'INT'),
+    ('doi', 'VARCHAR(80)'),
+    ('eschol_id', 'VARCHAR(80)'),
+    ('md5', 'VARCHAR(32)'),
+    ('eschol_pr_modified_when', 'VARCHAR(40)'),
+    ('prf_filename', 'VARCHAR(200)'),
+    ('prf_size', 'BIGINT'),
+    ('media_response_code', 'INT'),
+    ('media_id', 'INT'),
+    ('media_file_id', 'INT')]
+
+# Rows sent per OPENJSON round trip
+BULK_LOAD_ROWS = 20000
+
+
+# Helper -- JSON encoding for values coming out of MySQL
+def json_default(obj):
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if isinstance(obj, bytes):
+        return int.from_bytes(obj, 'big')
+    if isinstance(obj, Decimal):
+        return int(obj)
+    raise TypeError(f"Type not serializable: {type(obj)}")
+
+
+# Helper -- MSSQL only accepts datetime/timestamp with 3 digits of fractional time
+def format_datetime_for_mssql(dt):
+    if dt is not None:
+        dt = dt.strftime('%Y-%m-%d %H:%M:%S.%f')
+        dt = dt[:-3]
+    return dt
+
+
+# Helper -- yields lists of up to chunk_size rows from any iterable
+def get_chunks(rows, chunk_size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# --------------------------
+# Make the temp table in elements.
+# osti_submitted_db can be any iterable of row dicts (a list or a generator).
+# Each chunk is sent as one JSON parameter and unpacked server-side with OPENJSON,
+# so the whole table usually loads in a single round trip.
+def create_temp_table_in_elements(conn, osti_submitted_db, chunk_size=BULK_LOAD_ROWS):
     print("Creating temp table with submitted OSTI data.")
 
     # Load SQL file
     with open("sql_files/create_temp_table_in_elements.sql") as f:
         create_temp_table_sql = f.read()
 
-
     cursor = conn.cursor()
-    cursor.execute(create_temp_table_sql)
-
+    with metrics.span('sql', file="create_temp_table_in_elements.sql"):
+        cursor.execute(create_temp_table_sql)
+
+    column_names = [c[0] for c in OSTI_SUBMITTED_COLUMNS]
+    with_clause = ', '.join(f"{name} {sql_type}" for name, sql_type in OSTI_SUBMITTED_COLUMNS)
+
+    # The datetime arrives as an ISO string. LEFT(..., 23) keeps milliseconds,
+    # the same truncation format_datetime_for_mssql does for the executemany path.
+    select_list = ', '.join(
+        f"CONVERT(DATETIME, LEFT({name}, 23), 126)" if name == 'eschol_pr_modified_when' else name
+        for name in column_names)
+
+    bulk_insert_sql = f"""INSERT INTO #osti_submitted ({', '.join(column_names)})
+        SELECT {select_list}
+        FROM OPENJSON(?) WITH ({with_clause});"""
+
+    use_openjson = True
+    total_rows = 0
+    start_time = perf_counter()
+
+    for i, chunk in enumerate(get_chunks(osti_submitted_db, chunk_size), 1):
+        print(f"inserting chunk {i} ({len(chunk)} rows)")
+
+        if use_openjson:
+            payload = json.dumps([{c: row[c] for c in column_names} for row in chunk],
+                                 default=json_default)
+            try:
+                with metrics.span('temp_table_load', nbytes=len(payload), method='openjson'):
+                    cursor.execute(bulk_insert_sql, payload)
+            except pyodbc.Error as e:
+                # OPENJSON needs database compatibility level 130+
+                print(f"OPENJSON bulk load failed, falling back to executemany: {e}")
+                use_openjson = False
+
+        if not use_openjson:
+            with metrics.span('temp_table_load', method='executemany'):
+                insert_osti_submitted_rows(cursor, chunk)
+
+        total_rows += len(chunk)
+
+    elapsed = perf_counter() - start_time
+    rows_per_sec = total_rows / elapsed if elapsed else 0
+    print(f"Loaded {total_rows} rows into #osti_submitted in {elapsed:.2f}s "
+          f"({rows_per_sec:.0f} rows/sec).")
+
+
+# Fallback for servers without OPENJSON: parameterized fast_executemany
+def insert_osti_submitted_rows(cursor, rows):
     cursor.fast_executemany = True  # enables bulk inserting in executemany
-    osti_submitted_db_chunks = get_osti_eschol_chunks(osti_submitted_db)
-    for i, chunk in enumerate(osti_submitted_db_chunks, 1):
-        print(f"inserting chunk {i} / {len(osti_submitted_db_chunks)}")
-
-        insert_sql = '''INSERT INTO #osti_submitted (
-            osti_id,
-            elements_id,
-            doi,
-            eschol_id,
-            eschol_pr_modified_when,
-            prf_filename,
-            prf_size,
-            media_response_code,
-            media_id,
-            media_file_id)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) '''
-
-        insert_values = [
-            [row['osti_id'],
-             row['elements_id'],
-             row['doi'],
-             row['eschol_id'],
-             format_datetime_for_mssql(row['eschol_pr_modified_when']),
-             row['prf_filename'],
-             row['prf_size'],
-             row['media_response_code'],
-             row['media_id'],
-             row['media_file_id']
-             ] for row in chunk]
-
-        cursor.executemany(insert_sql, insert_values)
 
+    insert_sql = '''INSERT INTO #osti_submitted (
+        osti_id,
+        elements_id,
+        doi,
+        eschol_id,
+        md5,
+        eschol_pr_modified_when,
+        prf_filename,
+        prf_size,
+        media_response_code,
+        media_id,
+        media_file_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) '''
+
+    insert_values = [
+        [row['osti_id'],
+         row['elements_id'],
+         row['doi'],
+         row['eschol_id'],
+         row['md5'],
+         format_datetime_for_mssql(row['eschol_pr_modified_when']),
+         row['prf_filename'],
+         row['prf_size'],
+         row['media_response_code'],
+         row['media_id'],
+         row['media_file_id']
+         ] for row in rows]
+
+    cursor.executemany(insert_sql, insert_values)
+
+
+# --------------------------
+# pyodbc doesn't return dicts automatically, we have to make them ourselves.
+# Rows are yielded fetchmany batch by batch, as they come off the wire.
+FETCH_BATCH_SIZE = 100
+
+
+# The cursor is closed once the rows run out, or when the iterator is closed early.
+def iter_rows(cursor, batch_size=FETCH_BATCH_SIZE):
+    columns = [column[0] for column in cursor.description]
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            for row in rows:
+                yield dict(zip(columns, row))
+    finally:
+        cursor.close()
+
+
+# Helper -- runs a query loaded from sql_files/, timed in the metrics.
+# For the stream_* queries, this is the time until the first rows are ready.
+def execute_sql_file(cursor, filename, sql_query):
+    with metrics.span('sql', file=filename):
+        cursor.execute(sql_query)
+
+
+# The stream_* functions run their query right away and return a row iterator.
+# The get_* functions return the same rows as a list.
 
 # --------------------------
 # Query the Elements DB, find pubs which need to be sent.
 def get_new_osti_pubs(conn, args):
+    return list(stream_new_osti_pubs(conn, args))
+
+
+def stream_new_osti_pubs(conn, args):
     cursor = conn.cursor()
 
     # Load SQL file
@@ -104,22 +215,20 @@ def get_new_osti_pubs(conn, args):
 
     print("Executing query to retrieve new OSTI pubs.")
     sql_query = replace_url_variable_values(args.input_qa, sql_query)
-    cursor.execute(sql_query)
-
-    # pyodbc doesn't return dicts automatically, we have to make them ourselves
-    columns = [column[0] for column in cursor.description]
-    rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    execute_sql_file(cursor, "get_new_osti_pubs_from_elements.sql", sql_query)
 
-    return rows
+    return iter_rows(cursor)
 
 
 # --------------------------
 def get_full_temp_table(conn):
+    return list(stream_full_temp_table(conn))
+
+
+def stream_full_temp_table(conn):
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM #osti_submitted;")
-    columns = [column[0] for column in cursor.description]
-    rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
-    return rows
+    return iter_rows(cursor)
 
 
 # --------------------------
@@ -153,6 +262,10 @@ def add_individual_update_where_clause(id_list, sql_query):
 # --------------------------
 # Get OSTI-submitted items who've had metadata updates.
 def get_osti_metadata_updates(conn, args):
+    return list(stream_osti_metadata_updates(conn, args))
+
+
+def stream_osti_metadata_updates(conn, args):
 
     # Load SQL file
     with open("sql_files/get_updated_metadata_from_elements.sql") as f:
@@ -166,18 +279,18 @@ def get_osti_metadata_updates(conn, args):
 
     print("Executing query to retrieve updated OSTI pub metadata.")
     cursor = conn.cursor()
-    cursor.execute(sql_query)
-
-    # pyodbc doesn't return dicts automatically, we have to make them ourselves
-    columns = [column[0] for column in cursor.description]
-    rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    execute_sql_file(cursor, "get_updated_metadata_from_elements.sql", sql_query)
 
-    return rows
+    return iter_rows(cursor)
 
 
 # --------------------------
 # Get OSTI-submitted items whose PDFs have been re-deposited
 def get_osti_media_updates(conn, args):
+    return list(stream_osti_media_updates(conn, args))
+
+
+def stream_osti_media_updates(conn, args):
 
     # Load SQL file
     with open("sql_files/get_updated_pdfs_from_elements.sql") as f:
@@ -191,10 +304,6 @@ def get_osti_media_updates(conn, args):
 
     print("Executing query to retrieve updated OSTI pub PDFs.")
     cursor = conn.cursor()
-    cursor.execute(sql_query)
-
-    # pyodbc doesn't return dicts automatically, we have to make them ourselves
-    columns = [column[0] for column in cursor.description]
-    rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    execute_sql_file(cursor, "get_updated_pdfs_from_elements.sql", sql_query)
 
-    return rows
+    return iter_rows(cursor)
@@ -0,0 +1,287 @@
+# asyncio variant of elink_2_functions, for clearing large backlogs.
+# Built on httpx with HTTP/2, so dozens of OSTI requests can be in flight
+# over a handful of multiplexed connections. Requires: pip install "httpx[http2]"
+#
+# The submit_* functions at the bottom are synchronous wrappers with the same
+# arguments and return values as their elink_2_functions counterparts.
+# With PDF_CACHE_DIR set, PDFs come from the same on-disk cache as the sync client.
+# OSTI requests count against elink_2_functions.MAX_IN_FLIGHT, shared with the sync
+# client and with every other phase's client.
+import asyncio
+import os
+import tempfile
+import httpx
+import requests
+import cdl_osti_db_functions as cdl
+import metrics
+import rate_limiter
+from elink_2_functions import (
+    MAX_IN_FLIGHT, PdfSizeError, PdfSizeFailure, check_pdf_size, get_client, osti_in_flight,
+    update_pub_with_response, update_pub_with_media_response, record_checkpoint)
+
+
+# eScholarship PDF downloads in flight at once, per client.
+MAX_PDF_DOWNLOADS = 32
+
+# HTTP/2 multiplexes many requests per connection, so only a few are needed.
+MAX_CONNECTIONS = 4
+
+TIMEOUT_SECONDS = 120
+PDF_CHUNK_SIZE = 1024 * 256
+
+
+class AsyncElinkClient:
+    def __init__(self, osti_creds, max_pdf_downloads=MAX_PDF_DOWNLOADS):
+        limits = httpx.Limits(max_connections=MAX_CONNECTIONS,
+                              max_keepalive_connections=MAX_CONNECTIONS)
+
+        self.osti_client = httpx.AsyncClient(
+            base_url=osti_creds['base_url'],
+            headers={'Authorization': 'Bearer ' + osti_creds['token']},
+            http2=True, limits=limits, timeout=TIMEOUT_SECONDS)
+
+        self.pdf_client = httpx.AsyncClient(
+            headers={'user-agent': osti_creds['pdf_user_agent']},
+            http2=True, limits=limits, timeout=TIMEOUT_SECONDS, follow_redirects=True)
+
+        self.pdf_downloads = asyncio.Semaphore(max_pdf_downloads)
+
+        # The PDF cache is filled through the sync client (and its requests session),
+        # run in a worker thread.
+        self.cache_client = None
+        if osti_creds.get('pdf_cache_dir'):
+            self.cache_client = get_client(osti_creds)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.osti_client.aclose()
+        await self.pdf_client.aclose()
+
+    # All OSTI requests go through the rate limiter's bucket for their endpoint class.
+    # kwargs_builder is called per attempt, for request bodies which are single-use.
+    async def request(self, bucket, method, path, kwargs_builder=None, **kwargs):
+        endpoint = metrics.get_endpoint(method, path)
+
+        async def send_request():
+            if kwargs_builder:
+                kwargs.update(kwargs_builder())
+            async with osti_in_flight:
+                with metrics.span('http', endpoint=endpoint) as labels:
+                    response = await self.osti_client.request(method, path, **kwargs)
+                    labels['status'] = response.status_code
+                return response
+
+        return await rate_limiter.call_async(bucket, send_request)
+
+    async def post_metadata(self, pub):
+        return await self.request('osti_metadata', 'POST', "/records/submit",
+                                  json=pub['submission_json'])
+
+    async def put_metadata(self, pub):
+        return await self.request('osti_metadata', 'PUT', f"/records/{pub['osti_id']}/submit",
+                                  json=pub['submission_json'])
+
+    async def post_media(self, pub):
+        return await self.send_media(pub, 'POST', f"/media/{pub['osti_id']}")
+
+    async def put_media(self, pub):
+        return await self.send_media(pub, 'PUT', f"/media/{pub['osti_id']}/{pub['media_id']}")
+
+    # The PDF comes from the cache, or is spooled to a temp file chunk by chunk.
+    # Either way it's streamed from disk into the multipart upload, so memory use
+    # doesn't grow with the file size. As in the sync client, a PDF whose byte count
+    # doesn't match the Elements File Size isn't uploaded.
+    async def send_media(self, pub, method, path):
+        pdf_filename = pub['File URL'].split('/')[-1]
+
+        cached_pdf = None
+        if self.cache_client:
+            try:
+                cached_pdf = await run_blocking(self.cache_client.open_cached_pdf, pub)
+            except (requests.RequestException, OSError) as e:
+                print(f"PDF cache download failed, downloading instead: "
+                      f"Elements ID {pub['id']}: {e}")
+
+        with cached_pdf or tempfile.TemporaryFile() as pdf_file:
+            try:
+                if not cached_pdf:
+                    await self.download_pdf(pub, pdf_file)
+                check_pdf_size(pub, pdf_file.seek(0, os.SEEK_END))
+            except PdfSizeError as e:
+                print(f"PDF not uploaded: {e}: Elements ID {pub['id']}")
+                return PdfSizeFailure(str(e))
+
+            def build_media_kwargs():
+                pdf_file.seek(0)
+                return {'files': {'file': (pdf_filename, pdf_file, 'application/pdf')}}
+
+            return await self.request('osti_media', method, path,
+                                      kwargs_builder=build_media_kwargs,
+                                      params={'title': pub['title']})
+
+    async def download_pdf(self, pub, pdf_file):
+        async def send_request():
+            async with self.pdf_downloads:
+                pdf_file.seek(0)
+                pdf_file.truncate()
+                with metrics.span('pdf_download', source='spool') as labels:
+                    async with self.pdf_client.stream('GET', pub['File URL']) as pdf_response:
+                        # A body cut short of its Content-Length.
+                        try:
+                            async for chunk in pdf_response.aiter_bytes(PDF_CHUNK_SIZE):
+                                pdf_file.write(chunk)
+                        except httpx.RemoteProtocolError as e:
+                            raise PdfSizeError(f"PDF stream broke off after {pdf_file.tell()} "
+                                               f"bytes: {pub['File URL']}") from e
+                        labels['status'] = pdf_response.status_code
+                        labels['nbytes'] = pdf_file.tell()
+                        return pdf_response
+
+        return await rate_limiter.call_async('escholarship', send_request)
+
+    async def get_records(self, params):
+        return await self.request('osti_query', 'GET', "/records", params=params)
+
+    async def get_comments(self, osti_id):
+        return await self.request('osti_query', 'GET', f"/comments/{osti_id}")
+
+    async def get_single_pub(self, osti_id):
+        return await self.request('osti_query', 'GET', f"/records/{osti_id}")
+
+
+# Helper -- runs a blocking CDL DB call without stalling the event loop
+async def run_blocking(func, *args):
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, func, *args)
+
+
+# =======================================
+# Per-pub coroutines. Same steps, CDL DB writes and checkpoint states as elink_2_functions.
+async def submit_new_pub(client, pub, mysql_creds, checkpoint=None):
+    state = pub.get('checkpoint_state')
+    if state == 'done':
+        return pub
+
+    if state in (None, 'transformed'):
+        response = await client.post_metadata(pub)
+        pub = update_pub_with_response(pub, response)
+
+        if not pub['response_success']:
+            print(f"Submission Failure: Elements ID {pub['id']}")
+            print(pub['response_json'])
+            record_checkpoint(checkpoint, 'new', pub, 'done')
+            return pub
+
+        print(f"Metadata Submission OK: Elements ID {pub['id']}")
+        pub['osti_id'] = pub['response_json']['osti_id']
+        record_checkpoint(checkpoint, 'new', pub, 'metadata_submitted')
+        state = 'metadata_submitted'
+
+    if state == 'metadata_submitted':
+        await run_blocking(cdl.insert_new_metadata_submission, pub, mysql_creds)
+        record_checkpoint(checkpoint, 'new', pub, 'metadata_written')
+        state = 'metadata_written'
+
+    if state == 'metadata_written':
+        media_response = await client.post_media(pub)
+        pub = update_pub_with_media_response(pub, media_response)
+        print(f"Media submission {'OK' if pub['media_response_success'] else 'failure'}: "
+              f"Elements ID {pub['id']}")
+        record_checkpoint(checkpoint, 'new', pub, 'media_submitted')
+
+    await run_blocking(cdl.update_media_submission, pub, mysql_creds)
+    record_checkpoint(checkpoint, 'new', pub, 'done')
+    return pub
+
+
+async def submit_metadata_update(client, pub, mysql_creds, checkpoint=None):
+    state = pub.get('checkpoint_state')
+    if state == 'done':
+        return pub
+
+    if state in (None, 'transformed'):
+        response = await client.put_metadata(pub)
+        pub = update_pub_with_response(pub, response)
+        record_checkpoint(checkpoint, 'metadata_updates', pub, 'metadata_submitted')
+
+    if pub['response_success']:
+        print(f"Metadata Update Submission OK: Elements ID {pub['id']}")
+        await run_blocking(cdl.update_osti_db_metadata, pub, mysql_creds)
+    else:
+        print(f"Metadata Update Submission Failure: Elements ID {pub['id']}")
+        print(pub['response_json'])
+
+    record_checkpoint(checkpoint, 'metadata_updates', pub, 'done')
+    return pub
+
+
+async def submit_media_update(client, pub, mysql_creds, checkpoint=None):
+    state = pub.get('checkpoint_state')
+    if state == 'done':
+        return pub
+
+    if state in (None, 'transformed'):
+        # A null media_id means there was an error with the first pdf submission,
+        # so it requires a post() b/c no media file currently exists.
+        if pub.get('media_id') is None:
+            media_response = await client.post_media(pub)
+        else:
+            media_response = await client.put_media(pub)
+
+        pub = update_pub_with_media_response(pub, media_response)
+        record_checkpoint(checkpoint, 'pdf_updates', pub, 'media_submitted')
+
+    print(f"Media update {'OK' if pub['media_response_success'] else 'failure'}: "
+          f"Elements ID {pub['id']}")
+
+    if pub['media_response_code'] == 404:
+        await run_blocking(cdl.update_media_deleted_id, pub, mysql_creds)
+    elif pub['media_response_code'] != 409:
+        await run_blocking(cdl.update_media_submission, pub, mysql_creds)
+
+    record_checkpoint(checkpoint, 'pdf_updates', pub, 'done')
+    return pub
+
+
+# Every pub runs to the end, even after another one fails, so none is left
+# between its OSTI POST and its CDL DB write. Failures are then reported per pub,
+# and the first one is raised, as in the sync path.
+async def submit_all(submit_one, pubs, osti_creds, mysql_creds, action, checkpoint=None):
+    async with AsyncElinkClient(osti_creds) as client:
+        results = await asyncio.gather(
+            *(submit_one(client, pub, mysql_creds, checkpoint) for pub in pubs),
+            return_exceptions=True)
+
+    failures = [(pub, e) for pub, e in zip(pubs, results) if isinstance(e, Exception)]
+    for pub, e in failures:
+        print(f"Failed while {action}: Elements ID {pub['id']}: {e!r}")
+
+    if failures:
+        pub, e = failures[0]
+        raise RuntimeError(f"Failed while {action}: Elements ID {pub['id']} "
+                           f"({len(failures)} failed pub(s))") from e
+
+    return pubs
+
+
+# =======================================
+# Synchronous wrappers
+def submit_new_pubs(pubs, osti_creds, mysql_creds, checkpoint=None):
+    print(f"\nSubmitting {len(pubs)} new pubs "
+          f"(async, up to {MAX_IN_FLIGHT} OSTI requests in flight).")
+    return asyncio.run(submit_all(submit_new_pub, pubs, osti_creds, mysql_creds,
+                                  "submitting a new record", checkpoint))
+
+
+def submit_metadata_updates(pubs, osti_creds, mysql_creds, checkpoint=None):
+    print(f"\nSubmitting {len(pubs)} metadata updates (async).")
+    return asyncio.run(submit_all(submit_metadata_update, pubs, osti_creds, mysql_creds,
+                                  "submitting a metadata update", checkpoint))
+
+
+def submit_media_updates(pubs, osti_creds, mysql_creds, checkpoint=None):
+    print(f"\nSubmitting {len(pubs)} media updates (async).")
+    return asyncio.run(submit_all(submit_media_update, pubs, osti_creds, mysql_creds,
+                                  "updating a PDF", checkpoint))
@@ -1,65 +1,134 @@
 # OSTI E-Link 2 documentation https://review.osti.gov/elink2api/
+import os
+import threading
+from time import perf_counter
+from urllib.parse import parse_qsl, urlsplit
 import requests
-import mimetypes
-from time import sleep
+import requests.adapters
+import urllib3
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from requests_toolbelt.multipart.encoder import MultipartEncoder
 import cdl_osti_db_functions as cdl
+import metrics
+import rate_limiter
+from pdf_cache import get_pdf_cache
 
 
 # New Metadata submissions
-def submit_new_pubs(pubs_for_metadata_submission, osti_creds, mysql_creds):
-    submission_counter = 0
-    for pub in pubs_for_metadata_submission:
-        submission_counter += 1
-        print(f"\nSubmission {submission_counter}/{len(pubs_for_metadata_submission)}")
-        print(f"Submitting Publication ID: {pub['id']}")
+def submit_new_pubs(pubs_for_metadata_submission, osti_creds, mysql_creds, workers=1,
+                    checkpoint=None):
+    total = len(pubs_for_metadata_submission)
+
+    # Serial submission: each pub is finished before the next one starts.
+    if workers <= 1:
+        for counter, pub in enumerate(pubs_for_metadata_submission, 1):
+            submit_new_pub(pub, osti_creds, mysql_creds, counter, total, checkpoint)
+        return pubs_for_metadata_submission
+
+    # Concurrent submission: a pub's metadata -> media -> CDL DB chain runs
+    # in order inside a single worker, while separate pubs overlap.
+    print(f"\nSubmitting {total} new pubs with {workers} workers.")
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(submit_new_pub, pub, osti_creds, mysql_creds,
+                                   counter, total, checkpoint)
+                   for counter, pub in enumerate(pubs_for_metadata_submission, 1)]
 
         try:
+            for future in as_completed(futures):
+                future.result()
+
+        # Stop queued pubs from starting, then re-raise the failure.
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+
+    return pubs_for_metadata_submission
+
+
+# Helper -- records a pub's progress, if the run has a checkpoint journal.
+def record_checkpoint(checkpoint, phase, pub, state):
+    if checkpoint:
+        checkpoint.record(phase, pub, state)
+
+
+# Submits a single new pub: metadata, CDL DB insert, media, CDL DB media update.
+# The results are written onto the pub dict itself.
+# On --resume, pub['checkpoint_state'] says which of these steps already happened.
+def submit_new_pub(pub, osti_creds, mysql_creds, submission_counter, total, checkpoint=None):
+    print(f"\nSubmission {submission_counter}/{total}")
+    state = pub.get('checkpoint_state')
+
+    if state == 'done':
+        print(f"Already submitted (checkpoint): Elements ID {pub['id']}")
+        return pub
+
+    print(f"Submitting Publication ID: {pub['id']}")
+
+    try:
+        if state in (None, 'transformed'):
             response = post_metadata(osti_creds, pub)
             pub = update_pub_with_response(pub, response)
 
-            if pub['response_success']:
-                print("Metadata Submission OK.")
-                pub['osti_id'] = pub['response_json']['osti_id']
-
-                print("Updating CDL DB with response data.")
-                cdl.insert_new_metadata_submission(pub, mysql_creds)
-                sleep(3)
+            if not pub['response_success']:
+                print(f"Submission Failure: Elements ID {pub['id']}")
+                print(pub['response_json'])
+                record_checkpoint(checkpoint, 'new', pub, 'done')
+                return pub
 
-                print(f"Submitting media: Elements ID {pub['id']}, "
-                      f"OSTI ID {pub['osti_id']}, PDF: {pub['File URL']}")
+            print(f"Metadata Submission OK: Elements ID {pub['id']}")
+            pub['osti_id'] = pub['response_json']['osti_id']
+            record_checkpoint(checkpoint, 'new', pub, 'metadata_submitted')
+            state = 'metadata_submitted'
 
-                media_response = post_media(osti_creds, pub)
-                pub = update_pub_with_media_response(pub, media_response)
+        if state == 'metadata_submitted':
+            print(f"Updating CDL DB with response data: Elements ID {pub['id']}")
+            cdl.insert_new_metadata_submission(pub, mysql_creds)
+            record_checkpoint(checkpoint, 'new', pub, 'metadata_written')
+            state = 'metadata_written'
 
-                if pub['media_response_success']:
-                    print("Media submission OK.")
-                else:
-                    print(f"Media submission failure: {media_response.status_code}")
+        if state == 'metadata_written':
+            print(f"Submitting media: Elements ID {pub['id']}, "
+                  f"OSTI ID {pub['osti_id']}, PDF: {pub['File URL']}")
 
-                print("Updating CDL DB with Media data (will include media failure codes).")
-                cdl.update_media_submission(pub, mysql_creds)
+            media_response = post_media(osti_creds, pub)
+            pub = update_pub_with_media_response(pub, media_response)
 
+            if pub['media_response_success']:
+                print(f"Media submission OK: Elements ID {pub['id']}")
             else:
-                print("Submission Failure:")
-                print(pub['response_json'])
+                print(f"Media submission failure: Elements ID {pub['id']}, "
+                      f"{media_response.status_code}")
+            record_checkpoint(checkpoint, 'new', pub, 'media_submitted')
 
-        except Exception as e:
-            print(e)
-            print()
-            raise f"Failed while submitting a new record: Elements ID {pub['id']}"
+        print(f"Updating CDL DB with Media data (will include media failure codes): "
+              f"Elements ID {pub['id']}")
+        cdl.update_media_submission(pub, mysql_creds)
+        record_checkpoint(checkpoint, 'new', pub, 'done')
 
-    return pubs_for_metadata_submission
+    except Exception as e:
+        print(e)
+        print()
+        raise RuntimeError(f"Failed while submitting a new record: Elements ID {pub['id']}") from e
+
+    return pub
 
 
 # Update existing OSTI metadata
-def submit_metadata_updates(updated_osti_pubs, osti_creds, mysql_creds):
+def submit_metadata_updates(updated_osti_pubs, osti_creds, mysql_creds, checkpoint=None):
     for pub in updated_osti_pubs:
+        state = pub.get('checkpoint_state')
+        if state == 'done':
+            print(f"\nUpdate already submitted (checkpoint): Elements Pub. ID: {pub['id']}")
+            continue
+
         print(f"\nSubmitting update: Elements Pub. ID: {pub['id']}, OSTI ID: {pub['osti_id']}")
 
         try:
-            response = put_metadata(osti_creds, pub)
-            pub = update_pub_with_response(pub, response)
+            if state in (None, 'transformed'):
+                response = put_metadata(osti_creds, pub)
+                pub = update_pub_with_response(pub, response)
+                record_checkpoint(checkpoint, 'metadata_updates', pub, 'metadata_submitted')
 
             if pub['response_success']:
                 print("Metadata Update Submission OK.")
@@ -67,40 +136,50 @@ def submit_metadata_updates(updated_osti_pubs, osti_creds, mysql_creds):
                 cdl.update_osti_db_metadata(pub, mysql_creds)
             else:
                 print("Metadata Update Submission Failure:")
-                print(response.json())
+                print(pub['response_json'])
+
+            record_checkpoint(checkpoint, 'metadata_updates', pub, 'done')
 
         except Exception as e:
             print(e)
             print()
-            raise f"Failed while submitting a metadata update: Elements ID {pub['id']}"
+            raise RuntimeError(
+                f"Failed while submitting a metadata update: Elements ID {pub['id']}") from e
 
     return updated_osti_pubs
 
 
 # Replace PDF, or try a new PDF if the eSchol OSTI DB contains an error response.
-def submit_media_updates(updated_media_pubs, osti_creds, mysql_creds):
+def submit_media_updates(updated_media_pubs, osti_creds, mysql_creds, checkpoint=None):
     for pub in updated_media_pubs:
+        state = pub.get('checkpoint_state')
+        if state == 'done':
+            print(f"\nMedia update already submitted (checkpoint): Elements ID {pub['id']}")
+            continue
+
         print(f"\nSubmitting media update: Elements ID {pub['id']}, OSTI ID {pub['osti_id']},"
               f"\nMedia ID: {pub['media_id']}, Media File ID: {pub['media_file_id']}"
               f"\nPDF: {pub['File URL']}")
 
         try:
-            # A null media_id means there was an error with the first pdf submission,
-            # so it requires a post() b/c no media file currently exists.
-            media_response = None
-            if pub['media_id'] is None or 'media_id' not in pub.keys():
-                print("No media file ID: New PDF submission.")
-                media_response = post_media(osti_creds, pub)
-            else:
-                print("Existing file ID: Updating PDF.")
-                media_response = put_media(osti_creds, pub)
+            if state in (None, 'transformed'):
+                # A null media_id means there was an error with the first pdf submission,
+                # so it requires a post() b/c no media file currently exists.
+                media_response = None
+                if pub['media_id'] is None or 'media_id' not in pub.keys():
+                    print("No media file ID: New PDF submission.")
+                    media_response = post_media(osti_creds, pub)
+                else:
+                    print("Existing file ID: Updating PDF.")
+                    media_response = put_media(osti_creds, pub)
 
-            pub = update_pub_with_media_response(pub, media_response)
+                pub = update_pub_with_media_response(pub, media_response)
+                record_checkpoint(checkpoint, 'pdf_updates', pub, 'media_submitted')
 
             if pub['media_response_success']:
                 print("Media update OK.")
             else:
-                print(f"Media update failure: {media_response.status_code}")
+                print(f"Media update failure: {pub['media_response_code']}")
 
             if pub['media_response_code'] == 404:
                 print("Updating CDL DB to indicate a deleted Media ID.")
@@ -112,82 +191,342 @@ def submit_media_updates(updated_media_pubs, osti_creds, mysql_creds):
                 print("Updating CDL DB with Media data (includes non-404 failure codes).")
                 cdl.update_media_submission(pub, mysql_creds)
 
+            record_checkpoint(checkpoint, 'pdf_updates', pub, 'done')
+
         except Exception as e:
             print(e)
             print()
-            raise f"Failed while updating a PDF: Elements ID {pub['id']}"
+            raise RuntimeError(f"Failed while updating a PDF: Elements ID {pub['id']}") from e
 
     return updated_media_pubs
 
 
-def post_metadata(osti_creds, pub):
-    # Build the request & send it to OSTI
-    req_url = f"{osti_creds['base_url']}/records/submit"
-    headers = {'Authorization': 'Bearer ' + osti_creds['token']}
-    response = requests.post(req_url, json=pub['submission_json'], headers=headers)
-    return response
+# =======================================
+# E-Link client: owns one pooled keep-alive session for OSTI and one for
+# eScholarship PDFs, with the auth headers built once from osti_creds.
+# The module-level functions below are thin wrappers around a shared client.
+
+# Connections kept open per host. Should cover the --workers count.
+POOL_SIZE = 20
+
+# OSTI requests in flight at once across every client, sync and async, e.g. when
+# --parallel-phases gives each phase its own client.
+MAX_IN_FLIGHT = 20
+
+# Records per /records page (E-Link 2 returns at most 100).
+RECORDS_PAGE_ROWS = 100
+
+# Default lower bound on date_first_submitted for the LBNLSCH record queries.
+DATE_FIRST_SUBMITTED_FROM = '10/01/2024'
+
+_clients = {}
+_clients_lock = threading.Lock()
+osti_in_flight = rate_limiter.InFlightLimit(MAX_IN_FLIGHT)
+
+
+def make_pooled_session(pool_size=POOL_SIZE):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class ElinkClient:
+    def __init__(self, osti_creds, pool_size=POOL_SIZE):
+        self.base_url = osti_creds['base_url']
+
+        self.osti_session = make_pooled_session(pool_size)
+        self.osti_session.headers.update(
+            {'Authorization': 'Bearer ' + osti_creds['token']})
+
+        self.pdf_session = make_pooled_session(pool_size)
+        self.pdf_session.headers.update(
+            {'user-agent': osti_creds['pdf_user_agent']})
+
+        # Optional on-disk PDF cache, enabled with PDF_CACHE_DIR in .env
+        self.pdf_cache = None
+        if osti_creds.get('pdf_cache_dir'):
+            self.pdf_cache = get_pdf_cache(
+                osti_creds['pdf_cache_dir'],
+                osti_creds.get('pdf_cache_max_mb', 2048) * 1024 * 1024)
+
+    # All OSTI requests go through the rate limiter's bucket for their endpoint class.
+    # kwargs_builder is called per attempt, for request bodies which are single-use.
+    # Each attempt is timed separately, so retried 429s show up in the metrics.
+    def request(self, bucket, method, path, kwargs_builder=None, **kwargs):
+        req_url = f"{self.base_url}{path}"
+        endpoint = metrics.get_endpoint(method, path)
+
+        def send_request():
+            with osti_in_flight:
+                if kwargs_builder:
+                    kwargs.update(kwargs_builder())
+                with metrics.span('http', endpoint=endpoint) as labels:
+                    response = self.osti_session.request(method, req_url, **kwargs)
+                    labels['status'] = response.status_code
+                return response
+
+        return rate_limiter.call(bucket, send_request)
+
+    def post_metadata(self, pub):
+        return self.request('osti_metadata', 'POST', "/records/submit",
+                            json=pub['submission_json'])
+
+    def put_metadata(self, pub):
+        return self.request('osti_metadata', 'PUT', f"/records/{pub['osti_id']}/submit",
+                            json=pub['submission_json'])
+
+    def post_media(self, pub):
+        return self.send_media(pub, 'POST', f"/media/{pub['osti_id']}")
+
+    def put_media(self, pub):
+        return self.send_media(pub, 'PUT', f"/media/{pub['osti_id']}/{pub['media_id']}")
+
+    # POST and PUT media share this path. The PDF is read from the cache if one is
+    # configured, otherwise relayed from eScholarship to OSTI in chunks.
+    # Either way, memory use doesn't grow with the file size.
+    # A PDF whose byte count doesn't match the Elements File Size isn't uploaded
+    # (or the upload is cut off); the pub gets a PdfSizeFailure as its media response.
+    def send_media(self, pub, method, path):
+        pdf_filename = pub['File URL'].split('/')[-1]
+        pdf_sources = []
+
+        # The PDF stream and encoder are single-use, so both are reopened if the request is retried.
+        def build_media_kwargs():
+            pdf_source, pdf_body = self.open_pdf(pub)
+            pdf_sources.append(pdf_source)
+
+            mp_encoder = MultipartEncoder(
+                fields={'file': (pdf_filename, pdf_body, 'application/pdf')})
+            return {'headers': {'Content-Type': mp_encoder.content_type},
+                    'data': mp_encoder}
 
+        try:
+            return self.request('osti_media', method, path,
+                                kwargs_builder=build_media_kwargs,
+                                params={'title': pub['title']})
+        except PdfSizeError as e:
+            print(f"PDF not uploaded: {e}: Elements ID {pub['id']}")
+            return PdfSizeFailure(str(e))
+        finally:
+            for pdf_source in pdf_sources:
+                pdf_source.close()
+
+    # Returns (source to close, body for the multipart encoder).
+    # Falls back to streaming when the cache can't supply the PDF: a download into
+    # the cache broke off, or the blob was evicted before it could be opened.
+    def open_pdf(self, pub):
+        if self.pdf_cache:
+            try:
+                pdf_file = self.open_cached_pdf(pub)
+            except (requests.RequestException, OSError) as e:
+                print(f"PDF cache download failed, streaming instead: Elements ID {pub['id']}: {e}")
+                pdf_file = None
+
+            if pdf_file:
+                try:
+                    check_pdf_size(pub, os.fstat(pdf_file.fileno()).st_size)
+                except PdfSizeError:
+                    pdf_file.close()
+                    raise
+                return pdf_file, pdf_file
+
+        return self.open_pdf_stream(pub)
+
+    # Streamed GET for a PDF, through the eScholarship bucket. The span only
+    # covers the response headers; the body is timed by whoever reads it.
+    def get_pdf(self, url, headers):
+        def send_request():
+            with metrics.span('http', endpoint="GET eScholarship PDF") as labels:
+                response = self.pdf_session.get(url, headers=headers, stream=True)
+                labels['status'] = response.status_code
+            return response
+
+        return rate_limiter.call('escholarship', send_request)
+
+    # Downloads (or revalidates) the pub's PDF in the cache, returning its local path.
+    def fetch_cached_pdf(self, pub):
+        return self.pdf_cache.fetch(pub, lambda headers: self.get_pdf(pub['File URL'], headers))
+
+    # Same, but returns the cached PDF opened for reading (or None), so it can't be
+    # evicted by another worker before the upload reads it.
+    def open_cached_pdf(self, pub):
+        return self.pdf_cache.open_blob(
+            pub, lambda headers: self.get_pdf(pub['File URL'], headers))
+
+    # Returns the eScholarship response, and a body for the multipart encoder:
+    # a PdfRelayStream when the byte count is known up front, otherwise the content.
+    def open_pdf_stream(self, pub):
+        start_time = perf_counter()
+        pdf_response = self.get_pdf(pub['File URL'], {'Accept-Encoding': 'identity'})
+
+        content_length = pdf_response.headers.get('Content-Length')
+        content_encoding = pdf_response.headers.get('Content-Encoding', 'identity')
+
+        # Error pages and encoded responses can't be relayed byte-for-byte.
+        if (pdf_response.status_code != 200 or content_encoding != 'identity'
+                or (content_length is None and pub.get('File Size') is None)):
+            pdf_response.raw.decode_content = True
+            content = pdf_response.content
+            metrics.record('pdf_download', perf_counter() - start_time, len(content),
+                           source='buffered')
+            try:
+                check_pdf_size(pub, len(content))
+            except PdfSizeError:
+                pdf_response.close()
+                raise
+            return pdf_response, content
+
+        expected_size = int(pub['File Size']) if pub.get('File Size') is not None else None
+        declared_size = int(content_length) if content_length is not None else expected_size
 
-def put_metadata(osti_creds, pub):
-    req_url = f"{osti_creds['base_url']}/records/{pub['osti_id']}/submit"
-    headers = {'Authorization': 'Bearer ' + osti_creds['token']}
-    response = requests.put(req_url, json=pub['submission_json'], headers=headers)
-    return response
+        try:
+            check_pdf_size(pub, declared_size)
+        except PdfSizeError:
+            pdf_response.close()
+            raise
+
+        return pdf_response, PdfRelayStream(
+            pdf_response.raw, declared_size, pub['File URL'], start_time)
+
+    def get_records(self, params):
+        return self.request('osti_query', 'GET', "/records", params=params)
+
+    # Yields every record a /records query matches, one page at a time.
+    # Follows the Link rel="next" header. If no page has had one, a full page
+    # is taken to mean there may be another, and the page param is stepped.
+    def get_all_records(self, params, rows=RECORDS_PAGE_ROWS):
+        params = dict(params, page=1, rows=rows)
+        has_links = False
+        while True:
+            response = self.get_records(params)
+            response.raise_for_status()
+            records = response.json()
+            yield from records
+
+            next_link = response.links.get('next')
+            if next_link:
+                has_links = True
+                params = dict(parse_qsl(urlsplit(next_link['url']).query))
+            elif not has_links and len(records) >= rows:
+                params = dict(params, page=int(params['page']) + 1)
+            else:
+                return
 
+    def get_comments(self, osti_id):
+        return self.request('osti_query', 'GET', f"/comments/{osti_id}")
 
-def post_media(osti_creds, pub):
-    req_url = f"{osti_creds['base_url']}/media/{pub['osti_id']}"
+    def get_single_pub(self, osti_id):
+        return self.request('osti_query', 'GET', f"/records/{osti_id}")
 
-    # Get the PDF file data from url
-    pdf_filename = pub['File URL'].split('/')[-1]
-    pdf_headers = {'user-agent': osti_creds['pdf_user_agent']}
+    def close(self):
+        self.osti_session.close()
+        self.pdf_session.close()
 
-    pdf_response = requests.get(
-        pub['File URL'],
-        headers=pdf_headers,
-        stream=True)
-    pdf_response.raw.decode_content = True
 
-    mp_encoder = MultipartEncoder(
-        fields={'file': (pdf_filename, pdf_response.content, 'application/pdf')}
-    )
+# File-like reader passed to the MultipartEncoder. The encoder reads .len as the
+# bytes still to come, and pulls chunks through read() while uploading.
+# The download is recorded in the metrics once the last byte has been read,
+# so its duration includes time spent waiting on the upload side.
+class PdfRelayStream:
+    def __init__(self, raw, size, url, start_time=None):
+        self.raw = raw
+        self.size = size
+        self.url = url
+        self.bytes_read = 0
+        self.start_time = start_time if start_time is not None else perf_counter()
 
-    headers = {'Authorization': 'Bearer ' + osti_creds['token'],
-               'Content-Type': mp_encoder.content_type}
-    params = {'title': pub['title']}
+    @property
+    def len(self):
+        return self.size - self.bytes_read
 
-    # Send the post with the PDF data
-    media_response = requests.post(
-        req_url, headers=headers, params=params, data=mp_encoder)
+    def read(self, amount=-1):
+        if amount is None or amount < 0 or amount > self.len:
+            amount = self.len
 
-    return media_response
+        # urllib3 reports a body cut short of its Content-Length as a ProtocolError.
+        try:
+            chunk = self.raw.read(amount)
+        except urllib3.exceptions.ProtocolError as e:
+            raise PdfSizeError(f"PDF stream broke off after {self.bytes_read}/{self.size} "
+                               f"bytes: {self.url}") from e
+        self.bytes_read += len(chunk)
 
+        # A short stream would otherwise leave the upload body incomplete.
+        if amount and not chunk:
+            raise PdfSizeError(
+                f"PDF stream ended after {self.bytes_read}/{self.size} bytes: {self.url}")
+
+        if chunk and self.len == 0:
+            metrics.record('pdf_download', perf_counter() - self.start_time, self.bytes_read,
+                           source='relay')
+
+        return chunk
+
+
+# Raised when a PDF's byte count doesn't match what was expected, before or
+# during the upload. send_media turns it into a media failure for the pub.
+class PdfSizeError(Exception):
+    pass
 
-def put_media(osti_creds, pub):
-    req_url = f"{osti_creds['base_url']}/media/{pub['osti_id']}/{pub['media_id']}"
 
-    # Get the PDF file data from url
-    pdf_filename = pub['File URL'].split('/')[-1]
-    pdf_headers = {'user-agent': osti_creds['pdf_user_agent']}
+# Stands in for OSTI's media response when the PDF wasn't (fully) uploaded.
+# It has no status code, so the CDL DB's media_response_code stays NULL and
+# the next run's PDF update query picks the pub up again.
+class PdfSizeFailure:
+    status_code = None
 
-    pdf_response = requests.get(
-        pub['File URL'],
-        headers=pdf_headers,
-        stream=True)
-    pdf_response.raw.decode_content = True
+    def __init__(self, message):
+        self.message = message
 
-    mp_encoder = MultipartEncoder(
-        fields={'file': (pdf_filename, pdf_response.content, 'application/pdf')})
+    def json(self):
+        return {'errors': [self.message]}
 
-    headers = {'Authorization': 'Bearer ' + osti_creds['token'],
-               'Content-Type': mp_encoder.content_type}
-    params = {'title': pub['title']}
+    def close(self):
+        pass
 
-    # Send the post with the PDF data
-    media_response = requests.put(
-        req_url, headers=headers, params=params, data=mp_encoder)
 
-    return media_response
+def check_pdf_size(pub, size):
+    if pub.get('File Size') is not None and str(size) != str(pub['File Size']):
+        raise PdfSizeError(f"eScholarship PDF is {size} bytes, Elements File Size "
+                           f"is {pub['File Size']} bytes")
+
+
+# Returns the shared client for these creds, creating it on first use.
+# An optional 'client_name' in osti_creds gets a separate client (and sessions).
+def get_client(osti_creds):
+    client_key = (osti_creds['base_url'], osti_creds['token'], osti_creds.get('client_name'))
+    with _clients_lock:
+        if client_key not in _clients:
+            _clients[client_key] = ElinkClient(osti_creds)
+        return _clients[client_key]
+
+
+def close_clients():
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+
+# =======================================
+# Thin wrappers around the shared client
+def post_metadata(osti_creds, pub):
+    return get_client(osti_creds).post_metadata(pub)
+
+
+def put_metadata(osti_creds, pub):
+    return get_client(osti_creds).put_metadata(pub)
+
+
+def post_media(osti_creds, pub):
+    return get_client(osti_creds).post_media(pub)
+
+
+def put_media(osti_creds, pub):
+    return get_client(osti_creds).put_media(pub)
 
 
 # Adds metadata response data to publication dict
@@ -205,7 +544,8 @@ def update_pub_with_media_response(pub, media_response):
     try:
         pub['media_response_code'] = media_response.status_code
         pub['media_response_json'] = media_response.json()
-        pub['media_response_success'] = (media_response.status_code < 300)
+        pub['media_response_success'] = (media_response.status_code is not None
+                                          and media_response.status_code < 300)
 
     except Exception as e:
         print("Nonstandard media API response.\n"
@@ -225,39 +565,29 @@ def update_pub_with_media_response(pub, media_response):
     return pub
 
 
-def get_pubs_by_workflow_status(osti_creds, workflow_status):
-    req_url = f"{osti_creds['base_url']}/records"
-    headers = {'Authorization': 'Bearer ' + osti_creds['token']}
+# Both return every matching record, across all pages.
+def get_pubs_by_workflow_status(osti_creds, workflow_status,
+                                date_first_submitted_from=DATE_FIRST_SUBMITTED_FROM):
     params = {
         'site_ownership_code': 'LBNLSCH',
-        'date_first_submitted_from': '10/01/2024',
+        'date_first_submitted_from': date_first_submitted_from,
         'workflow_status': workflow_status}
 
-    response = requests.get(req_url, params=params, headers=headers)
-    return response
+    return list(get_client(osti_creds).get_all_records(params))
 
 
-def get_hidden_pubs(osti_creds):
-    req_url = f"{osti_creds['base_url']}/records"
-    headers = {'Authorization': 'Bearer ' + osti_creds['token']}
+def get_hidden_pubs(osti_creds, date_first_submitted_from=DATE_FIRST_SUBMITTED_FROM):
     params = {
         'site_ownership_code': 'LBNLSCH',
-        'date_first_submitted_from': '10/01/2024',
+        'date_first_submitted_from': date_first_submitted_from,
         'hidden_flag': 'true'}
 
-    response = requests.get(req_url, params=params, headers=headers)
-    return response
+    return list(get_client(osti_creds).get_all_records(params))
 
 
 def get_comments(osti_creds, osti_id):
-    req_url = f"{osti_creds['base_url']}/comments/{osti_id}"
-    headers = {'Authorization': 'Bearer ' + osti_creds['token']}
-    response = requests.get(req_url, headers=headers)
-    return response
+    return get_client(osti_creds).get_comments(osti_id)
 
 
 def get_single_pub(osti_creds, osti_id):
-    req_url = f"{osti_creds['base_url']}/records/{osti_id}"
-    headers = {'Authorization': 'Bearer ' + osti_creds['token']}
-    response = requests.get(req_url, headers=headers)
-    return response
+    return get_client(osti_creds).get_single_pub(osti_id)
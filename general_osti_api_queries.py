@@ -1,28 +1,32 @@
 import program_setup
 import elink_2_functions as elink_2
-import requests
+import osti_mirror
 from pprint import pprint
 
 
+DATE_FIRST_SUBMITTED_FROM = '06/01/2024'
+
+
 # =======================================
 def main2():
     args = program_setup.process_args()
     creds = program_setup.assign_creds(args)
 
-    # Send the query, then convert and process the results
-    response = general_api_query(creds['osti_api'])
-    pubs = response.json()
+    # Send the query (or read the local mirror), then process the results
+    if args.osti_mirror:
+        pubs = osti_mirror.get_records(
+            creds['osti_api'], date_first_submitted_from=DATE_FIRST_SUBMITTED_FROM)
+    else:
+        pubs = general_api_query(creds['osti_api'])
     process_pubs(pubs)
 
 
+# Every matching record, across all pages.
 def general_api_query(osti_creds):
-    req_url = f"{osti_creds['base_url']}/records"
-    headers = {'Authorization': 'Bearer ' + osti_creds['token']}
     params = {'site_ownership_code': 'LBNLSCH',
-              'date_first_submitted_from': '06/01/2024'}
+              'date_first_submitted_from': DATE_FIRST_SUBMITTED_FROM}
 
-    response = requests.get(req_url, params=params, headers=headers)
-    return response
+    return list(elink_2.get_client(osti_creds).get_all_records(params))
 
 
 def process_pubs(pubs):
@@ -1,8 +1,11 @@
+from concurrent.futures import ThreadPoolExecutor
 import program_setup
 import cdl_osti_db_functions as cdl
 import elink_2_functions as elink_2
-from pprint import pprint
-from time import sleep
+
+
+# Concurrent OSTI record requests. They're also paced by rate_limiter's osti_query bucket.
+DOI_WORKERS = 8
 
 
 # =======================================
@@ -12,42 +15,51 @@ def main():
     args = program_setup.process_args()
     creds = program_setup.assign_creds(args)
 
-    pprint(creds)
-    pprint(creds['cdl_db_read'])
-
     # Get the null DOIs from the CDL DB
     cdl_submissions_without_dois = cdl.get_cdl_pubs_without_dois(creds['cdl_db_read'])
 
     print(f"{len(cdl_submissions_without_dois)} pubs without DOIs on our end"
           f" to query from OSTI.")
 
-    for item in cdl_submissions_without_dois:
-        sleep(1)
-        print(f"\n----------------")
-        print(f"Elements ID: {item['elements_id']}")
-        print(f"eSchol ID: {item['eschol_id']}")
-        print(f"OSTI ID: {item['osti_id']}")
-        print("Querying E-Link 2...")
-
-        try:
-            response = elink_2.get_single_pub(creds['osti_api'], item['osti_id'])
-            osti_pub = response.json()
-        except Exception as e:
-            print(e)
-            print("Request or JSON decode error. Skipping...")
-            continue
-
-        if osti_pub.get('doi') is None:
-            print("OSTI pub has no doi. Skipping...")
-            continue
-        elif osti_pub['doi'] is None or osti_pub['doi'] == 'None':
-            print("OSTI pub has no doi. Skipping...")
-            continue
-        else:
-            print(f"OSTI DOI found: {osti_pub['doi']}")
-            print("Updating CDL DB with OSTI DOI.")
-            cdl.update_with_osti_doi(
-                creds['cdl_db_write'], item['osti_id'], osti_pub['doi'])
+    osti_ids = [item['osti_id'] for item in cdl_submissions_without_dois]
+    osti_dois = get_osti_dois(creds['osti_api'], osti_ids)
+
+    print(f"\n{len(osti_dois)} OSTI DOIs found, "
+          f"{len(osti_ids) - len(osti_dois)} pubs still without a DOI.")
+    for osti_id, osti_doi in osti_dois.items():
+        print(f"OSTI ID: {osti_id}  DOI: {osti_doi}")
+
+    if not osti_dois:
+        return
+
+    if args.test:
+        print("\nTest mode: skipping the CDL DB update.")
+    else:
+        print("\nUpdating CDL DB with OSTI DOIs.")
+        cdl.update_with_osti_dois(creds['cdl_db_write'], osti_dois)
+
+
+# Queries E-Link 2 for the records concurrently.
+# Returns {osti_id: doi} for the records which have a DOI.
+def get_osti_dois(osti_creds, osti_ids):
+    with ThreadPoolExecutor(max_workers=DOI_WORKERS) as executor:
+        osti_dois = executor.map(lambda osti_id: get_osti_doi(osti_creds, osti_id), osti_ids)
+        return {osti_id: osti_doi for osti_id, osti_doi in zip(osti_ids, osti_dois)
+                if osti_doi is not None}
+
+
+def get_osti_doi(osti_creds, osti_id):
+    try:
+        response = elink_2.get_single_pub(osti_creds, osti_id)
+        osti_pub = response.json()
+    except Exception as e:
+        print(f"OSTI ID {osti_id}: request or JSON decode error ({e}). Skipping...")
+        return None
+
+    osti_doi = osti_pub.get('doi')
+    if osti_doi is None or osti_doi == 'None':
+        return None
+    return osti_doi
 
 
 # =======================================
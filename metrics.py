@@ -0,0 +1,162 @@
+# Timing spans for the slow parts of a run: SQL files, HTTP calls (by endpoint
+# and status), PDF downloads, CDL DB writes and the phases themselves.
+# Durations are kept per operation + labels, then summarized (count, total,
+# p50/p95/p99, max, bytes) into metrics.json in the log folder, and optionally
+# a Prometheus textfile for node_exporter's textfile collector.
+import json
+import os
+import re
+import threading
+import uuid
+from contextlib import contextmanager
+from time import perf_counter
+
+
+METRICS_FILENAME = "metrics.json"
+PERCENTILES = (50, 95, 99)
+PROMETHEUS_PREFIX = "osti_reporter"
+
+_durations = {}
+_bytes = {}
+_lock = threading.Lock()
+
+
+# Helper -- labels are stored as a sorted tuple, so they can key a dict.
+def get_key(operation, labels):
+    return operation, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def record(operation, seconds, nbytes=None, **labels):
+    key = get_key(operation, labels)
+    with _lock:
+        _durations.setdefault(key, []).append(seconds)
+        if nbytes is not None:
+            _bytes[key] = _bytes.get(key, 0) + nbytes
+
+
+# Times the block. Yields the labels dict, so labels only known afterwards
+# (e.g. the response status) can be added inside it, along with an 'nbytes' count:
+#   with metrics.span('http', endpoint='POST /records/submit') as labels:
+#       response = ...
+#       labels['status'] = response.status_code
+# A block which raises is recorded with status 'error', unless it set one.
+@contextmanager
+def span(operation, nbytes=None, **labels):
+    start_time = perf_counter()
+    try:
+        yield labels
+    except BaseException:
+        labels.setdefault('status', 'error')
+        raise
+    finally:
+        record(operation, perf_counter() - start_time, labels.pop('nbytes', nbytes), **labels)
+
+
+# Paths with IDs in them are grouped, e.g. /records/2345678/submit -> /records/{id}/submit
+def get_endpoint(method, path):
+    return f"{method} {re.sub(r'/[0-9]+', '/{id}', path)}"
+
+
+# Nearest-rank percentile of sorted values
+def get_percentile(sorted_values, percentile):
+    index = max(0, -(-len(sorted_values) * percentile // 100) - 1)
+    return sorted_values[int(index)]
+
+
+def get_summary():
+    with _lock:
+        durations = {key: sorted(values) for key, values in _durations.items()}
+        nbytes = dict(_bytes)
+
+    summary = []
+    for (operation, labels), values in sorted(durations.items()):
+        entry = {'operation': operation,
+                 'labels': dict(labels),
+                 'count': len(values),
+                 'total_seconds': round(sum(values), 4)}
+        for percentile in PERCENTILES:
+            entry[f"p{percentile}_seconds"] = round(get_percentile(values, percentile), 4)
+        entry['max_seconds'] = round(values[-1], 4)
+
+        if (operation, labels) in nbytes:
+            entry['bytes'] = nbytes[(operation, labels)]
+        summary.append(entry)
+
+    return summary
+
+
+def reset():
+    with _lock:
+        _durations.clear()
+        _bytes.clear()
+
+
+# --------------------------
+# Output
+def write_metrics(log_folder, prometheus_path=None):
+    summary = get_summary()
+
+    with open(os.path.join(log_folder, METRICS_FILENAME), "w") as f:
+        json.dump(summary, f, indent=4)
+
+    if prometheus_path:
+        write_prometheus_textfile(prometheus_path, summary)
+
+    print_metrics_report(summary)
+
+
+def escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_prometheus_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{escape_label_value(v)}"' for k, v in sorted(labels.items())) + "}"
+
+
+# One summary metric per operation, with a quantile series per percentile.
+# Written to a temp file then renamed, since the collector may read it at any time.
+def write_prometheus_textfile(prometheus_path, summary):
+    lines = []
+    operations = sorted({entry['operation'] for entry in summary})
+
+    for operation in operations:
+        entries = [entry for entry in summary if entry['operation'] == operation]
+        metric = f"{PROMETHEUS_PREFIX}_{operation}_seconds"
+        lines.append(f"# TYPE {metric} summary")
+        for entry in entries:
+            for percentile in PERCENTILES:
+                labels = dict(entry['labels'], quantile=f"{percentile / 100:g}")
+                lines.append(f"{metric}{format_prometheus_labels(labels)} "
+                             f"{entry[f'p{percentile}_seconds']}")
+            labels = format_prometheus_labels(entry['labels'])
+            lines.append(f"{metric}_sum{labels} {entry['total_seconds']}")
+            lines.append(f"{metric}_count{labels} {entry['count']}")
+
+        byte_entries = [entry for entry in entries if 'bytes' in entry]
+        if byte_entries:
+            byte_metric = f"{PROMETHEUS_PREFIX}_{operation}_bytes_total"
+            lines.append(f"# TYPE {byte_metric} counter")
+            for entry in byte_entries:
+                lines.append(f"{byte_metric}{format_prometheus_labels(entry['labels'])} "
+                             f"{entry['bytes']}")
+
+    tmp_path = f"{prometheus_path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, prometheus_path)
+
+
+def print_metrics_report(summary):
+    if not summary:
+        return
+
+    print("\n--------------------\nTimings (seconds):")
+    print(f"  {'operation':<58}{'count':>7}{'total':>10}{'p50':>8}{'p95':>8}{'p99':>8}")
+    for entry in summary:
+        labels = " ".join(f"{k}={v}" for k, v in entry['labels'].items())
+        name = f"{entry['operation']} {labels}".strip()
+        print(f"  {name[:57]:<58}{entry['count']:>7}{entry['total_seconds']:>10.2f}"
+              f"{entry['p50_seconds']:>8.3f}{entry['p95_seconds']:>8.3f}"
+              f"{entry['p99_seconds']:>8.3f}")
@@ -0,0 +1,191 @@
+# Local SQLite mirror of our site's (LBNLSCH) E-Link 2 records, with their audit
+# logs, media and workflow status, so the reports can query it instead of /records.
+#   Incremental sync: records updated since the day before the last sync
+#   (date_metadata_updated_from), page by page.
+#   Full sync (-fr): every record, and drops the ones OSTI no longer returns.
+#   Changes which don't bump date_metadata_updated (e.g. some workflow status or
+#   hidden flag changes) are only picked up by a full sync, so one runs
+#   automatically once the last full sync is older than FULL_SYNC_INTERVAL.
+#
+#   python3 osti_mirror.py          sync the PROD mirror (add -eq for E-Link QA)
+#   python3 osti_mirror.py -fr      full sync
+# The report scripts read the mirror with -om / --osti-mirror.
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+import program_setup
+import elink_2_functions as elink_2
+
+
+MIRROR_ROOT = "logs/osti_mirror"
+SITE_OWNERSHIP_CODE = 'LBNLSCH'
+
+# The date filter is by day, so the last sync's day is read again. This also
+# covers records updated while it ran.
+SYNC_OVERLAP = timedelta(days=1)
+
+# Longest time between full syncs.
+FULL_SYNC_INTERVAL = timedelta(days=7)
+
+MIRROR_COLUMNS = ['osti_id', 'workflow_status', 'hidden_flag', 'doi',
+                  'date_first_submitted', 'date_metadata_updated', 'record']
+
+
+def get_mirror_path(osti_creds):
+    host = urlsplit(osti_creds['base_url']).netloc.replace(':', '-')
+    return os.path.join(MIRROR_ROOT, f"{host}.sqlite")
+
+
+def open_mirror(osti_creds):
+    os.makedirs(MIRROR_ROOT, exist_ok=True)
+    mirror_conn = sqlite3.connect(get_mirror_path(osti_creds))
+    mirror_conn.execute("""CREATE TABLE IF NOT EXISTS records (
+        osti_id INTEGER PRIMARY KEY, workflow_status TEXT, hidden_flag INTEGER, doi TEXT,
+        date_first_submitted TEXT, date_metadata_updated TEXT, record TEXT)""")
+    mirror_conn.execute(
+        "CREATE INDEX IF NOT EXISTS records_workflow_status ON records (workflow_status)")
+    mirror_conn.execute("CREATE TABLE IF NOT EXISTS sync_state (name TEXT PRIMARY KEY, value TEXT)")
+    return mirror_conn
+
+
+# --------------------------
+# Pulls new and updated records into the mirror. The whole sync is one
+# transaction, so a failed sync leaves the mirror as it was.
+def sync(osti_creds, full=False):
+    mirror_conn = open_mirror(osti_creds)
+    started = datetime.now()
+    client = elink_2.get_client(osti_creds)
+
+    try:
+        last_full_sync = get_sync_state(mirror_conn, 'last_full_sync')
+        if not full and (last_full_sync is None
+                         or started - datetime.fromisoformat(last_full_sync) > FULL_SYNC_INTERVAL):
+            print(f"Last full sync: {last_full_sync or 'never'}. Running a full sync.")
+            full = True
+
+        last_sync = None if full else get_sync_state(mirror_conn, 'last_sync')
+
+        params = {'site_ownership_code': SITE_OWNERSHIP_CODE}
+        if last_sync:
+            updated_from = datetime.fromisoformat(last_sync) - SYNC_OVERLAP
+            params['date_metadata_updated_from'] = updated_from.strftime('%m/%d/%Y')
+            print(f"Syncing OSTI records updated from {params['date_metadata_updated_from']}.")
+        else:
+            print("Syncing all OSTI records.")
+
+        # Hidden records are queried separately, as the report always has.
+        records = {}
+        for query_params in (params, dict(params, hidden_flag='true')):
+            for record in client.get_all_records(query_params):
+                records[record['osti_id']] = record
+
+        with mirror_conn:
+            placeholders = ", ".join("?" * len(MIRROR_COLUMNS))
+            mirror_conn.executemany(
+                f"INSERT OR REPLACE INTO records ({', '.join(MIRROR_COLUMNS)}) "
+                f"VALUES ({placeholders})",
+                [get_mirror_row(record) for record in records.values()])
+
+            deleted_ids = []
+            if full:
+                deleted_ids = [osti_id for (osti_id,) in mirror_conn.execute(
+                    "SELECT osti_id FROM records") if osti_id not in records]
+                mirror_conn.executemany(
+                    "DELETE FROM records WHERE osti_id = ?", [(i,) for i in deleted_ids])
+
+            mirror_conn.execute("INSERT OR REPLACE INTO sync_state (name, value) VALUES (?, ?)",
+                                ('last_sync', started.isoformat()))
+            if full:
+                mirror_conn.execute(
+                    "INSERT OR REPLACE INTO sync_state (name, value) VALUES (?, ?)",
+                    ('last_full_sync', started.isoformat()))
+
+        total = mirror_conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+        print(f"OSTI mirror: {len(records)} new or updated records, "
+              f"{len(deleted_ids)} deleted, {total} total.")
+
+    finally:
+        mirror_conn.close()
+
+
+def get_mirror_row(record):
+    return [record['osti_id'],
+            record.get('workflow_status'),
+            int(bool(record.get('hidden_flag'))),
+            record.get('doi'),
+            to_iso_date(record.get('date_submitted_to_osti_first')),
+            record.get('date_metadata_updated'),
+            json.dumps(record)]
+
+
+# E-Link 2 dates are ISO 8601 ('2024-10-01T12:00:00.000+00:00'); RFC 2822 is accepted too.
+def to_iso_date(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value[:10]).date().isoformat()
+    except ValueError:
+        pass
+    try:
+        return parsedate_to_datetime(value).date().isoformat()
+    except (TypeError, ValueError):
+        return None
+
+
+def get_sync_state(mirror_conn, name):
+    row = mirror_conn.execute("SELECT value FROM sync_state WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else None
+
+
+# --------------------------
+# Queries, with the same filters as the live /records queries.
+# date_first_submitted_from is MM/DD/YYYY. Records without a first-submitted
+# date are always included.
+def get_records(osti_creds, workflow_status=None, hidden=None, date_first_submitted_from=None):
+    where = []
+    values = []
+    if workflow_status is not None:
+        where.append("workflow_status = ?")
+        values.append(workflow_status)
+    if hidden is not None:
+        where.append("hidden_flag = ?")
+        values.append(int(hidden))
+    if date_first_submitted_from:
+        where.append("(date_first_submitted IS NULL OR date_first_submitted >= ?)")
+        values.append(datetime.strptime(date_first_submitted_from, '%m/%d/%Y').date().isoformat())
+
+    where_clause = f"WHERE {' AND '.join(where)}" if where else ""
+
+    mirror_conn = open_mirror(osti_creds)
+    try:
+        last_sync = get_sync_state(mirror_conn, 'last_sync')
+        if last_sync is None:
+            print("Warning: the OSTI mirror has never been synced. Run osti_mirror.py first.")
+
+        rows = mirror_conn.execute(
+            f"SELECT record FROM records {where_clause} ORDER BY osti_id", values)
+        return [json.loads(record) for (record,) in rows]
+    finally:
+        mirror_conn.close()
+
+
+def get_last_sync(osti_creds):
+    mirror_conn = open_mirror(osti_creds)
+    try:
+        return get_sync_state(mirror_conn, 'last_sync')
+    finally:
+        mirror_conn.close()
+
+
+# =======================================
+def main():
+    args = program_setup.process_args()
+    creds = program_setup.assign_creds(args)
+    sync(creds['osti_api'], args.full_reload)
+
+
+if __name__ == "__main__":
+    main()
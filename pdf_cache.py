@@ -0,0 +1,216 @@
+# On-disk cache for eScholarship PDFs, shared between runs.
+# Entries are keyed by eSchol ID + Filename + File Size (the same fields
+# get_updated_pdfs_from_elements.sql compares), and point at content-addressed
+# blobs named by the file's sha256. Stale entries are revalidated with
+# conditional GETs (ETag / Last-Modified) and the cache is capped by LRU eviction.
+import hashlib
+import json
+import os
+import threading
+import uuid
+from time import perf_counter, time
+import metrics
+
+
+# Entries validated more recently than this are used without a conditional GET.
+REVALIDATE_AFTER_SECONDS = 600
+
+CHUNK_SIZE = 1024 * 256
+
+# One PdfCache per directory, shared by every E-Link client in the process,
+# so they don't overwrite each other's index or evict each other's blobs.
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_pdf_cache(cache_dir, max_bytes):
+    cache_key = os.path.realpath(cache_dir)
+    with _caches_lock:
+        if cache_key not in _caches:
+            _caches[cache_key] = PdfCache(cache_dir, max_bytes)
+        return _caches[cache_key]
+
+
+class PdfCache:
+    def __init__(self, cache_dir, max_bytes, revalidate_after=REVALIDATE_AFTER_SECONDS):
+        self.cache_dir = cache_dir
+        self.blob_dir = os.path.join(cache_dir, "blobs")
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.max_bytes = max_bytes
+        self.revalidate_after = revalidate_after
+        self._lock = threading.Lock()
+
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self.index = self._load_index()
+
+    # --------------------------
+    # Index persistence
+    def _load_index(self):
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_index(self):
+        tmp_path = f"{self.index_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _blob_path(self, sha256):
+        return os.path.join(self.blob_dir, f"{sha256}.pdf")
+
+    @staticmethod
+    def get_cache_key(pub):
+        key_source = f"{pub['eSchol ID']}|{pub['Filename']}|{pub['File Size']}"
+        return hashlib.sha256(key_source.encode()).hexdigest()
+
+    # --------------------------
+    # Returns a local path for the pub's PDF, downloading or revalidating as needed.
+    # send_get(headers) must return a streamed response for pub['File URL'].
+    # Returns None if eScholarship didn't return a usable file.
+    def fetch(self, pub, send_get):
+        cache_key = self.get_cache_key(pub)
+
+        with self._lock:
+            entry = self.index.get(cache_key)
+            if entry and not os.path.exists(self._blob_path(entry['sha256'])):
+                del self.index[cache_key]
+                entry = None
+
+        # Fresh enough to skip the round trip, unless it's just been evicted.
+        if entry and time() - entry['validated_at'] < self.revalidate_after:
+            blob_path = self._touch(cache_key, validated=False)
+            if blob_path:
+                return blob_path
+            entry = None
+
+        headers = {'Accept-Encoding': 'identity'}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+        start_time = perf_counter()
+        pdf_response = send_get(headers)
+        try:
+            if entry and pdf_response.status_code == 304:
+                blob_path = self._touch(cache_key, validated=True)
+                if blob_path:
+                    print(f"Cached PDF still current: Elements ID {pub['id']}")
+                    return blob_path
+
+                # Evicted while it was being revalidated: download it again.
+                pdf_response.close()
+                return self.fetch(pub, send_get)
+
+            if pdf_response.status_code != 200:
+                return None
+
+            sha256, size = self._write_blob(pdf_response)
+            metrics.record('pdf_download', perf_counter() - start_time, size, source='cache')
+
+        finally:
+            pdf_response.close()
+
+        with self._lock:
+            replaced = self.index.get(cache_key)
+            self.index[cache_key] = {
+                'sha256': sha256,
+                'size': size,
+                'url': pub['File URL'],
+                'etag': pdf_response.headers.get('ETag'),
+                'last_modified': pdf_response.headers.get('Last-Modified'),
+                'validated_at': time(),
+                'last_used': time()}
+
+            # Revalidation brought new content: drop the old blob, unless it's shared.
+            if replaced and replaced['sha256'] != sha256:
+                self._remove_blob_if_unused(replaced['sha256'])
+
+            self._evict(keep_key=cache_key)
+            self._save_index()
+            return self._blob_path(sha256)
+
+    # Same as fetch(), but returns the PDF opened for reading, or None.
+    # Another thread's eviction can remove the blob as soon as fetch() lets go of
+    # the lock, so it's opened under the lock; an open file outlives its removal.
+    # None if it was evicted in between; the caller then downloads it directly.
+    def open_blob(self, pub, send_get):
+        blob_path = self.fetch(pub, send_get)
+        if blob_path is None:
+            return None
+
+        with self._lock:
+            try:
+                return open(blob_path, 'rb')
+            except FileNotFoundError:
+                return None
+
+    # Returns None if the entry (or its blob) is gone, e.g. evicted by another thread.
+    def _touch(self, cache_key, validated):
+        with self._lock:
+            entry = self.index.get(cache_key)
+            if entry is None or not os.path.exists(self._blob_path(entry['sha256'])):
+                return None
+
+            entry['last_used'] = time()
+            if validated:
+                entry['validated_at'] = entry['last_used']
+            self._save_index()
+            return self._blob_path(entry['sha256'])
+
+    # Streams the response to a temp file, hashing as it goes, then moves it into place.
+    def _write_blob(self, pdf_response):
+        content_length = pdf_response.headers.get('Content-Length')
+        tmp_path = os.path.join(self.blob_dir, f"{uuid.uuid4().hex}.tmp")
+        sha256 = hashlib.sha256()
+        size = 0
+
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in pdf_response.iter_content(CHUNK_SIZE):
+                    sha256.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+
+            if content_length is not None and int(content_length) != size:
+                raise IOError(f"PDF download incomplete: {size}/{content_length} bytes "
+                              f"from {pdf_response.url}")
+
+            os.replace(tmp_path, self._blob_path(sha256.hexdigest()))
+
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        return sha256.hexdigest(), size
+
+    # Drops least-recently-used entries until the blobs fit under max_bytes.
+    # Called with the lock held. keep_key is the entry that was just added.
+    def _evict(self, keep_key=None):
+        blob_sizes = {e['sha256']: e['size'] for e in self.index.values()}
+        total_bytes = sum(blob_sizes.values())
+
+        for cache_key, entry in sorted(self.index.items(), key=lambda kv: kv[1]['last_used']):
+            if total_bytes <= self.max_bytes:
+                break
+            if cache_key == keep_key:
+                continue
+
+            del self.index[cache_key]
+            if self._remove_blob_if_unused(entry['sha256']):
+                total_bytes -= blob_sizes[entry['sha256']]
+
+    # Only removes a blob once no entry points at the same content.
+    # Called with the lock held. Returns True if the blob was removed.
+    def _remove_blob_if_unused(self, sha256):
+        if any(e['sha256'] == sha256 for e in self.index.values()):
+            return False
+
+        blob_path = self._blob_path(sha256)
+        if os.path.exists(blob_path):
+            os.remove(blob_path)
+        return True
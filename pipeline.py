@@ -0,0 +1,268 @@
+# Staged pipeline for new OSTI pubs:
+#   query -> transform -> PDF prefetch -> metadata submit -> media upload -> CDL DB write-back
+# Each stage runs in its own thread(s), connected by bounded queues, so PDFs are
+# already on disk by the time the metadata POST returns an OSTI ID.
+# The metadata stage inserts the new OSTI ID into the CDL DB right away (same as
+# elink_2.submit_new_pub), so an ID is never waiting in a queue when a run dies.
+# If a stage fails, pubs which already have an OSTI ID still get their media
+# upload and write-back; everything else is dropped, and picked up by the next run.
+# Each pub is checkpointed as it's transformed; --resume of a killed pipeline run
+# sends the unfinished ones serially.
+import os
+import queue
+import shutil
+import threading
+from itertools import islice
+
+import cdl_osti_db_functions as cdl
+import elements_db_functions as elements
+import elink_2_functions as elink_2
+import transform_pubs
+import write_logs
+from pdf_cache import PdfCache
+
+
+QUEUE_SIZE = 20
+MONITOR_INTERVAL_SECONDS = 1
+MONITOR_REPORT_EVERY = 10
+
+# Per-run prefetch cache, used when PDF_CACHE_DIR isn't configured.
+PREFETCH_CACHE_MAX_BYTES = 10 * 1024 * 1024 * 1024
+
+# Marks the end of a stage's input
+_DONE = object()
+
+
+# run_on_abort(item) says whether the stage should still process an item
+# after another stage has failed.
+class Stage:
+    def __init__(self, name, func, workers=1, run_on_abort=None):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.run_on_abort = run_on_abort
+        self.in_queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.next_stage = None
+        self._running = workers
+        self._lock = threading.Lock()
+
+
+class Pipeline:
+    def __init__(self, stages):
+        self.stages = stages
+        for stage, next_stage in zip(stages, stages[1:]):
+            stage.next_stage = next_stage
+
+        self.results = []
+        self.errors = []
+        self.abort = threading.Event()
+        self.depth_samples = {stage.name: [] for stage in stages}
+        self._finished = threading.Event()
+        self._results_lock = threading.Lock()
+
+    # Feeds the source iterator into the first stage, runs every stage to completion,
+    # and returns the pubs which made it out of the last stage.
+    def run(self, source):
+        threads = [threading.Thread(target=self._feed, args=(source,), daemon=True)]
+        for stage in self.stages:
+            threads += [threading.Thread(target=self._work, args=(stage,), daemon=True)
+                        for _ in range(stage.workers)]
+
+        monitor = threading.Thread(target=self._monitor, daemon=True)
+        monitor.start()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self._finished.set()
+        monitor.join()
+        self.print_queue_report()
+
+        if self.errors:
+            raise RuntimeError(f"Pipeline stopped after {len(self.errors)} error(s)") \
+                from self.errors[0]
+
+        return self.results
+
+    def _feed(self, source):
+        first_stage = self.stages[0]
+        try:
+            for item in source:
+                if self.abort.is_set():
+                    break
+                first_stage.in_queue.put(item)
+        except Exception as e:
+            self._fail("source", e)
+
+        for _ in range(first_stage.workers):
+            first_stage.in_queue.put(_DONE)
+
+    def _work(self, stage):
+        while True:
+            item = stage.in_queue.get()
+            if item is _DONE:
+                break
+
+            # After a failure, keep draining so upstream stages never block on a full queue.
+            if self.abort.is_set() and not (stage.run_on_abort and stage.run_on_abort(item)):
+                continue
+
+            try:
+                item = stage.func(item)
+            except Exception as e:
+                self._fail(stage.name, e)
+                continue
+
+            if stage.next_stage:
+                stage.next_stage.in_queue.put(item)
+            else:
+                with self._results_lock:
+                    self.results.append(item)
+
+        # The last worker out tells every worker in the next stage to finish.
+        with stage._lock:
+            stage._running -= 1
+            last_worker = stage._running == 0
+
+        if last_worker and stage.next_stage:
+            for _ in range(stage.next_stage.workers):
+                stage.next_stage.in_queue.put(_DONE)
+
+    def _fail(self, stage_name, e):
+        print(f"Pipeline error in stage '{stage_name}': {e}")
+        self.errors.append(e)
+        self.abort.set()
+
+    # Samples each stage's input queue depth; prints a snapshot every few seconds.
+    def _monitor(self):
+        samples = 0
+        while not self._finished.wait(MONITOR_INTERVAL_SECONDS):
+            for stage in self.stages:
+                self.depth_samples[stage.name].append(stage.in_queue.qsize())
+
+            samples += 1
+            if samples % MONITOR_REPORT_EVERY == 0:
+                print("Pipeline queue depths: " + ", ".join(
+                    f"{stage.name}={stage.in_queue.qsize()}" for stage in self.stages))
+
+    # Returns {stage name: {'max': ..., 'mean': ...}} for each stage's input queue.
+    # The stage whose queue stays full is waiting on the slowest stage after it.
+    def get_queue_depths(self):
+        depths = {}
+        for name, samples in self.depth_samples.items():
+            depths[name] = {
+                'max': max(samples) if samples else 0,
+                'mean': round(sum(samples) / len(samples), 2) if samples else 0}
+        return depths
+
+    def print_queue_report(self):
+        print(f"\nPipeline queue depths (input queue size {QUEUE_SIZE}):")
+        for name, depth in self.get_queue_depths().items():
+            print(f"  {name:<12} max {depth['max']:>3}   mean {depth['mean']:>6}")
+
+
+# =======================================
+# New OSTI pubs, pipelined
+def run_new_pubs_pipeline(args, creds, elements_conn, log_folder, submission_limit,
+                          checkpoint=None):
+    osti_creds = creds['osti_api']
+    mysql_creds = creds['cdl_db_write']
+
+    # Prefetching needs somewhere to put the PDFs. Without a configured cache,
+    # use a throwaway one in the log folder.
+    client = elink_2.get_client(osti_creds)
+    prefetch_dir = None
+    if client.pdf_cache is None:
+        prefetch_dir = os.path.join(log_folder, "pdf_prefetch")
+        client.pdf_cache = PdfCache(prefetch_dir, PREFETCH_CACHE_MAX_BYTES)
+
+    def transform(pub):
+        pub['submission_json'] = transform_pubs.build_submission_json(pub)
+        elink_2.record_checkpoint(checkpoint, 'new', pub, 'transformed')
+        return pub
+
+    def prefetch_pdf(pub):
+        try:
+            client.fetch_cached_pdf(pub)
+        except Exception as e:
+            # The media stage will stream the PDF instead.
+            print(f"PDF prefetch failed, will stream at upload: Elements ID {pub['id']}: {e}")
+        return pub
+
+    def submit_metadata(pub):
+        print(f"Submitting Publication ID: {pub['id']}")
+        response = elink_2.post_metadata(osti_creds, pub)
+        pub = elink_2.update_pub_with_response(pub, response)
+
+        if pub['response_success']:
+            print(f"Metadata Submission OK: Elements ID {pub['id']}")
+            pub['osti_id'] = pub['response_json']['osti_id']
+            elink_2.record_checkpoint(checkpoint, 'new', pub, 'metadata_submitted')
+            cdl.insert_new_metadata_submission(pub, mysql_creds)
+            elink_2.record_checkpoint(checkpoint, 'new', pub, 'metadata_written')
+        else:
+            print(f"Submission Failure: Elements ID {pub['id']}")
+            print(pub['response_json'])
+            elink_2.record_checkpoint(checkpoint, 'new', pub, 'done')
+
+        return pub
+
+    def upload_media(pub):
+        if pub['response_success']:
+            media_response = elink_2.post_media(osti_creds, pub)
+            pub = elink_2.update_pub_with_media_response(pub, media_response)
+            print(f"Media submission {'OK' if pub['media_response_success'] else 'failure'}: "
+                  f"Elements ID {pub['id']}")
+            elink_2.record_checkpoint(checkpoint, 'new', pub, 'media_submitted')
+        return pub
+
+    def write_back(pub):
+        if pub['response_success']:
+            cdl.update_media_submission(pub, mysql_creds)
+            elink_2.record_checkpoint(checkpoint, 'new', pub, 'done')
+        return pub
+
+    # A pub with an OSTI ID is already in the CDL DB, so the next run's query won't
+    # select it again. Its media upload has to happen now.
+    def has_osti_id(pub):
+        return bool(pub.get('response_success')) and pub.get('osti_id') is not None
+
+    pipeline = Pipeline([
+        Stage("transform", transform),
+        Stage("prefetch", prefetch_pdf, workers=args.workers),
+        Stage("metadata", submit_metadata, workers=args.workers),
+        Stage("media", upload_media, workers=args.workers, run_on_abort=has_osti_id),
+        Stage("write_back", write_back, run_on_abort=has_osti_id)])
+
+    print(f"\nRunning new pub pipeline with {args.workers} worker(s) per network stage.")
+    # The first submission_limit pubs, as in the serial path. Closing the row
+    # iterator afterwards closes the Elements cursor, even if it wasn't read to the end.
+    rows = elements.stream_new_osti_pubs(elements_conn, args)
+    source = islice(rows, submission_limit)
+
+    # Same as the serial path's full logging, from copies of the rows as queried.
+    query_results = []
+    if args.full_logging:
+        source = copy_rows(source, query_results)
+
+    try:
+        new_osti_pubs = pipeline.run(source)
+        if checkpoint:
+            checkpoint.record_phase_transformed('new')
+    finally:
+        rows.close()
+        if prefetch_dir:
+            client.pdf_cache = None
+            shutil.rmtree(prefetch_dir, ignore_errors=True)
+        if query_results:
+            write_logs.output_elements_query_results(log_folder, query_results)
+
+    return new_osti_pubs, pipeline.get_queue_depths()
+
+
+# Passes the rows through, keeping a copy of each.
+def copy_rows(rows, copies):
+    for row in rows:
+        copies.append(dict(row))
+        yield row
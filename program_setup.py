@@ -67,6 +67,89 @@ def process_args():
                         default=False,
                         help="Outputs: Temp table sql query and results; Submission and response files.")
 
+    parser.add_argument("-w", "--workers",
+                        dest="workers",
+                        type=int,
+                        default=1,
+                        help="Optional. Number of new pubs to submit to OSTI concurrently. \
+                            Each pub's metadata, media and CDL DB steps stay in order. Default is 1.")
+
+    parser.add_argument("-wb", "--write-behind",
+                        dest="write_behind",
+                        action="store_true",
+                        default=False,
+                        help="Optional. Journal CDL DB writes locally and flush them in batches, \
+                            rather than committing each row during submission.")
+
+    parser.add_argument("-fr", "--full-reload",
+                        dest="full_reload",
+                        action="store_true",
+                        default=False,
+                        help="Optional. Read the whole CDL OSTI DB from MySQL, rather than syncing \
+                            only changed rows into the local snapshot. \
+                            With osti_mirror.py, re-reads every OSTI record into the mirror.")
+
+    parser.add_argument("-pl", "--pipeline",
+                        dest="pipeline",
+                        action="store_true",
+                        default=False,
+                        help="Optional. Run new pub submission as a staged pipeline (query, transform, \
+                            PDF prefetch, metadata, media, CDL DB), with --workers threads per network stage.")
+
+    parser.add_argument("-as", "--async",
+                        dest="async_mode",
+                        action="store_true",
+                        default=False,
+                        help="Optional. Submit to OSTI with the asyncio/HTTP2 client (requires httpx[http2]), \
+                            keeping many requests in flight over a few connections.")
+
+    parser.add_argument("-pp", "--parallel-phases",
+                        dest="parallel_phases",
+                        action="store_true",
+                        default=False,
+                        help="Optional. Run the new pub, metadata update and PDF update phases at the same time, \
+                            each with its own Elements connection and E-Link session.")
+
+    parser.add_argument("-r", "--resume",
+                        dest="resume",
+                        default=None,
+                        help="Optional. Log folder of a run which stopped part-way. Re-runs it with its \
+                            original options, skipping the Elements queries and any pubs already submitted.")
+
+    parser.add_argument("-pm", "--prometheus-textfile",
+                        dest="prometheus_textfile",
+                        default=None,
+                        help="Optional. Also write the run's timing metrics to this path, in the Prometheus \
+                            text format (e.g. for node_exporter's textfile collector). \
+                            metrics.json is always written to the log folder.")
+
+    parser.add_argument("-lz", "--log-gzip",
+                        dest="log_gzip",
+                        action="store_true",
+                        default=False,
+                        help="Optional. Gzip the per-pub submission & response logs (.jsonl.gz).")
+
+    parser.add_argument("-lm", "--log-max-mb",
+                        dest="log_max_mb",
+                        type=int,
+                        default=100,
+                        help="Optional. Start a new per-pub log segment once the current one reaches \
+                            this size. Default is 100.")
+
+    parser.add_argument("-sf", "--submitted-from",
+                        dest="submitted_from",
+                        default="10/01/2024",
+                        help="Optional. For the OSTI record reports (e.g. workflow_status_and_hidden_report.py): \
+                            only include records first submitted on or after this date (MM/DD/YYYY). \
+                            Default is 10/01/2024.")
+
+    parser.add_argument("-om", "--osti-mirror",
+                        dest="osti_mirror",
+                        action="store_true",
+                        default=False,
+                        help="Optional. For the OSTI record reports: query the local mirror \
+                            (synced with osti_mirror.py) rather than E-Link.")
+
     parser.add_argument("-oco", "--output-concurrence-override",
                         dest="output_override",
                         action="store_true",
@@ -75,6 +158,17 @@ def process_args():
 
     args = parser.parse_args()
 
+    # A resumed run takes its options from the original run's checkpoint.
+    if args.resume:
+        from checkpoint import load_resume_args
+        args = load_resume_args(args)
+
+    if args.async_mode and args.pipeline:
+        raise RuntimeError("--async and --pipeline can't be combined.")
+
+    if args.workers < 1:
+        raise RuntimeError("--workers must be 1 or greater.")
+
     if (args.output_qa != args.elink_qa) and not args.output_override:
         raise RuntimeError("SAFETY CHECK!!! --elink-qa and --output-qa do not match. "
                            "Run with -oco if this is actually intended. Exiting.")
@@ -133,7 +227,9 @@ def assign_creds(args):
     selected_creds['osti_api'] = {
         "base_url": env['OSTI_URL' + elink_cnx],
         "token": env['OSTI_TOKEN' + elink_cnx],
-        "pdf_user_agent": env['PDF_USER_AGENT']}
+        "pdf_user_agent": env['PDF_USER_AGENT'],
+        "pdf_cache_dir": env.get('PDF_CACHE_DIR'),
+        "pdf_cache_max_mb": int(env.get('PDF_CACHE_MAX_MB', 2048))}
 
     return selected_creds
 
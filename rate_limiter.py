@@ -0,0 +1,233 @@
+# Shared throttling for OSTI E-Link, eScholarship and the CDL OSTI DB.
+# Each endpoint class gets its own token bucket. Buckets speed up while
+# requests succeed, and back off (honoring Retry-After) when OSTI pushes back.
+import asyncio
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from time import monotonic, sleep
+
+
+# Per-endpoint-class bucket settings.
+# rate: starting requests/sec; min_rate & max_rate: bounds for adaptation;
+# burst: tokens available at once; increase: rate added after each success.
+BUCKET_SETTINGS = {
+    'osti_metadata': dict(rate=0.5, min_rate=0.1, max_rate=4.0, burst=1, increase=0.1),
+    'osti_media': dict(rate=0.5, min_rate=0.1, max_rate=4.0, burst=1, increase=0.1),
+    'osti_query': dict(rate=1.0, min_rate=0.2, max_rate=10.0, burst=2, increase=0.2),
+    'osti_v1': dict(rate=4.0, min_rate=0.5, max_rate=8.0, burst=1, increase=0.1),
+    'escholarship': dict(rate=2.0, min_rate=0.5, max_rate=10.0, burst=2, increase=0.2),
+    'cdl_db': dict(rate=5.0, min_rate=1.0, max_rate=20.0, burst=5, increase=0.5),
+}
+
+# Status codes which mean "slow down". Only 429 is retried, since a 5xx
+# from a POST may or may not have been processed.
+THROTTLE_CODES = (429, 502, 503, 504)
+RETRY_CODES = (429,)
+
+# Used when a 429 arrives without a Retry-After header.
+DEFAULT_RETRY_AFTER = 10
+MAX_RETRY_AFTER = 300
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+class TokenBucket:
+    def __init__(self, name, rate, min_rate, max_rate, burst, increase):
+        self.name = name
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase = increase
+
+        self._tokens = burst
+        self._last_refill = monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    # Takes a token and returns how long the caller must wait before using it
+    # (for the token itself, or for a Retry-After pause). Tokens are reserved
+    # under the lock, so concurrent callers queue up fairly.
+    def reserve(self):
+        with self._lock:
+            now = monotonic()
+            self._refill(now)
+            self._tokens -= 1
+
+            token_wait = -self._tokens / self.rate if self._tokens < 0 else 0
+            pause_wait = self._paused_until - now
+            return max(token_wait, pause_wait, 0)
+
+    # Seconds left on the current Retry-After pause, if any.
+    def get_pause_wait(self):
+        with self._lock:
+            return max(self._paused_until - monotonic(), 0)
+
+    # Blocks until a token is available and any Retry-After pause has passed.
+    # A 429 can arrive while the caller waits for its token, so the pause is
+    # checked again after each wait.
+    def acquire(self):
+        wait = self.reserve()
+        while wait > 0:
+            sleep(wait)
+            wait = self.get_pause_wait()
+
+    async def acquire_async(self):
+        wait = self.reserve()
+        while wait > 0:
+            await asyncio.sleep(wait)
+            wait = self.get_pause_wait()
+
+    # Additive increase while the endpoint is healthy.
+    def report_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    # Multiplicative decrease, plus a full pause if the server asked for one.
+    def report_throttled(self, retry_after=None):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            if retry_after:
+                self._paused_until = max(self._paused_until, monotonic() + retry_after)
+
+
+# Caps the requests in flight at once, across threads and event loops, so the
+# sync and async clients (and each --parallel-phases phase) share one limit.
+# Async waiters park on a future in their own loop; every release wakes them
+# all to try again, so a cancelled waiter never holds up the rest.
+class InFlightLimit:
+    def __init__(self, limit):
+        self.limit = limit
+        self._count = 0
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+        self._async_waiters = []
+
+    def acquire(self):
+        with self._released:
+            while self._count >= self.limit:
+                self._released.wait()
+            self._count += 1
+
+    async def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                if self._count < self.limit:
+                    self._count += 1
+                    return
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            await waiter
+
+    def release(self):
+        with self._lock:
+            self._count -= 1
+            self._released.notify()
+            async_waiters, self._async_waiters = self._async_waiters, []
+
+        for loop, waiter in async_waiters:
+            try:
+                loop.call_soon_threadsafe(wake_waiter, waiter)
+            except RuntimeError:
+                # The waiter's loop has already closed.
+                pass
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    async def __aenter__(self):
+        await self.acquire_async()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.release()
+
+
+def wake_waiter(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def get_bucket(name):
+    with _buckets_lock:
+        if name not in _buckets:
+            _buckets[name] = TokenBucket(name, **BUCKET_SETTINGS[name])
+        return _buckets[name]
+
+
+def acquire(name):
+    get_bucket(name).acquire()
+
+
+# Retry-After may be a number of seconds or an HTTP date.
+def parse_retry_after(value):
+    if value is None:
+        return None
+
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            retry_date = parsedate_to_datetime(value)
+            seconds = (retry_date - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+
+    return min(max(seconds, 0), MAX_RETRY_AFTER)
+
+
+# Updates the bucket from a response. Returns True if the request should be retried.
+def report_response(bucket, response, attempt, max_retries):
+    if response.status_code not in THROTTLE_CODES:
+        bucket.report_success()
+        return False
+
+    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+    if response.status_code in RETRY_CODES and retry_after is None:
+        retry_after = DEFAULT_RETRY_AFTER
+    bucket.report_throttled(retry_after)
+
+    if response.status_code not in RETRY_CODES or attempt == max_retries:
+        return False
+
+    print(f"{response.status_code} from {bucket.name}; retrying in {retry_after}s "
+          f"(attempt {attempt + 1}/{max_retries}).")
+    return True
+
+
+# Sends a request through the named bucket. send_request is a zero-arg callable
+# returning a response-like object (.status_code, .headers, .close()). It is called
+# again for each retry, so it must rebuild any single-use request body.
+# A response which is retried is closed first, so a streamed one gives its
+# connection back to the pool.
+def call(name, send_request, max_retries=3):
+    bucket = get_bucket(name)
+
+    for attempt in range(max_retries + 1):
+        bucket.acquire()
+        response = send_request()
+        if not report_response(bucket, response, attempt, max_retries):
+            return response
+        response.close()
+
+
+# Same as call(), for a zero-arg coroutine function.
+async def call_async(name, send_request, max_retries=3):
+    bucket = get_bucket(name)
+
+    for attempt in range(max_retries + 1):
+        await bucket.acquire_async()
+        response = await send_request()
+        if not report_response(bucket, response, attempt, max_retries):
+            return response
@@ -0,0 +1,151 @@
+# Streaming per-pub run logs. Each pub is appended as one compact JSON line as
+# soon as it finishes, instead of the whole phase being dumped at the end, so
+# memory use stays flat and a run that dies part-way still has its output.
+#   {log_folder}/{name}-001.jsonl[.gz], {name}-002.jsonl[.gz], ...
+# A new segment is started when the current one passes max_bytes, and on each
+# (resumed) run, so a torn segment is never appended to.
+#
+# Reading a log back, e.g. to rebuild the end-of-run report:
+#   python3 run_log.py logs/2025-01-06-09-00-00
+#   python3 run_log.py logs/2025-01-06-09-00-00 --phase new --failures
+#   python3 run_log.py logs/2025-01-06-09-00-00 --id 1234567
+import argparse
+import glob
+import gzip
+import json
+import os
+import re
+import threading
+import zlib
+
+from write_logs import serialize_datetime, print_final_report
+
+
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024
+SEGMENT_PATTERN = re.compile(r"-(\d+)\.jsonl(\.gz)?$")
+
+# Checkpoint phase name -> log name
+PUB_LOG_NAMES = {
+    'new': "submissions-and-responses",
+    'metadata_updates': "v2-update-submissions-and-responses",
+    'pdf_updates': "pdf-update-submissions-and-responses"}
+
+
+def get_segment_number(path):
+    return int(SEGMENT_PATTERN.search(path).group(1))
+
+
+def get_segment_paths(log_folder, name):
+    paths = glob.glob(os.path.join(glob.escape(log_folder), f"{glob.escape(name)}-*.jsonl*"))
+    return sorted((p for p in paths if SEGMENT_PATTERN.search(p)), key=get_segment_number)
+
+
+class RunLog:
+    def __init__(self, log_folder, name, compress=False, max_bytes=DEFAULT_MAX_BYTES):
+        self.log_folder = log_folder
+        self.name = name
+        self.compress = compress
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        existing = get_segment_paths(log_folder, name)
+        self._segment_number = get_segment_number(existing[-1]) if existing else 0
+        self._raw = None
+        self._stream = None
+        self._open_segment()
+
+    def _open_segment(self):
+        self._segment_number += 1
+        extension = ".jsonl.gz" if self.compress else ".jsonl"
+        self.path = os.path.join(
+            self.log_folder, f"{self.name}-{self._segment_number:03d}{extension}")
+
+        self._raw = open(self.path, "ab")
+        self._stream = gzip.GzipFile(fileobj=self._raw, mode="ab") if self.compress else self._raw
+
+    def _close_segment(self):
+        if self._stream is not self._raw:
+            self._stream.close()
+        self._raw.close()
+
+    # Each line is flushed as it's written (for gzip, as a sync flush),
+    # so a crash costs at most the line being written.
+    def write(self, record):
+        line = json.dumps(record, default=serialize_datetime, separators=(',', ':')) + "\n"
+        with self._lock:
+            self._stream.write(line.encode())
+            self._stream.flush()
+
+            if self._raw.tell() >= self.max_bytes:
+                self._close_segment()
+                self._open_segment()
+
+    def close(self):
+        with self._lock:
+            self._close_segment()
+
+
+# --------------------------
+# Yields the records from every segment, oldest first. A torn last line,
+# or a gzip segment cut off mid-write, ends that segment quietly.
+def read_run_log(log_folder, name):
+    for path in get_segment_paths(log_folder, name):
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt") as f:
+            try:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+            except (EOFError, OSError, zlib.error):
+                print(f"Warning: {path} ends part-way through a write.")
+
+
+# A resumed run can log the same pub in more than one segment; the last one wins.
+def read_phase_pubs(log_folder, phase):
+    pubs = {}
+    for pub in read_run_log(log_folder, PUB_LOG_NAMES[phase]):
+        pubs[pub['id']] = pub
+    return list(pubs.values())
+
+
+# The same views as the end-of-run report, rebuilt from the logs.
+def print_report(log_folder):
+    print_final_report(
+        read_phase_pubs(log_folder, 'new'),
+        read_phase_pubs(log_folder, 'metadata_updates'),
+        read_phase_pubs(log_folder, 'pdf_updates'))
+
+
+# --------------------------
+def is_failure(pub):
+    return pub.get('response_success') is False or pub.get('media_response_success') is False
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("log_folder")
+    parser.add_argument("--phase", choices=list(PUB_LOG_NAMES),
+                        help="Print this phase's pubs as JSON lines, rather than the summary report.")
+    parser.add_argument("--id", type=int, dest="elements_id",
+                        help="Only print the pub with this Elements ID (with --phase, or across all phases).")
+    parser.add_argument("--failures", action="store_true", default=False,
+                        help="Only print pubs with a failed metadata or media submission.")
+    args = parser.parse_args()
+
+    if not args.phase and args.elements_id is None and not args.failures:
+        print_report(args.log_folder)
+        return
+
+    for phase in [args.phase] if args.phase else PUB_LOG_NAMES:
+        for pub in read_phase_pubs(args.log_folder, phase):
+            if args.elements_id is not None and pub['id'] != args.elements_id:
+                continue
+            if args.failures and not is_failure(pub):
+                continue
+            print(json.dumps(dict(pub, phase=phase)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,119 +1,335 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
 # Program modules
 import program_setup
 import write_logs
 import cdl_osti_db_functions as cdl
+import cdl_osti_db_snapshot
 import elements_db_functions as elements
 import transform_pubs
 import elink_2_functions as elink_2
+import pipeline
+import checkpoint
+import metrics
+import run_log
+import submission_archive
 
 
 # Global vars
 submission_limit = 200
-sleep_time = 3
 
 
 # =======================================
 def main():
-    # These lists are populated during the submission process.
-    new_osti_pubs = None
-    osti_metadata_updates = None
-    osti_pdf_updates = None
 
     # ---------- GENERAL SETUP
     # Process args; Assign creds based on args; Create the log folder.
     args = program_setup.process_args()
     creds = program_setup.assign_creds(args)
-    log_folder = write_logs.create_log_folder()
+
+    # A resumed run keeps writing to the original run's log folder.
+    if args.resume:
+        log_folder = args.resume
+    else:
+        log_folder = write_logs.create_log_folder()
+
+    run_checkpoint = checkpoint.Checkpoint(log_folder)
+    if not args.resume:
+        run_checkpoint.record_run_args(args)
+
+    # Outside of test mode, submissions and finished pubs also go to the shared archive.
+    archive = None
+    if not args.test:
+        archive = submission_archive.SubmissionArchive(os.path.basename(log_folder))
+
+    # Finished pubs are streamed to a JSONL log per phase as the checkpoint marks them done.
+    phases = get_phases(args)
+    for phase in phases:
+        run_checkpoint.attach_pub_log(phase, run_log.RunLog(
+            log_folder, run_log.PUB_LOG_NAMES[phase], args.log_gzip,
+            args.log_max_mb * 1024 * 1024))
+        if archive:
+            run_checkpoint.attach_pub_log(phase, archive.get_writer(submission_archive.RESULT_KINDS[phase]))
 
     # Returns an open & running ssh server if needed, otherwise False.
     if args.tunnel_needed:
         ssh_server = program_setup.get_ssh_server(args, creds['ssh'])
 
-    # Gets the db connections for Elements
-    elements_conn = elements.get_elements_connection(creds['elements_reporting_db'])
+    # Replay any CDL DB writes a previous run journaled but never flushed.
+    # Test mode makes no CDL DB writes, so the journal is left for a real run.
+    if not args.test:
+        cdl.replay_write_journal(creds['cdl_db_write'])
+    if args.write_behind:
+        cdl.enable_write_behind(creds['cdl_db_write'])
+
+    # Run the selected phases. Test mode stays serial, since it exits mid-phase.
+    # Timings are written to the log folder even if a phase fails.
+    try:
+        if args.parallel_phases and not args.test and len(phases) > 1:
+            run_phases_in_parallel(args, creds, log_folder, run_checkpoint, archive, phases)
+        else:
+            run_phases_serially(args, creds, log_folder, run_checkpoint, archive, phases)
+    finally:
+        metrics.write_metrics(log_folder, args.prometheus_textfile)
+
+    # Prints a digest of completed work, read back from the pub logs
+    # (so a resumed run's report includes the pubs finished before it stopped).
+    run_checkpoint.close()
+    if archive:
+        archive.close()
+    run_log.print_report(log_folder)
+
+    # Flush pending CDL DB writes, then close connections.
+    cdl.close_write_behind()
+    elink_2.close_clients()
+    cdl.close_pools()
+    if args.tunnel_needed:
+        ssh_server.stop()
+
+    print("\nProgram complete. Exiting.\n\n")
 
-    # CDL OSTI DB --> Elements temp table
-    create_and_transfer_temp_table(args, creds, elements_conn, log_folder)
 
+# =======================================
+# Checkpoint phase names for the phases selected by the args
+def get_phases(args):
+    phases = []
     if not args.updates_only:
-        new_osti_pubs = process_new_osti_pubs(
-            args, creds, elements_conn, log_folder)
-
+        phases.append('new')
     if args.metadata_updates or args.individual_updates:
-        osti_metadata_updates = process_metadata_updates(
-            args, creds, elements_conn, log_folder)
-
+        phases.append('metadata_updates')
     if args.pdf_updates or args.individual_updates:
-        osti_pdf_updates = process_pdf_updates(
-            args, creds, elements_conn, log_folder)
+        phases.append('pdf_updates')
+    return phases
 
-    # Prints a digest of completed work
-    write_logs.print_final_report(
-        new_osti_pubs, osti_metadata_updates, osti_pdf_updates)
 
-    # Close connections.
-    elements_conn.close()
-    if args.tunnel_needed:
-        ssh_server.stop()
+# =======================================
+# One phase after another, sharing a single Elements connection and temp table.
+def run_phases_serially(args, creds, log_folder, run_checkpoint, archive, phases):
+    # Elements is only needed for phases without a checkpointed pub list.
+    elements_conn = None
+    if any(run_checkpoint.get_phase_pubs(phase) is None for phase in phases):
+        # Gets the db connections for Elements
+        elements_conn = elements.get_elements_connection(creds['elements_reporting_db'])
+
+        # CDL OSTI DB --> Elements temp table
+        cdl_osti_db_pubs = get_cdl_osti_db_pubs(args, creds)
+        transfer_temp_table(args, elements_conn, cdl_osti_db_pubs, log_folder)
+
+    phase_results = {}
+    for phase in phases:
+        with metrics.span('phase', phase=phase):
+            phase_results[phase] = PHASE_FUNCTIONS[phase](
+                args, creds, elements_conn, log_folder, run_checkpoint, archive)
+
+    if elements_conn:
+        elements_conn.close()
 
-    print("\nProgram complete. Exiting.\n\n")
+    return phase_results
+
+
+# #osti_submitted is a session temp table, so each phase gets its own Elements
+# connection (and temp table), and its own E-Link client. The rate limiter
+# buckets and elink_2.MAX_IN_FLIGHT are shared (by the async client too),
+# capping the total load on OSTI.
+# Pubs selected by both update phases are sent in order, through the MetadataUpdateGate.
+def run_phases_in_parallel(args, creds, log_folder, run_checkpoint, archive, phases):
+    global metadata_update_gate
+    print(f"\nRunning {len(phases)} phases in parallel: {', '.join(phases)}")
+
+    if 'metadata_updates' in phases and 'pdf_updates' in phases:
+        metadata_update_gate = MetadataUpdateGate()
+
+    # Read the CDL OSTI DB once, for every phase's temp table.
+    cdl_osti_db_pubs = None
+    if any(run_checkpoint.get_phase_pubs(phase) is None for phase in phases):
+        cdl_osti_db_pubs = get_cdl_osti_db_pubs(args, creds)
+
+    def run_phase(phase):
+        start_time = perf_counter()
+        phase_creds = dict(creds, osti_api=dict(creds['osti_api'], client_name=phase))
+
+        elements_conn = None
+        try:
+            with metrics.span('phase', phase=phase):
+                if run_checkpoint.get_phase_pubs(phase) is None:
+                    elements_conn = elements.get_elements_connection(
+                        creds['elements_reporting_db'])
+                    transfer_temp_table(args, elements_conn, cdl_osti_db_pubs, log_folder,
+                                        log_results=(phase == phases[0]))
+
+                return PHASE_FUNCTIONS[phase](
+                    args, phase_creds, elements_conn, log_folder, run_checkpoint, archive)
+        finally:
+            if elements_conn:
+                elements_conn.close()
+            if phase == 'metadata_updates' and metadata_update_gate:
+                metadata_update_gate.finish()
+            print(f"\nPhase '{phase}' finished in {perf_counter() - start_time:.1f}s.")
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(phases)) as executor:
+            futures = {phase: executor.submit(run_phase, phase) for phase in phases}
+    finally:
+        metadata_update_gate = None
+
+    return {phase: future.result() for phase, future in futures.items()}
+
+
+# Metadata and PDF updates can select the same pub, since replacing a PDF also
+# bumps pr.[Modified When]. When the phases run in parallel, the PDF phase holds
+# back the pubs the metadata phase selected until that phase is finished, so
+# OSTI and the CDL DB never get both updates for a record at once.
+class MetadataUpdateGate:
+    def __init__(self):
+        self.osti_ids = set()
+        self._selected = threading.Event()
+        self._finished = threading.Event()
+
+    def set_selected(self, pubs):
+        self.osti_ids = {pub['osti_id'] for pub in pubs}
+        self._selected.set()
+
+    # Also called if the metadata phase fails, so the PDF phase never waits forever.
+    def finish(self):
+        self._selected.set()
+        self._finished.set()
+
+    # Returns (pubs which can go now, pubs to send once the metadata phase is finished).
+    def split(self, pubs):
+        self._selected.wait()
+        ready = [pub for pub in pubs if pub['osti_id'] not in self.osti_ids]
+        held_back = [pub for pub in pubs if pub['osti_id'] in self.osti_ids]
+        return ready, held_back
+
+    def wait_finished(self):
+        self._finished.wait()
+
+
+# Set by run_phases_in_parallel while both update phases are running.
+metadata_update_gate = None
 
 
 # =======================================
-def create_and_transfer_temp_table(args, creds, elements_conn, log_folder):
-    # Get the data from the CDL OSTI DB
-    cdl_osti_db_pubs = cdl.get_cdl_osti_db(creds['cdl_db_read'])
+# Get the data from the CDL OSTI DB: either the whole table,
+# or only the rows changed since the local snapshot was last synced.
+def get_cdl_osti_db_pubs(args, creds):
+    if args.full_reload:
+        return cdl.get_cdl_osti_db(creds['cdl_db_read'])
+    else:
+        return cdl_osti_db_snapshot.get_cdl_osti_db_incremental(creds['cdl_db_read'])
 
+
+def transfer_temp_table(args, elements_conn, cdl_osti_db_pubs, log_folder, log_results=True):
     # Create temp table in Elements
     elements.create_temp_table_in_elements(elements_conn, cdl_osti_db_pubs)
 
-    if args.full_logging:
-        temp_table_results = elements.get_full_temp_table(elements_conn)
+    if args.full_logging and log_results:
+        temp_table_results = elements.stream_full_temp_table(elements_conn)
         write_logs.output_temp_table_results(log_folder, temp_table_results)
 
 
 # =======================================
 # New OSTI Pubs
-def process_new_osti_pubs(args, creds, elements_conn, log_folder):
+def process_new_osti_pubs(args, creds, elements_conn, log_folder, run_checkpoint, archive):
+
+    # Resumed run: the transformed pubs come from the checkpoint.
+    new_osti_pubs = run_checkpoint.get_phase_pubs('new')
+    if new_osti_pubs is not None:
+        print(f"\nResuming {len(new_osti_pubs)} new pubs from the checkpoint.")
+        if not new_osti_pubs:
+            return False
+
+    # Pipelined mode: query, transform, prefetch and submission overlap.
+    elif args.pipeline and not args.test and not args.resume:
+        return process_new_osti_pubs_pipeline(
+            args, creds, elements_conn, log_folder, run_checkpoint, archive)
+
+    else:
+        # A pipeline run which was killed part-way recorded its pubs one at a time.
+        # Those with an OSTI ID are in the CDL DB now, so the Elements query won't
+        # select them again: they're sent from the checkpoint, ahead of the query's pubs.
+        unfinished_pubs = run_checkpoint.get_unfinished_pubs('new')
+        if unfinished_pubs:
+            print(f"\nResuming {len(unfinished_pubs)} unfinished new pubs from the checkpoint.")
+
+        print("\nQuerying Elements Reporting DB for new OSTI publications.")
+        new_osti_pubs = elements.get_new_osti_pubs(elements_conn, args)
+
+        if not new_osti_pubs and not unfinished_pubs:
+            print("No new OSTI publications were found. Proceeding.")
+            run_checkpoint.record_phase_pubs('new', [])
+            return False
+
+        print(f"\n{len(new_osti_pubs)} new pubs for submission.")
+        if len(new_osti_pubs) > submission_limit:
+            print(f"Truncating new pub list to submission limit ({submission_limit})")
+            new_osti_pubs = new_osti_pubs[:submission_limit]
+
+        # Log Elements query results
+        if args.full_logging and new_osti_pubs:
+            write_logs.output_elements_query_results(log_folder, new_osti_pubs)
+
+        # Add the OSTI-specific submission JSONs
+        with metrics.span('transform', phase='new'):
+            new_osti_pubs = list(transform_pubs.add_osti_data(new_osti_pubs, args.test))
+
+        # Log transformed submissions
+        if args.full_logging or args.test:
+            write_logs.output_submissions(log_folder, new_osti_pubs, archive=archive)
+
+        # If running in test mode, skip the submission step.
+        if args.test:
+            print("Run with test output only. Exiting.")
+            elements_conn.close()
+            exit(0)
+
+        # Pubs a crashed pipeline run already sent keep their recorded state.
+        new_osti_pubs = run_checkpoint.restore_states('new', new_osti_pubs)
+        unfinished_ids = {pub['id'] for pub in unfinished_pubs}
+        new_osti_pubs = unfinished_pubs + [
+            pub for pub in new_osti_pubs if pub['id'] not in unfinished_ids]
+        run_checkpoint.record_phase_pubs('new', new_osti_pubs)
+
+    # Send the submission jsons to the OSTI API.
+    if args.async_mode:
+        new_osti_pubs = get_async_elink().submit_new_pubs(
+            new_osti_pubs, creds['osti_api'], creds['cdl_db_write'], checkpoint=run_checkpoint)
+    else:
+        new_osti_pubs = elink_2.submit_new_pubs(
+            new_osti_pubs, creds['osti_api'], creds['cdl_db_write'], args.workers,
+            checkpoint=run_checkpoint)
 
-    print("\nQuerying Elements Reporting DB for new OSTI publications.")
-    new_osti_pubs = elements.get_new_osti_pubs(elements_conn, args)
-
-    if not new_osti_pubs:
-        print("No new OSTI publications were found. Proceeding.")
-        return False
+    # Report successful meta & media submission counts
+    meta_ok = len([pub for pub in new_osti_pubs
+                   if pub.get('response_success') is True])
 
-    print(f"\n{len(new_osti_pubs)} new pubs for submission.")
-    if len(new_osti_pubs) > submission_limit:
-        print(f"Truncating new pub list to submission limit ({submission_limit})")
-        new_osti_pubs = new_osti_pubs[submission_limit:]
+    media_ok = len([pub for pub in new_osti_pubs
+                    if pub.get('media_response_success') is True])
 
-    # Log Elements query results
-    if args.full_logging:
-        write_logs.output_elements_query_results(log_folder, new_osti_pubs)
+    print(f"{meta_ok}/{len(new_osti_pubs)} successful metadata submission in this batch.")
+    print(f"{media_ok}/{meta_ok} successful media submissions for new metadata.")
 
-    # Add the OSTI-specific submission JSONs
-    new_osti_pubs = transform_pubs.add_osti_data(new_osti_pubs, args.test)
+    return new_osti_pubs
 
-    # Log transformed submissions
-    if args.full_logging or args.test:
-        write_logs.output_submissions(log_folder, new_osti_pubs)
 
-    # If running in test mode, skip the submission step.
-    if args.test:
-        print("Run with test output only. Exiting.")
-        elements_conn.close()
-        exit(0)
+def process_new_osti_pubs_pipeline(args, creds, elements_conn, log_folder, run_checkpoint,
+                                   archive):
+    print("\nQuerying Elements Reporting DB for new OSTI publications (pipelined).")
+    new_osti_pubs, queue_depths = pipeline.run_new_pubs_pipeline(
+        args, creds, elements_conn, log_folder, submission_limit, run_checkpoint)
 
-    # Otherwise, send the submission jsons to the OSTI API.
-    new_osti_pubs = elink_2.submit_new_pubs(
-        new_osti_pubs, creds['osti_api'], creds['cdl_db_write'])
+    if not new_osti_pubs:
+        print("No new OSTI publications were found. Proceeding.")
+        return False
 
-    # Output pub objects with responses
-    write_logs.output_json_generic(
-        log_folder, new_osti_pubs, "submissions-and-responses")
+    # Log transformed submissions
+    if args.full_logging:
+        write_logs.output_submissions(log_folder, new_osti_pubs, archive=archive)
+        write_logs.output_json_generic(log_folder, queue_depths, "pipeline-queue-depths")
 
-    # Report successful meta & media submission counts
     meta_ok = len([pub for pub in new_osti_pubs
                    if pub.get('response_success') is True])
 
@@ -128,35 +344,63 @@ def process_new_osti_pubs(args, creds, elements_conn, log_folder):
 
 # =======================================
 # Metadata updates
-def process_metadata_updates(args, creds, elements_conn, log_folder):
-
-    print("\nQuerying for modified OSTI pubs.")
-    osti_metadata_updates = elements.get_osti_metadata_updates(elements_conn, args)
-
-    if not osti_metadata_updates:
-        print("No OSTI pubs with modified metadata. Proceeding.")
-        return False
-
-    print(f"\n{len(osti_metadata_updates)} Modified publications for updating.")
-    if len(osti_metadata_updates) > submission_limit:
-        print(f"Truncating new pub list to submission limit ({submission_limit})")
-        osti_metadata_updates = osti_metadata_updates[submission_limit:]
-
-    # Transform metadata updates for submission
-    osti_metadata_updates = transform_pubs.add_osti_data(osti_metadata_updates, args.test)
-
-    # Log metadata updates
-    if args.full_logging:
-        write_logs.output_submissions(
-            log_folder, osti_metadata_updates, "UPDATE-METADATA")
+def process_metadata_updates(args, creds, elements_conn, log_folder, run_checkpoint, archive):
+
+    # Resumed run: the transformed pubs come from the checkpoint.
+    osti_metadata_updates = run_checkpoint.get_phase_pubs('metadata_updates')
+    if osti_metadata_updates is not None:
+        print(f"\nResuming {len(osti_metadata_updates)} metadata updates from the checkpoint.")
+        if metadata_update_gate:
+            metadata_update_gate.set_selected(osti_metadata_updates)
+        if not osti_metadata_updates:
+            return False
+
+    else:
+        print("\nQuerying for modified OSTI pubs.")
+        osti_metadata_updates = elements.get_osti_metadata_updates(elements_conn, args)
+        if metadata_update_gate:
+            metadata_update_gate.set_selected(osti_metadata_updates)
+
+        if not osti_metadata_updates:
+            print("No OSTI pubs with modified metadata. Proceeding.")
+            run_checkpoint.record_phase_pubs('metadata_updates', [])
+            return False
+
+        print(f"\n{len(osti_metadata_updates)} Modified publications for updating.")
+        if len(osti_metadata_updates) > submission_limit:
+            print(f"Truncating new pub list to submission limit ({submission_limit})")
+            osti_metadata_updates = osti_metadata_updates[:submission_limit]
+
+        # Transform metadata updates for submission
+        with metrics.span('transform', phase='metadata_updates'):
+            osti_metadata_updates = list(
+                transform_pubs.add_osti_data(osti_metadata_updates, args.test))
+
+        # Individually-requested updates are always sent.
+        if not args.individual_updates:
+            osti_metadata_updates = skip_unchanged_metadata_updates(
+                osti_metadata_updates, creds['cdl_db_write'])
+
+            if not osti_metadata_updates:
+                print("No OSTI pubs with changed submission JSON. Proceeding.")
+                run_checkpoint.record_phase_pubs('metadata_updates', [])
+                return False
+
+        # Log metadata updates
+        if args.full_logging:
+            write_logs.output_submissions(
+                log_folder, osti_metadata_updates, "UPDATE-METADATA", archive)
+
+        run_checkpoint.record_phase_pubs('metadata_updates', osti_metadata_updates)
 
     # Submit updated metadata to OSTI
-    osti_metadata_updates = elink_2.submit_metadata_updates(
-        osti_metadata_updates, creds['osti_api'], creds['cdl_db_write'])
-
-    # Log OSTI API responses; Output pub objects with responses
-    write_logs.output_json_generic(
-        log_folder, osti_metadata_updates, "v2-update-submissions-and-responses")
+    if args.async_mode:
+        osti_metadata_updates = get_async_elink().submit_metadata_updates(
+            osti_metadata_updates, creds['osti_api'], creds['cdl_db_write'],
+            checkpoint=run_checkpoint)
+    else:
+        osti_metadata_updates = elink_2.submit_metadata_updates(
+            osti_metadata_updates, creds['osti_api'], creds['cdl_db_write'], run_checkpoint)
 
     # Report succesfull metadata updates
     successful_metadata_updates = len([
@@ -168,24 +412,91 @@ def process_metadata_updates(args, creds, elements_conn, log_folder):
     return osti_metadata_updates
 
 
+# Skips metadata updates whose submission JSON hashes the same as the one last
+# sent (the CDL OSTI DB's md5). They still get their eschol_pr_modified_when advanced.
+def skip_unchanged_metadata_updates(osti_metadata_updates, mysql_creds):
+    changed, unchanged = [], []
+    for pub in osti_metadata_updates:
+        if pub.get('osti_md5') == cdl.get_submission_md5(pub):
+            unchanged.append(pub)
+        else:
+            changed.append(pub)
+
+    if unchanged:
+        cdl.update_osti_db_modified_when(unchanged, mysql_creds)
+
+    print(f"{len(unchanged)} metadata updates skipped (submission JSON unchanged), "
+          f"{len(changed)} to be sent.")
+    return changed
+
+
 # =======================================
 # PDF updates
-def process_pdf_updates(args, creds, elements_conn, log_folder):
+def process_pdf_updates(args, creds, elements_conn, log_folder, run_checkpoint, archive):
 
-    print("\nQuerying for replaced PDF files.")
-    osti_media_updates = elements.get_osti_media_updates(elements_conn, args)
+    # Resumed run: the pubs come from the checkpoint.
+    osti_media_updates = run_checkpoint.get_phase_pubs('pdf_updates')
+    if osti_media_updates is not None:
+        print(f"\nResuming {len(osti_media_updates)} PDF updates from the checkpoint.")
+        if not osti_media_updates:
+            return False
 
-    if not osti_media_updates:
-        print("No updated PDFs for resubmission. Proceeding.")
-        return False
+    else:
+        print("\nQuerying for replaced PDF files.")
+        osti_media_updates = elements.get_osti_media_updates(elements_conn, args)
+
+        if not osti_media_updates:
+            print("No updated PDFs for resubmission. Proceeding.")
+            run_checkpoint.record_phase_pubs('pdf_updates', [])
+            return False
+
+        print(f"\n{len(osti_media_updates)} Modified media files for updating.")
+        run_checkpoint.record_phase_pubs('pdf_updates', osti_media_updates)
 
-    print(f"\n{len(osti_media_updates)} Modified media files for updating.")
     print("\nSubmitting updated PDFs to OSTI.")
-    elink_2.submit_media_updates(osti_media_updates, creds['osti_api'], creds['cdl_db_write'])
+    held_back = []
+    if metadata_update_gate:
+        ready, held_back = metadata_update_gate.split(osti_media_updates)
+    else:
+        ready = osti_media_updates
+
+    submit_pdf_updates(args, creds, run_checkpoint, ready)
+
+    if held_back:
+        print(f"\nWaiting for the metadata updates to finish before submitting "
+              f"{len(held_back)} PDF update(s) for the same pubs.")
+        metadata_update_gate.wait_finished()
+        submit_pdf_updates(args, creds, run_checkpoint, held_back)
 
     return osti_media_updates
 
 
+def submit_pdf_updates(args, creds, run_checkpoint, osti_media_updates):
+    if not osti_media_updates:
+        return
+    if args.async_mode:
+        get_async_elink().submit_media_updates(
+            osti_media_updates, creds['osti_api'], creds['cdl_db_write'],
+            checkpoint=run_checkpoint)
+    else:
+        elink_2.submit_media_updates(
+            osti_media_updates, creds['osti_api'], creds['cdl_db_write'], run_checkpoint)
+
+
+# Checkpoint phase name -> phase function
+PHASE_FUNCTIONS = {
+    'new': process_new_osti_pubs,
+    'metadata_updates': process_metadata_updates,
+    'pdf_updates': process_pdf_updates}
+
+
+# =======================================
+# The async client needs httpx, so it's only imported when --async is used.
+def get_async_elink():
+    import elink_2_async
+    return elink_2_async
+
+
 # =======================================
 # Stub for main
 if __name__ == "__main__":
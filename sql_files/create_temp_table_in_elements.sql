@@ -3,6 +3,7 @@ CREATE TABLE #osti_submitted (
     elements_id INT,
     doi VARCHAR(80),
     eschol_id VARCHAR(80),
+    md5 VARCHAR(32),
     eschol_pr_modified_when DATETIME,
     prf_filename VARCHAR(200),
     prf_size BIGINT,
@@ -0,0 +1,20 @@
+-- One checksum per row, used to find rows changed since the local snapshot.
+-- Columns match get_osti_db_from_eschol.sql. IFNULL keeps NULLs distinct
+-- from empty strings, since CONCAT_WS skips NULL values.
+SELECT
+    id,
+    CRC32(CONCAT_WS('|',
+        IFNULL(osti_id, '~'),
+        IFNULL(doi, '~'),
+        IFNULL(elements_id, '~'),
+        IFNULL(eschol_ark, '~'),
+        IFNULL(md5, '~'),
+        IFNULL(eschol_pr_modified_when, '~'),
+        IFNULL(prf_filename, '~'),
+        IFNULL(prf_size, '~'),
+        IFNULL(media_response_code, '~'),
+        IFNULL(media_id, '~'),
+        IFNULL(media_file_id, '~'),
+        IFNULL(media_id_deleted, '~')
+    )) AS row_crc
+From table_replace;
@@ -13,4 +13,6 @@ SELECT
     media_id,
     media_file_id,
     media_id_deleted
-From table_replace;
\ No newline at end of file
+From table_replace
+-- WHERE CLAUSE REPLACE
+;
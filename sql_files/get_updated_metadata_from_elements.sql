@@ -19,6 +19,7 @@ DECLARE @eschol_files_url VARCHAR(120) = 'ESCHOL_FILES_URL_REPLACE';
 SELECT DISTINCT
     os.[osti_id],
     os.[eschol_id] AS [OSTI eschol_id],
+    os.[md5] AS [osti_md5],
     p.id,
  	CONCAT(@elements_pub_url, p.id) as [Elements URL],
 	p.title,
@@ -260,6 +261,7 @@ GROUP BY
 	os.[doi],
 	os.[osti_id],
 	os.[eschol_id],
+	os.[md5],
 	os.[eschol_pr_modified_when]
 
 ORDER BY
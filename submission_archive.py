@@ -0,0 +1,269 @@
+# Consolidated archive of submissions and responses, shared by every run.
+#   logs/archive/segments/{run}.gz   one append-only segment per run; each record
+#                                    is its own gzip member, so it can be read alone
+#   logs/archive/index.sqlite        Elements ID / OSTI ID -> (run, kind, offset, length)
+#                                    and, for imported files, the file they came from
+# Replaces the per-pub NEW-{i}-SUBMISSION.json / {i}-RESPONSE.json files outside of
+# test mode, and also gets every finished pub from the checkpoint.
+#
+# Looking up a pub's history:
+#   python3 submission_archive.py --id 1234567
+#   python3 submission_archive.py --osti-id 2345678 --full
+# Loading old log folders' per-pub JSON files into the archive:
+#   python3 submission_archive.py --import logs/2024-*
+import argparse
+import gzip
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from write_logs import serialize_datetime
+
+
+ARCHIVE_ROOT = "logs/archive"
+
+# Record kinds for finished pubs (the whole pub, with its responses), by checkpoint phase.
+# Submissions are archived as NEW / UPDATE-METADATA. Responses from imported log
+# folders are archived as RESPONSE.
+RESULT_KINDS = {
+    'new': "NEW-RESULT",
+    'metadata_updates': "UPDATE-METADATA-RESULT",
+    'pdf_updates': "UPDATE-PDF-RESULT"}
+
+
+class SubmissionArchive:
+    def __init__(self, run, archive_root=ARCHIVE_ROOT):
+        self.run = run
+        self.archive_root = archive_root
+        self.segment_path = os.path.join(archive_root, "segments", f"{run}.gz")
+        self._lock = threading.Lock()
+        self._closed = False
+
+        os.makedirs(os.path.dirname(self.segment_path), exist_ok=True)
+        self._segment = open(self.segment_path, "ab")
+        self._index = open_index(archive_root)
+
+    # Appends one record, and indexes it by the pub's Elements ID and OSTI ID.
+    # The segment is flushed before the index row is committed, so an indexed
+    # record is always readable. A crash between the two leaves unindexed bytes,
+    # which are never read.
+    def append(self, kind, elements_id, osti_id, data, recorded_at=None, source=None):
+        recorded_at = recorded_at or datetime.now()
+        member = gzip.compress(json.dumps(data, default=serialize_datetime).encode())
+
+        with self._lock:
+            self._segment.seek(0, os.SEEK_END)
+            offset = self._segment.tell()
+            self._segment.write(member)
+            self._segment.flush()
+
+            self._index.execute(
+                "INSERT INTO records (elements_id, osti_id, run, kind, recorded_at, "
+                "segment, offset, length, source) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (elements_id, osti_id, self.run, kind, recorded_at.isoformat(),
+                 os.path.basename(self.segment_path), offset, len(member), source))
+            self._index.commit()
+
+    def append_pub(self, kind, pub, data):
+        self.append(kind, pub.get('id'), pub.get('osti_id'), data)
+
+    def has_source(self, source):
+        with self._lock:
+            return self._index.execute(
+                "SELECT 1 FROM records WHERE run = ? AND source = ? LIMIT 1",
+                (self.run, source)).fetchone() is not None
+
+    # A writer for one kind of record, with the same write() / close() as
+    # run_log.RunLog, so it can be attached to the checkpoint.
+    def get_writer(self, kind):
+        return ArchiveWriter(self, kind)
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._segment.close()
+            self._index.close()
+
+
+class ArchiveWriter:
+    def __init__(self, archive, kind):
+        self.archive = archive
+        self.kind = kind
+
+    def write(self, pub):
+        self.archive.append_pub(self.kind, pub, pub)
+
+    # The archive itself is closed by its owner.
+    def close(self):
+        pass
+
+
+def open_index(archive_root=ARCHIVE_ROOT):
+    os.makedirs(archive_root, exist_ok=True)
+    index_conn = sqlite3.connect(os.path.join(archive_root, "index.sqlite"),
+                                 check_same_thread=False)
+    index_conn.execute("PRAGMA journal_mode=WAL")
+    index_conn.execute("""CREATE TABLE IF NOT EXISTS records (
+        elements_id INTEGER, osti_id INTEGER, run TEXT, kind TEXT, recorded_at TEXT,
+        segment TEXT, offset INTEGER, length INTEGER, source TEXT)""")
+
+    # Indexes created before imports were tracked have no source column.
+    columns = [row[1] for row in index_conn.execute("PRAGMA table_info(records)")]
+    if 'source' not in columns:
+        index_conn.execute("ALTER TABLE records ADD COLUMN source TEXT")
+
+    index_conn.execute("CREATE INDEX IF NOT EXISTS records_elements_id ON records (elements_id)")
+    index_conn.execute("CREATE INDEX IF NOT EXISTS records_osti_id ON records (osti_id)")
+    index_conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS records_run_source ON records (run, source)")
+    return index_conn
+
+
+# --------------------------
+# Lookup. Returns the pub's records oldest first, each with its data read back
+# from the segment unless include_data is False.
+INDEX_COLUMNS = ['elements_id', 'osti_id', 'run', 'kind', 'recorded_at',
+                 'segment', 'offset', 'length']
+
+
+def lookup(elements_id=None, osti_id=None, archive_root=ARCHIVE_ROOT, include_data=True):
+    index_conn = open_index(archive_root)
+    try:
+        records = select_records(index_conn, {elements_id}, {osti_id})
+
+        # A new pub's first records have no OSTI ID yet, and imported responses may
+        # lack an Elements ID, so a second pass picks up the IDs the first one found.
+        records = select_records(
+            index_conn,
+            {elements_id} | {r['elements_id'] for r in records},
+            {osti_id} | {r['osti_id'] for r in records})
+    finally:
+        index_conn.close()
+
+    if include_data:
+        for record in records:
+            record['data'] = read_record(record, archive_root)
+    return records
+
+
+def select_records(index_conn, elements_ids, osti_ids):
+    elements_ids = [i for i in elements_ids if i is not None]
+    osti_ids = [i for i in osti_ids if i is not None]
+
+    where = []
+    if elements_ids:
+        where.append(f"elements_id IN ({', '.join('?' * len(elements_ids))})")
+    if osti_ids:
+        where.append(f"osti_id IN ({', '.join('?' * len(osti_ids))})")
+    if not where:
+        return []
+
+    rows = index_conn.execute(
+        f"SELECT {', '.join(INDEX_COLUMNS)} FROM records WHERE {' OR '.join(where)} "
+        f"ORDER BY recorded_at, rowid", elements_ids + osti_ids)
+    return [dict(zip(INDEX_COLUMNS, row)) for row in rows]
+
+
+def read_record(record, archive_root=ARCHIVE_ROOT):
+    with open(os.path.join(archive_root, "segments", record['segment']), "rb") as f:
+        f.seek(record['offset'])
+        return json.loads(gzip.decompress(f.read(record['length'])))
+
+
+# --------------------------
+# Import of old log folders: the per-pub submission & response files.
+# Submissions carry the Elements ID as site_unique_id; so do OSTI's responses.
+# Each file is imported once: files already indexed for the run are skipped, so
+# a folder can be imported again after new files were added or an import failed.
+SUBMISSION_FILE_PATTERN = re.compile(r"^(NEW|UPDATE-METADATA)-\d+-SUBMISSION\.json$")
+RESPONSE_FILE_PATTERN = re.compile(r"^\d+-RESPONSE\.json$")
+
+
+def import_log_folder(log_folder, archive_root=ARCHIVE_ROOT):
+    run = os.path.basename(os.path.normpath(log_folder))
+    archive = SubmissionArchive(run, archive_root)
+    imported = 0
+    skipped = 0
+
+    try:
+        for filename in sorted(os.listdir(log_folder)):
+            submission_match = SUBMISSION_FILE_PATTERN.match(filename)
+            if not submission_match and not RESPONSE_FILE_PATTERN.match(filename):
+                continue
+
+            if archive.has_source(filename):
+                skipped += 1
+                continue
+
+            file_path = os.path.join(log_folder, filename)
+            with open(file_path) as f:
+                try:
+                    data = json.load(f)
+                except ValueError:
+                    print(f"Skipping unreadable file: {filename}")
+                    continue
+
+            if not isinstance(data, dict):
+                continue
+
+            kind = submission_match.group(1) if submission_match else "RESPONSE"
+            archive.append(kind, to_int(data.get('site_unique_id')), to_int(data.get('osti_id')),
+                           data, datetime.fromtimestamp(os.path.getmtime(file_path)), filename)
+            imported += 1
+    finally:
+        archive.close()
+
+    return imported, skipped
+
+
+def to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# --------------------------
+def print_history(records, full=False):
+    if not records:
+        print("No archived records found.")
+        return
+
+    for record in records:
+        print(f"{record['recorded_at']}  {record['run']:<22}{record['kind']:<20}"
+              f"Elements ID {record['elements_id']}  OSTI ID {record['osti_id']}")
+        if full:
+            print(json.dumps(record['data'], indent=4))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--id", type=int, dest="elements_id", help="Elements pub ID")
+    parser.add_argument("--osti-id", type=int, dest="osti_id")
+    parser.add_argument("--full", action="store_true", default=False,
+                        help="Print each record's JSON, not just the history lines.")
+    parser.add_argument("--import", dest="import_folders", nargs="+", default=[],
+                        help="Log folders whose per-pub JSON files should be added to the archive.")
+    parser.add_argument("--archive-root", default=ARCHIVE_ROOT)
+    args = parser.parse_args()
+
+    if args.import_folders:
+        for log_folder in args.import_folders:
+            if os.path.isdir(log_folder):
+                imported, skipped = import_log_folder(log_folder, args.archive_root)
+                print(f"Imported {imported} file(s) from {log_folder}"
+                      f"{f', skipped {skipped} already imported' if skipped else ''}.")
+        return
+
+    if args.elements_id is None and args.osti_id is None:
+        parser.error("One of --id, --osti-id or --import is needed.")
+
+    print_history(lookup(args.elements_id, args.osti_id, args.archive_root, args.full), args.full)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,13 @@
+import os
+import sys
 import requests
 import csv
 from dotenv import dotenv_values
-from time import sleep
+
+# Allows importing the shared program modules from the repo root.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import rate_limiter
+
 problem_rows = []
 
 config = dotenv_values("../.env")
@@ -9,13 +15,12 @@ config = dotenv_values("../.env")
 input_file = csv.DictReader(open("input-2.csv"))
 for row in input_file:
     print(f"Requesting ID:{row['id']}, osti_id:{row['osti_id']}")
-    sleep(0.25)
 
-    r = requests.get(
+    r = rate_limiter.call('osti_v1', lambda: requests.get(
         config['OSTI_V1_URL_PROD'],
         auth=(config['OSTI_V1_USERNAME_PROD'],
               config['OSTI_V1_PASSWORD_PROD']),
-        params={'osti_id': row['osti_id']})
+        params={'osti_id': row['osti_id']}))
 
     if r.status_code != 200:
         print("Non-200 response:")
@@ -1,81 +1,175 @@
 # Transform for OSTI E-Link Version 2
 # https://review.osti.gov/elink2api/#tag/records/operation/submitRecord
 
-import json
+import re
 import release_info
-from copy import deepcopy
+from functools import lru_cache
+
+# orjson decodes the authors & grants JSON several times faster, if it's installed.
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+
+# Lists in the release template which build_submission_json appends to.
+# Only these are copied per pub; the template's other values are shared, read-only.
+PER_PUB_LISTS = ('identifiers', 'organizations', 'persons')
+
+# Limits for the pub batches transformed together by add_osti_data.
+# Large-collaboration pubs fill the JSON size limit quickly, and end up in small
+# batches, which keeps their decoded authors in cache while they're processed.
+TRANSFORM_BATCH_SIZE = 50
+TRANSFORM_BATCH_MAX_JSON_CHARS = 32 * 1024
+
+# Author names which mark an organization, rather than a person.
+ORGANIZATION_AUTHOR_PATTERN = re.compile('collaboration', re.IGNORECASE)
 
 
 # ---------------------
 # For each new publication, create the JSON that's sent as the HTTP req body.
+# Accepts any iterable of pubs (e.g. a streaming Elements query), transforms
+# them in small batches, and yields each pub once its submission JSON is ready.
 def add_osti_data(new_osti_pubs, testing_mode):
     print("Converting SQL results into JSON for E-Link v2.")
 
     # Main loop
-    new_osti_pubs_with_json = []
-    for pub in new_osti_pubs:
+    for batch in get_batches(new_osti_pubs):
+        # Save the OSTI submission JSONs & pass the pubs along
+        yield from transform_batch(batch)
 
-        # Create the pub dict, init with hardcoded release fields.
-        # Note: deepcopy is required for cloning nested dicts
-        osti_pub = deepcopy(release_info.v2)
 
-        # Translate Elements pub type to OSTI product_type & adds associated metadata
-        osti_pub.update(get_product_type_and_subfields(pub))
+# Groups pubs into batches, capped by count and by the size of their authors JSON.
+def get_batches(pubs):
+    batch = []
+    json_chars = 0
 
-        # All publications should have these
-        osti_pub['title'] = pub['title']
-        osti_pub['site_unique_id'] = pub['id']
-        osti_pub['publication_date'] = pub['Reporting Date 1']
-        osti_pub['product_size'] = pub['File Size']
+    for pub in pubs:
+        batch.append(pub)
+        json_chars += len(pub['authors'] or '')
 
-        # Some pubs may not have these
-        if pub['doi'] is not None:
-            osti_pub['doi'] = pub['doi']
-        if pub['abstract'] is not None:
-            osti_pub['description'] = pub['abstract']
+        if len(batch) == TRANSFORM_BATCH_SIZE or json_chars >= TRANSFORM_BATCH_MAX_JSON_CHARS:
+            yield batch
+            batch = []
+            json_chars = 0
 
-        # Identifiers
-        osti_pub['identifiers'].append(dict(type='OTHER_ID', value=pub['ark']))
-        osti_pub['identifiers'].append(dict(type='OTHER_ID', value=pub['eSchol URL']))
+    if batch:
+        yield batch
 
-        # TK Think something's wrong here?
-        if get_lbl_report_number(pub) is not None:
-            osti_pub['identifiers'].append(dict(type='RN', value=get_lbl_report_number(pub)))
 
-        # Persons
-        authors_json = json.loads(pub['authors'])
-        if authors_json is not None:
+# ---------------------
+# Transforms a batch of pubs. The batch's authors and grants columns are each
+# decoded with a single JSON call, rather than two calls per pub.
+def transform_batch(pubs):
+    try:
+        batch_authors = decode_json_column(pubs, 'authors')
+        batch_grants = decode_json_column(pubs, 'grants')
 
-            # Convert email to an array
-            for author in authors_json:
+    # Decode one pub at a time, so the error points at the bad pub.
+    except ValueError:
+        for pub in pubs:
+            pub['submission_json'] = build_submission_json(pub)
+        return pubs
+
+    for pub, authors_json, grants_json in zip(pubs, batch_authors, batch_grants):
+        pub['submission_json'] = build_submission_from_json(pub, authors_json, grants_json)
+    return pubs
+
+
+# Joins a JSON column's values into one array, so the batch decodes in one go.
+def decode_json_column(pubs, column):
+    values = ('null' if pub[column] is None else pub[column] for pub in pubs)
+    decoded = json_loads('[' + ','.join(values) + ']')
 
-                # If the author is an org, append it to the org list.
-                if is_organization_author(author):
-                    author['org'] = True
-                    osti_pub['organizations'].append(format_organization_author(author))
+    if len(decoded) != len(pubs):
+        raise ValueError(f"Batch {column} JSON decoded to {len(decoded)} values for {len(pubs)} pubs")
+    return decoded
 
-                if 'email' in author.keys():
-                    author['email'] = [author['email']]
 
-            # Remove org authors & add to the OSTI persons array.
-            authors_json = [author for author in authors_json if 'org' not in author.keys()]
-            osti_pub['persons'] += authors_json
+# ---------------------
+# Builds the OSTI submission JSON for a single pub.
+def build_submission_json(pub):
+    return build_submission_from_json(
+        pub, json_loads(pub['authors']), json_loads(pub['grants']))
+
+
+# Builds the OSTI submission JSON, with the pub's authors & grants already decoded.
+def build_submission_from_json(pub, authors_json, grants_json):
+
+    # Create the pub dict, init with hardcoded release fields.
+    osti_pub = new_submission()
+
+    # Translate Elements pub type to OSTI product_type & adds associated metadata
+    osti_pub.update(get_product_type_and_subfields(pub))
+
+    # All publications should have these
+    osti_pub['title'] = pub['title']
+    osti_pub['site_unique_id'] = pub['id']
+    osti_pub['publication_date'] = pub['Reporting Date 1']
+    osti_pub['product_size'] = pub['File Size']
+
+    # Some pubs may not have these
+    if pub['doi'] is not None:
+        osti_pub['doi'] = pub['doi']
+    if pub['abstract'] is not None:
+        osti_pub['description'] = pub['abstract']
+
+    # Identifiers
+    # TK Think something's wrong here? get_lbl_report_number never returns None,
+    # so pubs without a report number get an RN of "None".
+    lbl_report_number = get_lbl_report_number(pub)
+    osti_pub['identifiers'] += [
+        {'type': 'OTHER_ID', 'value': pub['ark']},
+        {'type': 'OTHER_ID', 'value': pub['eSchol URL']}]
+    if lbl_report_number is not None:
+        osti_pub['identifiers'].append({'type': 'RN', 'value': lbl_report_number})
+
+    # Persons
+    if authors_json is not None:
+        persons = osti_pub['persons']
+        organizations = osti_pub['organizations']
+
+        for author in authors_json:
+
+            # If the author is an org, append it to the org list instead.
+            if is_organization_author(author):
+                organizations.append(format_organization_author(author))
+                continue
+
+            # Convert email to an array
+            if 'email' in author:
+                author['email'] = [author['email']]
 
-        # Grants (These are listed in OSTI Organizations)
-        grants_json = json.loads(pub['grants'])
-        if grants_json is not None:
-            osti_pub['organizations'] += grants_json
+            persons.append(author)
 
-        # Save the OSTI submission JSON & add the pub to the list
-        pub['submission_json'] = osti_pub
-        new_osti_pubs_with_json.append(pub)
+    # Grants (These are listed in OSTI Organizations)
+    if grants_json is not None:
+        osti_pub['organizations'] += grants_json
 
-    return new_osti_pubs_with_json
+    return osti_pub
 
 
 # ========================================
 # Misc. Helper Functions
 
+# The release template, checked and copied once on first use.
+@lru_cache(maxsize=None)
+def get_release_template():
+    missing = [k for k in PER_PUB_LISTS if not isinstance(release_info.v2.get(k), list)]
+    if missing:
+        raise RuntimeError(f"release_info.v2 is missing list fields: {', '.join(missing)}")
+    return dict(release_info.v2)
+
+
+# Returns a fresh submission dict: a shallow copy of the release template,
+# with new copies of the lists each pub appends to (instead of a deepcopy of it all).
+def new_submission():
+    osti_pub = get_release_template().copy()
+    for k in PER_PUB_LISTS:
+        osti_pub[k] = list(osti_pub[k])
+    return osti_pub
+
+
 # Returns OSTI product_type and associated subfields
 def get_product_type_and_subfields(pub):
     if pub['Type'] == 'Journal article' or pub['Type'] == 'Internet publication':
@@ -124,11 +218,14 @@ def get_lbl_report_number(pub):
 # -----------------
 # Check known organizational authors
 def is_organization_author(author):
-    if ('collaboration' in author['last_name'].lower()
-            or ('first_name' in author.keys() and 'collaboration' in author['first_name'].lower())):
-        return True
-    else:
-        return False
+    return (is_organization_name(author['last_name'])
+            or ('first_name' in author and is_organization_name(author['first_name'])))
+
+
+# Collaboration papers repeat the same few hundred names, so results are memoized.
+@lru_cache(maxsize=4096)
+def is_organization_name(name):
+    return ORGANIZATION_AUTHOR_PATTERN.search(name) is not None
 
 
 # -----------------
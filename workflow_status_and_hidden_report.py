@@ -1,8 +1,25 @@
+# Report of LBNLSCH records with problems at OSTI: 'SV' workflow status
+# (not yet released) and hidden records, each with its audit logs & comments.
+#   python3 workflow_status_and_hidden_report.py
+#   python3 workflow_status_and_hidden_report.py -sf 10/01/2023    (whole fiscal year audits)
+#   python3 workflow_status_and_hidden_report.py -om               (from the osti_mirror.py mirror)
+# Comments are cached in logs/osti_comments_cache.json, keyed by OSTI ID and the
+# record's latest audit date, so reruns only fetch comments for changed records.
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
 import program_setup
 import elink_2_functions as elink_2
+import osti_mirror
 from pprint import pprint
 
 
+COMMENTS_CACHE_PATH = "logs/osti_comments_cache.json"
+
+# Concurrent comment requests. They're also paced by rate_limiter's osti_query bucket.
+COMMENT_WORKERS = 8
+
+
 # =======================================
 def main():
     # ---------- GENERAL SETUP
@@ -10,23 +27,19 @@ def main():
     args = program_setup.process_args()
     creds = program_setup.assign_creds(args)
 
-    sv_response = elink_2.get_pubs_by_workflow_status(creds['osti_api'], 'SV')
-    sv_pubs = sv_response.json()
-    for item in sv_pubs:
-        comments_response = elink_2.get_comments(creds['osti_api'], item['osti_id'])
-        try:
-            item['comments'] = comments_response.json()
-        except:
-            item['comments'] = None
-
-    hidden_response = elink_2.get_hidden_pubs(creds['osti_api'])
-    hidden_pubs = hidden_response.json()
-    for item in hidden_pubs:
-        comments_response = elink_2.get_comments(creds['osti_api'], item['osti_id'])
-        try:
-            item['comments'] = comments_response.json()
-        except:
-            item['comments'] = None
+    print(f"Querying LBNLSCH records first submitted from {args.submitted_from}.")
+    if args.osti_mirror:
+        print(f"Using the OSTI mirror, last synced {osti_mirror.get_last_sync(creds['osti_api'])}.")
+        sv_pubs = osti_mirror.get_records(
+            creds['osti_api'], workflow_status='SV', date_first_submitted_from=args.submitted_from)
+        hidden_pubs = osti_mirror.get_records(
+            creds['osti_api'], hidden=True, date_first_submitted_from=args.submitted_from)
+    else:
+        sv_pubs = elink_2.get_pubs_by_workflow_status(
+            creds['osti_api'], 'SV', args.submitted_from)
+        hidden_pubs = elink_2.get_hidden_pubs(creds['osti_api'], args.submitted_from)
+
+    add_comments(creds['osti_api'], sv_pubs + hidden_pubs)
 
     print(f"{len(sv_pubs) + len(hidden_pubs)} total items found with issues:\n"
           f"• {len(sv_pubs)} pubs with 'SV' status (not yet released),\n"
@@ -37,6 +50,67 @@ def main():
     print_item_info("Hidden", hidden_pubs)
 
 
+# --------------------------
+# Comments: cached ones are reused while the record's latest audit date is
+# unchanged; the rest are fetched concurrently.
+def add_comments(osti_creds, pubs, cache_path=COMMENTS_CACHE_PATH):
+    cache = load_comments_cache(cache_path)
+
+    to_fetch = []
+    for pub in pubs:
+        cached = cache.get(str(pub['osti_id']))
+        last_audit_date = get_last_audit_date(pub)
+        if cached and last_audit_date and cached['last_audit_date'] == last_audit_date:
+            pub['comments'] = cached['comments']
+        else:
+            to_fetch.append(pub)
+
+    print(f"Comments: {len(pubs) - len(to_fetch)} cached, {len(to_fetch)} to fetch.")
+
+    with ThreadPoolExecutor(max_workers=COMMENT_WORKERS) as executor:
+        for pub, comments in zip(to_fetch, executor.map(
+                lambda p: fetch_comments(osti_creds, p['osti_id']), to_fetch)):
+            pub['comments'] = comments
+
+            # Failed fetches aren't cached, so they're tried again next time.
+            if comments is not None:
+                cache[str(pub['osti_id'])] = {
+                    'last_audit_date': get_last_audit_date(pub),
+                    'comments': comments}
+
+    save_comments_cache(cache, cache_path)
+
+
+def fetch_comments(osti_creds, osti_id):
+    try:
+        return elink_2.get_comments(osti_creds, osti_id).json()
+    except Exception as e:
+        print(f"Couldn't get comments for OSTI ID {osti_id}: {e}")
+        return None
+
+
+# ISO timestamps, so the latest sorts last.
+def get_last_audit_date(pub):
+    return max((a['audit_date'] for a in pub.get('audit_logs') or []), default=None)
+
+
+def load_comments_cache(cache_path):
+    try:
+        with open(cache_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_comments_cache(cache, cache_path):
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, cache_path)
+
+
+# --------------------------
 def print_item_info(problem, pubs):
     for pub in pubs:
         print("\n\n--------------------")
@@ -123,22 +197,6 @@ def get_file_urls(p):
     return file_urls
 
 
-def get_file_urls(p):
-    media = p.get('media')
-    if not media:
-        return []
-
-    file_urls = []
-    for m in media:
-        files = m.get('files')
-        for f in files:
-            furl = f.get('url')
-            if furl:
-                file_urls.append(furl)
-
-    return file_urls
-
-
 # =======================================
 # Stub for main
 if __name__ == "__main__":
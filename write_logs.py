@@ -22,11 +22,13 @@ def output_temp_table_query(log_folder, sql):
         outfile.write(sql)
 
 
+# Accepts a list or a row iterator; the header comes from the first row.
 def output_temp_table_results(log_folder, rows):
     with open(f"{log_folder}/temp_table_results.csv", "w") as outfile:
         csv_writer = csv.writer(outfile)
-        csv_writer.writerow(rows[0].keys())
-        for row in rows:
+        for index, row in enumerate(rows):
+            if index == 0:
+                csv_writer.writerow(row.keys())
             row = {k: v.isoformat() if isinstance(v, datetime) else v for k, v in row.items()}
             csv_writer.writerow(row.values())
 
@@ -39,7 +41,15 @@ def output_elements_query_results(log_folder, new_osti_pubs):
             csv_writer.writerow(row.values())
 
 
-def output_submissions(log_folder, new_osti_pubs, submission_type="NEW"):
+# With an archive (submission_archive.SubmissionArchive), submissions go into the
+# run's archive segment instead of a file per pub. Responses are archived with each
+# finished pub, through the checkpoint.
+def output_submissions(log_folder, new_osti_pubs, submission_type="NEW", archive=None):
+    if archive:
+        for osti_pub in new_osti_pubs:
+            archive.append_pub(submission_type, osti_pub, osti_pub['submission_json'])
+        return
+
     for index, osti_pub in enumerate(new_osti_pubs):
         filename = f"{submission_type}-{str(index)}-SUBMISSION"
         osti_pub_json_string = json.dumps(osti_pub['submission_json'], indent=4)
@@ -72,8 +82,9 @@ def print_final_report(new_osti_pubs, osti_metadata_updates, osti_pdf_updates):
             print(f"No {message}")
 
         else:
-            success = [p for p in pubs if p[success_field]]
-            failure = [p for p in pubs if not p[success_field]]
+            # New pubs which failed at the metadata step never got media fields.
+            success = [p for p in pubs if p.get(success_field)]
+            failure = [p for p in pubs if not p.get(success_field)]
 
             print(f"{len(pubs)} total {message}")
             print(f"{len(success)} successes, {len(failure)} failures.")
@@ -86,7 +97,7 @@ def print_final_report(new_osti_pubs, osti_metadata_updates, osti_pdf_updates):
             if failure:
                 print(f"\n{len(failure)} failed submission(s):")
                 for f in failure:
-                    print(f"\n{f['id']}\n{f[failure_json_field]}")
+                    print(f"\n{f['id']}\n{f.get(failure_json_field)}")
 
     print(report_header)
 